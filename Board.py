@@ -1,11 +1,414 @@
+from bisect import bisect_left
+
+import instrument
 from Column import Column
-from Task import Task
+from DateIndex import DateIndex
+from EventLog import EventLog
+from SearchIndex import SearchIndex
+from Task import Task, HistoryEntry
+from UndoStack import UndoStack
+
+
+# Gap left between the sort keys of neighbouring tasks when a column's keys are laid out
+keySpacing = 1024.0
+
+
+class TaskEntry:
+    # Where a task currently is: its column and its sort key in that column's keys, which
+    # run parallel to column.taskList. Keys are spaced apart so inserting or removing
+    # tasks leaves the keys of the rest of the column alone.
+    __slots__ = ("column", "keys", "key", "task")
+
+    def __init__(self, column: Column, keys: list, key: float, task: Task):
+        self.column = column
+        self.keys = keys
+        self.key = key
+        self.task = task
+
+    @property
+    def position(self) -> int:
+        # Row in column.taskList
+        return bisect_left(self.keys, self.key)
+
+
+class BoardObserver:
+    # Told about every change made through the Board methods below. The AboutTo calls come
+    # before the change, in the order Qt item models need them.
+
+    def tasksAboutToBeInserted(self, column: Column, row: int, count: int):
+        pass
+
+    def tasksInserted(self, column: Column, row: int, count: int):
+        pass
+
+    def tasksAboutToBeRemoved(self, column: Column, first: int, last: int):
+        pass
+
+    def tasksRemoved(self, column: Column, first: int, last: int):
+        pass
+
+    def columnInserted(self, column: Column, position: int):
+        pass
+
+    def columnRemoved(self, column: Column, position: int):
+        pass
+
+    def columnMoved(self, column: Column, old: int, new: int):
+        pass
+
+    def fieldChanged(self, target, name):
+        # target is the board, a column or a task, name the attribute that changed
+        pass
 
 
 class Board:
+    __slots__ = ("title", "columnList", "_taskIndex", "_keys", "_eventLog", "_searchIndex", "_dateIndex", "_undoStack",
+                 "revision", "observers")
+
     def __init__(self, title):
         self.title = title
         self.columnList = []
+        self._taskIndex = None
+        # id(column) -> sort keys of the column's tasks, built with the task index
+        self._keys = None
+        self._eventLog = None
+        self._searchIndex = None
+        self._dateIndex = None
+        self._undoStack = None
+        self.observers = []
+        # Bumped by every change made through the methods below, lets derived data such
+        # as analytics know when to recompute
+        self.revision = 0
+
+    # Task index: id -> TaskEntry. It is built on first use from columnList and kept up to
+    # date by the methods below, so once it exists tasks must be added, removed and moved
+    # through them rather than by editing column.taskList directly.
+
+    @property
+    def taskIndex(self) -> dict:
+        if self._taskIndex is None:
+            self.indexTasks()
+        return self._taskIndex
+
+    def indexTasks(self):
+        index = {}
+        self._keys = {}
+        for column in self.columnList:
+            self.indexColumn(column, index)
+        self._taskIndex = index
+
+    def indexColumn(self, column: Column, index: dict):
+        keys = [row * keySpacing for row in range(len(column.taskList))]
+        self._keys[id(column)] = keys
+        for task, key in zip(column.taskList, keys):
+            if task.id in index:
+                # Two tasks with the same id in a hand-edited file, keep the first one's
+                task.id = Task.newId()
+            index[task.id] = TaskEntry(column, keys, key, task)
+
+    def findTask(self, taskId) -> TaskEntry:
+        return self.taskIndex.get(taskId)
+
+    def placeTasks(self, column: Column, row: int, tasks: list):
+        # Index tasks just put in at row of column.taskList, with keys between those of
+        # their neighbours. Only when a gap has been split down to float precision does
+        # the column get its keys laid out again.
+        index = self._taskIndex
+        keys = self._keys[id(column)]
+        count = len(tasks)
+        low = keys[row - 1] if row > 0 else None
+        high = keys[row] if row < len(keys) else None
+        if low is None and high is None:
+            placed = [x * keySpacing for x in range(count)]
+        elif high is None:
+            placed = [low + (x + 1) * keySpacing for x in range(count)]
+        elif low is None:
+            placed = [high - (count - x) * keySpacing for x in range(count)]
+        else:
+            step = (high - low) / (count + 1)
+            placed = [low + (x + 1) * step for x in range(count)]
+        keys[row:row] = placed
+        for task, key in zip(tasks, placed):
+            index[task.id] = TaskEntry(column, keys, key, task)
+        bounds = [low] + placed + [high]
+        if low is not None and high is not None and not all(bounds[x] < bounds[x + 1] for x in range(count + 1)):
+            keys[:] = [x * keySpacing for x in range(len(keys))]
+            for task, key in zip(column.taskList, keys):
+                index[task.id].key = key
+
+    def addColumn(self, column: Column, position=None):
+        self.revision += 1
+        if position is None:
+            position = len(self.columnList)
+        self.columnList.insert(position, column)
+        if self._taskIndex is not None:
+            self.indexColumn(column, self._taskIndex)
+        self.tasksJoined(column.taskList)
+        for observer in self.observers:
+            observer.columnInserted(column, position)
+
+    def removeColumn(self, column: Column) -> int:
+        self.revision += 1
+        position = self.columnList.index(column)
+        del self.columnList[position]
+        if self._taskIndex is not None:
+            for task in column.taskList:
+                self._taskIndex.pop(task.id, None)
+            del self._keys[id(column)]
+        self.tasksLeft(column.taskList)
+        for observer in self.observers:
+            observer.columnRemoved(column, position)
+        return position
+
+    def moveColumn(self, column: Column, position: int) -> int:
+        # position is counted once the column has been taken out, returns the old one
+        self.revision += 1
+        old = self.columnList.index(column)
+        del self.columnList[old]
+        position = max(0, min(position, len(self.columnList)))
+        self.columnList.insert(position, column)
+        for observer in self.observers:
+            observer.columnMoved(column, old, position)
+        return old
+
+    # Tasks taken out with moving=True stay in the search and date indexes, for a move that
+    # puts them back with moving=True right after.
+
+    def insertTasks(self, column: Column, row: int, tasks: list, moving=False):
+        self.revision += 1
+        if self._taskIndex is None:
+            # Built before the tasks go in, placeTasks indexes them
+            self.indexTasks()
+        for observer in self.observers:
+            observer.tasksAboutToBeInserted(column, row, len(tasks))
+        column.taskList[row:row] = tasks
+        self.placeTasks(column, row, tasks)
+        if not moving:
+            self.tasksJoined(tasks)
+        for observer in self.observers:
+            observer.tasksInserted(column, row, len(tasks))
+
+    def takeTasks(self, column: Column, first: int, last: int, moving=False) -> list:
+        # Remove rows first..last (inclusive) of a column and return their tasks
+        self.revision += 1
+        index = self.taskIndex
+        for observer in self.observers:
+            observer.tasksAboutToBeRemoved(column, first, last)
+        tasks = column.taskList[first:last + 1]
+        del column.taskList[first:last + 1]
+        del self._keys[id(column)][first:last + 1]
+        for task in tasks:
+            del index[task.id]
+        if not moving:
+            self.tasksLeft(tasks)
+        for observer in self.observers:
+            observer.tasksRemoved(column, first, last)
+        return tasks
+
+    def takeRows(self, column: Column, rows: list, moving=False) -> list:
+        # Remove any set of rows of a column and return their tasks in row order. Runs of
+        # consecutive rows go out as one range each, bottom first.
+        rows = sorted(set(rows))
+        if not rows:
+            return []
+        self.revision += 1
+        index = self.taskIndex
+        taskList = column.taskList
+        keys = self._keys[id(column)]
+        tasks = [taskList[row] for row in rows]
+        end = len(rows)
+        while end > 0:
+            start = end - 1
+            while start > 0 and rows[start - 1] == rows[start] - 1:
+                start -= 1
+            first, last = rows[start], rows[end - 1]
+            for observer in self.observers:
+                observer.tasksAboutToBeRemoved(column, first, last)
+            del taskList[first:last + 1]
+            del keys[first:last + 1]
+            for observer in self.observers:
+                observer.tasksRemoved(column, first, last)
+            end = start
+        for task in tasks:
+            del index[task.id]
+        if not moving:
+            self.tasksLeft(tasks)
+        return tasks
+
+    def putRows(self, column: Column, rows: list, tasks: list, moving=False):
+        # Reverse of takeRows, the tasks go back to the rows they came from
+        if not rows:
+            return
+        self.revision += 1
+        if self._taskIndex is None:
+            # Built before the tasks go in, placeTasks indexes them
+            self.indexTasks()
+        taskList = column.taskList
+        x = 0
+        while x < len(rows):
+            y = x + 1
+            while y < len(rows) and rows[y] == rows[y - 1] + 1:
+                y += 1
+            for observer in self.observers:
+                observer.tasksAboutToBeInserted(column, rows[x], y - x)
+            taskList[rows[x]:rows[x]] = tasks[x:y]
+            self.placeTasks(column, rows[x], tasks[x:y])
+            for observer in self.observers:
+                observer.tasksInserted(column, rows[x], y - x)
+            x = y
+        if not moving:
+            self.tasksJoined(tasks)
+
+    def tasksJoined(self, tasks: list):
+        # Keep the indexes that have been built in step with tasks joining the board
+        if self._searchIndex is not None:
+            for task in tasks:
+                self._searchIndex.add(task)
+        if self._dateIndex is not None:
+            for task in tasks:
+                self._dateIndex.add(task)
+
+    def tasksLeft(self, tasks: list):
+        if self._searchIndex is not None:
+            for task in tasks:
+                self._searchIndex.remove(task.id)
+        if self._dateIndex is not None:
+            for task in tasks:
+                self._dateIndex.remove(task.id)
+
+    def addTask(self, column: Column, task: Task, row=None):
+        if row is None:
+            row = len(column.taskList)
+        self.insertTasks(column, row, [task])
+
+    def removeTask(self, task: Task):
+        entry = self.taskIndex[task.id]
+        column, row = entry.column, entry.position
+        self.takeTasks(column, row, row)
+        return column, row
+
+    def moveTask(self, task: Task, column: Column, row: int):
+        # row is the position in the target column once the task has been taken out
+        entry = self.taskIndex[task.id]
+        old = entry.position
+        self.takeTasks(entry.column, old, old, True)
+        self.insertTasks(column, row, [task], True)
+
+    def changeId(self, task: Task, taskId):
+        # Gives a task another id, for when a merged file brings a different task with its id
+        other = self.taskIndex.get(taskId)
+        if other is not None:
+            if other.task is task:
+                return
+            raise ValueError("Task id %s is already used by another task" % taskId)
+        self.revision += 1
+        entry = self.taskIndex.pop(task.id)
+        self.tasksLeft([task])
+        task.id = taskId
+        Task.reserveId(taskId)
+        for event in task.history:
+            if isinstance(event, HistoryEntry):
+                event.taskId = taskId
+        self.taskIndex[taskId] = entry
+        # The event log is keyed by task id, it is built again when next used
+        self._eventLog = None
+        self.tasksJoined([task])
+        task.touch()
+        for observer in self.observers:
+            observer.fieldChanged(task, "id")
+
+    # History events of all tasks, built from their histories on first use. New events are
+    # recorded with recordEvent so the log and the task's own history stay in step.
+
+    @property
+    def eventLog(self) -> EventLog:
+        if self._eventLog is None:
+            self._eventLog = EventLog.build(self.columnList)
+        return self._eventLog
+
+    def recordEvent(self, task: Task, action, column=None, fromColumn=None, when=None) -> HistoryEntry:
+        event = HistoryEntry(action, column, when, fromColumn, task.id)
+        self.appendEvent(task, event)
+        return event
+
+    def appendEvent(self, task: Task, event: HistoryEntry):
+        self.revision += 1
+        task.history.append(event)
+        task.touch()
+        if self._eventLog is not None:
+            self._eventLog.append(event)
+        if self._searchIndex is not None:
+            self._searchIndex.addText(task, event.action)
+            self._searchIndex.addText(task, event.column)
+            self._searchIndex.addText(task, event.fromColumn)
+        for observer in self.observers:
+            observer.fieldChanged(task, "history")
+
+    def removeEvent(self, task: Task, event: HistoryEntry):
+        # Takes back the last event recorded for a task
+        self.revision += 1
+        history = task.history
+        if history and history[-1] is event:
+            history.pop()
+        elif event in history:
+            history.remove(event)
+        task.touch()
+        if self._eventLog is not None:
+            self._eventLog.remove(event)
+        for observer in self.observers:
+            observer.fieldChanged(task, "history")
+
+    def setField(self, target, name, value):
+        # Edit an attribute of the board, a column or a task
+        setattr(target, name, value)
+        if isinstance(target, Task):
+            self.taskChanged(target)
+        else:
+            self.changed()
+        for observer in self.observers:
+            observer.fieldChanged(target, name)
+
+    @property
+    def undoStack(self) -> UndoStack:
+        if self._undoStack is None:
+            self._undoStack = UndoStack(self)
+        return self._undoStack
+
+    def changed(self):
+        # Board or column fields were edited in place
+        self.revision += 1
+
+    def taskChanged(self, task: Task):
+        # Title, description or dates of a task were edited in place
+        self.revision += 1
+        task.touch()
+        if self._searchIndex is not None:
+            self._searchIndex.update(task)
+        if self._dateIndex is not None:
+            self._dateIndex.update(task)
+
+    # Full-text index of the tasks on the board, built on first search. It reads every
+    # task's details, so lazily loaded boards only pay for it once somebody searches.
+
+    @property
+    def searchIndex(self) -> SearchIndex:
+        if self._searchIndex is None:
+            self._searchIndex = SearchIndex.build(self.columnList)
+        return self._searchIndex
+
+    @instrument.timed("search")
+    def search(self, text):
+        return self.searchIndex.search(text)
+
+    # Checked start and due dates of the tasks on the board, built on first use
+
+    @property
+    def dateIndex(self) -> DateIndex:
+        if self._dateIndex is None:
+            self._dateIndex = DateIndex.build(self.columnList)
+        return self._dateIndex
+
+
 def template():
     TODO = Column("TODO")
     task1 = Task("Task 1", "Description of task 1")
@@ -1,5 +1,33 @@
+def wipLimit(value):
+    # Limits come in as text from project files and older code, 0 means no limit
+    try:
+        return max(0, int(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
 class Column:
+    __slots__ = ("title", "_WIPLimit", "taskList")
+
     def __init__(self, title="Column name", WIPLimit=0):
         self.title = title
-        self.WIPLimit = WIPLimit
+        self._WIPLimit = wipLimit(WIPLimit)
         self.taskList = []
+
+    @property
+    def WIPLimit(self) -> int:
+        return self._WIPLimit
+
+    @WIPLimit.setter
+    def WIPLimit(self, value):
+        self._WIPLimit = wipLimit(value)
+
+    def count(self):
+        return len(self.taskList)
+
+    def canAccept(self, count=1):
+        # Whether count more tasks fit under the WIP limit
+        return self._WIPLimit == 0 or len(self.taskList) + count <= self._WIPLimit
+
+    def overLimit(self):
+        return self._WIPLimit != 0 and len(self.taskList) > self._WIPLimit
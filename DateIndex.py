@@ -0,0 +1,181 @@
+import bisect
+import datetime
+
+from Task import Task
+
+
+def toDay(day):
+    if isinstance(day, datetime.date):
+        return day.toordinal()
+    return day
+
+
+def taskInterval(task: Task):
+    # (first day, last day) a task covers through its checked dates, None without any
+    start = task.start if task.startChecked and isinstance(task.start, int) else None
+    end = task.end if task.endChecked and isinstance(task.end, int) else None
+    if start is None and end is None:
+        return None
+    if start is None:
+        return end, end
+    if end is None:
+        return start, start
+    return min(start, end), max(start, end)
+
+
+def intervalNode(first, last):
+    # Intervals are filed in a binary split of the days: at the level of the highest bit
+    # where first and last differ, under their common prefix. Every interval of a node
+    # above level 0 covers the two days around the node's middle.
+    level = (first ^ last).bit_length()
+    return level, first >> level
+
+
+class IntervalNode:
+    # Intervals of one node as sorted (first, id) and (last, id) lists
+    __slots__ = ("byFirst", "byLast")
+
+    def __init__(self):
+        self.byFirst = []
+        self.byLast = []
+
+
+class DateIndex:
+    # Checked start and end dates of the tasks on a board, kept up to date in place.
+    # Due dates are a sorted list of (day, id), so due and overdue queries are a bisect
+    # plus the results. The days tasks cover are filed in an implicit interval tree, a
+    # range query visits the nodes of the levels in use that the range touches and only
+    # reads past a node's edge for the tasks it returns.
+
+    def __init__(self):
+        self.ends = []
+        self.dueKeys = {}
+        self.intervals = {}
+        self.nodes = {}
+        # level -> sorted prefixes of the nodes that hold intervals
+        self.levels = {}
+
+    def add(self, task: Task):
+        self.remove(task.id)
+        interval = taskInterval(task)
+        if interval is not None:
+            self.addInterval(task.id, interval)
+        if task.endChecked and isinstance(task.end, int):
+            key = (task.end, task.id)
+            bisect.insort(self.ends, key)
+            self.dueKeys[task.id] = key
+
+    def remove(self, taskId):
+        interval = self.intervals.pop(taskId, None)
+        if interval is not None:
+            self.removeInterval(taskId, interval)
+        key = self.dueKeys.pop(taskId, None)
+        if key is not None:
+            del self.ends[bisect.bisect_left(self.ends, key)]
+
+    def update(self, task: Task):
+        self.add(task)
+
+    def addInterval(self, taskId, interval):
+        first, last = interval
+        self.intervals[taskId] = interval
+        level, prefix = intervalNode(first, last)
+        node = self.nodes.get((level, prefix))
+        if node is None:
+            node = self.nodes[level, prefix] = IntervalNode()
+            bisect.insort(self.levels.setdefault(level, []), prefix)
+        bisect.insort(node.byFirst, (first, taskId))
+        bisect.insort(node.byLast, (last, taskId))
+
+    def removeInterval(self, taskId, interval):
+        first, last = interval
+        level, prefix = intervalNode(first, last)
+        node = self.nodes[level, prefix]
+        del node.byFirst[bisect.bisect_left(node.byFirst, (first, taskId))]
+        del node.byLast[bisect.bisect_left(node.byLast, (last, taskId))]
+        if not node.byFirst:
+            del self.nodes[level, prefix]
+            prefixes = self.levels[level]
+            del prefixes[bisect.bisect_left(prefixes, prefix)]
+            if not prefixes:
+                del self.levels[level]
+
+    # Queries, days are date objects or ordinals, results are task ids
+
+    def dueBetween(self, first=None, last=None) -> list:
+        # Tasks due from first to last, both included, earliest first
+        low = 0 if first is None else bisect.bisect_left(self.ends, (toDay(first),))
+        high = len(self.ends) if last is None else bisect.bisect_left(self.ends, (toDay(last) + 1,))
+        return [taskId for day, taskId in self.ends[low:high]]
+
+    def overdue(self, today=None) -> list:
+        today = toDay(today) if today is not None else datetime.date.today().toordinal()
+        return self.dueBetween(None, today - 1)
+
+    def dueThisWeek(self, today=None) -> list:
+        today = toDay(today) if today is not None else datetime.date.today().toordinal()
+        monday = today - datetime.date.fromordinal(today).weekday()
+        return self.dueBetween(monday, monday + 6)
+
+    def overlapping(self, first, last) -> list:
+        # Tasks whose dates touch any day from first to last, e.g. a calendar page
+        first, last = toDay(first), toDay(last)
+        result = []
+        for level, prefixes in self.levels.items():
+            low = bisect.bisect_left(prefixes, first >> level)
+            high = bisect.bisect_right(prefixes, last >> level)
+            for prefix in prefixes[low:high]:
+                node = self.nodes[level, prefix]
+                middle = (prefix << level) + (1 << level >> 1)
+                if level == 0 or first <= middle and last >= middle - 1:
+                    result.extend(taskId for day, taskId in node.byFirst)
+                elif last < middle:
+                    # Only the tasks starting by last
+                    count = bisect.bisect_right(node.byFirst, (last, float("inf")))
+                    result.extend(taskId for day, taskId in node.byFirst[:count])
+                else:
+                    # Only the tasks ending from first on
+                    start = bisect.bisect_left(node.byLast, (first,))
+                    result.extend(taskId for day, taskId in node.byLast[start:])
+        return result
+
+    def daysCovered(self, first, last) -> set:
+        # Days from first to last that at least one task covers, for a calendar overview
+        first, last = toDay(first), toDay(last)
+        days = set()
+        for taskId in self.overlapping(first, last):
+            low, high = self.intervals[taskId]
+            days.update(range(max(low, first), min(high, last) + 1))
+        return days
+
+    def __len__(self):
+        return len(self.intervals)
+
+    @staticmethod
+    def build(columnList: list):
+        index = DateIndex()
+        ends = []
+        for column in columnList:
+            for task in column.taskList:
+                interval = taskInterval(task)
+                if interval is not None:
+                    index.intervals[task.id] = interval
+                    level, prefix = intervalNode(*interval)
+                    node = index.nodes.get((level, prefix))
+                    if node is None:
+                        node = index.nodes[level, prefix] = IntervalNode()
+                    node.byFirst.append((interval[0], task.id))
+                    node.byLast.append((interval[1], task.id))
+                if task.endChecked and isinstance(task.end, int):
+                    key = (task.end, task.id)
+                    ends.append(key)
+                    index.dueKeys[task.id] = key
+        for (level, prefix), node in index.nodes.items():
+            node.byFirst.sort()
+            node.byLast.sort()
+            index.levels.setdefault(level, []).append(prefix)
+        for prefixes in index.levels.values():
+            prefixes.sort()
+        ends.sort()
+        index.ends = ends
+        return index
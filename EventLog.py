@@ -0,0 +1,115 @@
+import bisect
+import calendar
+import datetime
+
+from Task import HistoryEntry
+
+
+def toSeconds(when):
+    # Event times are local wall-clock seconds, accept dates and datetimes for queries
+    if isinstance(when, datetime.datetime):
+        return calendar.timegm(when.timetuple())
+    if isinstance(when, datetime.date):
+        return calendar.timegm(when.timetuple())
+    return when
+
+
+class TimeIndex:
+    # Events sorted by time with a parallel list of their times for bisect
+    __slots__ = ("times", "events")
+
+    def __init__(self):
+        self.times = []
+        self.events = []
+
+    def add(self, event: HistoryEntry):
+        if not self.times or event.time >= self.times[-1]:
+            self.times.append(event.time)
+            self.events.append(event)
+        else:
+            position = bisect.bisect_right(self.times, event.time)
+            self.times.insert(position, event.time)
+            self.events.insert(position, event)
+
+    def remove(self, event: HistoryEntry):
+        position = bisect.bisect_left(self.times, event.time)
+        while position < len(self.events) and self.events[position] is not event:
+            position += 1
+        if position < len(self.events):
+            del self.times[position]
+            del self.events[position]
+
+    def between(self, start=None, end=None):
+        first = 0 if start is None else bisect.bisect_left(self.times, toSeconds(start))
+        last = len(self.times) if end is None else bisect.bisect_left(self.times, toSeconds(end))
+        return self.events[first:last]
+
+    def __len__(self):
+        return len(self.events)
+
+
+class EventLog:
+    # Board-wide, append-only log of the history events of every task. Events are kept
+    # in time order, once overall and once per column they moved into or out of, so
+    # range queries cost O(log n + k) instead of a pass over every task's history.
+
+    def __init__(self):
+        self.all = TimeIndex()
+        self.into = {}
+        self.outOf = {}
+
+    def append(self, event: HistoryEntry):
+        self.all.add(event)
+        if event.column is not None:
+            self.into.setdefault(event.column, TimeIndex()).add(event)
+        if event.fromColumn is not None:
+            self.outOf.setdefault(event.fromColumn, TimeIndex()).add(event)
+
+    def remove(self, event: HistoryEntry):
+        # Only for taking back an event that was just recorded, see UndoStack
+        self.all.remove(event)
+        if event.column in self.into:
+            self.into[event.column].remove(event)
+        if event.fromColumn in self.outOf:
+            self.outOf[event.fromColumn].remove(event)
+
+    def between(self, start=None, end=None, action=None):
+        events = self.all.between(start, end)
+        if action is not None:
+            events = [event for event in events if event.action == action]
+        return events
+
+    def movedInto(self, column, start=None, end=None):
+        index = self.into.get(column)
+        return index.between(start, end) if index is not None else []
+
+    def movedOutOf(self, column, start=None, end=None):
+        index = self.outOf.get(column)
+        return index.between(start, end) if index is not None else []
+
+    def __len__(self):
+        return len(self.all)
+
+    def __iter__(self):
+        return iter(self.all.events)
+
+    @staticmethod
+    def build(columnList: list):
+        log = EventLog()
+        events = []
+        for column in columnList:
+            for task in column.taskList:
+                previous = None
+                for event in task.history:
+                    if not isinstance(event, HistoryEntry):
+                        continue
+                    event.taskId = task.id
+                    if event.fromColumn is None and event.action == HistoryEntry.Moved and previous is not None:
+                        # Entries read from the old text form only know where a task went
+                        event.fromColumn = previous.column
+                    previous = event
+                    events.append(event)
+        events.sort(key=lambda event: event.time)
+        for event in events:
+            log.append(event)
+        return log
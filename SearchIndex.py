@@ -0,0 +1,145 @@
+import bisect
+import re
+
+from Task import Task
+
+tokenPattern = re.compile(r"\w+")
+
+
+def tokenize(text) -> set:
+    return set(tokenPattern.findall(text.lower())) if text else set()
+
+
+def taskTokens(task: Task) -> set:
+    tokens = tokenize(task.title)
+    tokens |= tokenize(task.describe)
+    # History is indexed by what happened and where, not by its timestamps, which would
+    # put every task in the postings of the same few dozen date tokens
+    for event in task.history:
+        if isinstance(event, str):
+            tokens |= tokenize(event)
+            continue
+        tokens |= tokenize(event.action)
+        tokens |= tokenize(event.column)
+        tokens |= tokenize(event.fromColumn)
+    return tokens
+
+
+class SearchIndex:
+    # Inverted index token -> set of task ids over titles, descriptions and history.
+    # Edits only mark a task dirty, it is re-tokenized once when the next search runs,
+    # so typing in a task costs nothing until somebody searches.
+
+    def __init__(self):
+        self.postings = {}
+        self.tokens = {}
+        self.vocabulary = []
+        self.dirty = {}
+
+    def add(self, task: Task):
+        self.addTokens(task.id, taskTokens(task))
+
+    def addTokens(self, taskId, tokens: set):
+        # Index an id under given tokens, for entries that are not Task objects
+        self.remove(taskId)
+        self.tokens[taskId] = tokens
+        postings = self.postings
+        for token in tokens:
+            ids = postings.get(token)
+            if ids is None:
+                ids = postings[token] = set()
+                bisect.insort(self.vocabulary, token)
+            ids.add(taskId)
+
+    def addText(self, task: Task, text):
+        # New text on an indexed task, e.g. a history event, without re-reading the rest
+        tokens = self.tokens.get(task.id)
+        if tokens is None:
+            return
+        for token in tokenize(text) - tokens:
+            tokens.add(token)
+            ids = self.postings.get(token)
+            if ids is None:
+                ids = self.postings[token] = set()
+                bisect.insort(self.vocabulary, token)
+            ids.add(task.id)
+
+    def remove(self, taskId):
+        self.dirty.pop(taskId, None)
+        tokens = self.tokens.pop(taskId, None)
+        if not tokens:
+            return
+        for token in tokens:
+            ids = self.postings[token]
+            ids.discard(taskId)
+            if not ids:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+
+    def update(self, task: Task):
+        if task.id in self.tokens:
+            self.dirty[task.id] = task
+
+    def flush(self):
+        dirty = self.dirty
+        self.dirty = {}
+        for task in dirty.values():
+            self.add(task)
+
+    def prefixed(self, prefix) -> set:
+        vocabulary = self.vocabulary
+        first = bisect.bisect_left(vocabulary, prefix)
+        last = bisect.bisect_left(vocabulary, prefix + "\U0010ffff", first)
+        if last - first == 1:
+            return self.postings[vocabulary[first]]
+        result = set()
+        for position in range(first, last):
+            result |= self.postings[vocabulary[position]]
+        return result
+
+    def search(self, text):
+        # Ids of the tasks containing every word of the text, the last word may be
+        # incomplete and matches as a prefix. None for an empty query.
+        words = tokenPattern.findall(text.lower())
+        if not words:
+            return None
+        if self.dirty:
+            self.flush()
+
+        # Smallest postings first so the intersection shrinks quickly
+        sets = [self.postings.get(word, set()) for word in words[:-1]]
+        if text[-1:].isspace():
+            sets.append(self.postings.get(words[-1], set()))
+        else:
+            sets.append(self.prefixed(words[-1]))
+        sets.sort(key=len)
+        result = set(sets[0])
+        for ids in sets[1:]:
+            if not result:
+                break
+            result &= ids
+        return result
+
+    def __len__(self):
+        return len(self.tokens)
+
+    @staticmethod
+    def build(columnList: list):
+        return SearchIndex.fromTokens((task.id, taskTokens(task)) for column in columnList
+                                      for task in column.taskList)
+
+    @staticmethod
+    def fromTokens(entries):
+        # Index built in one pass from (id, tokens) pairs
+        index = SearchIndex()
+        postings = index.postings
+        tokens = index.tokens
+        for taskId, words in entries:
+            tokens[taskId] = words
+            for word in words:
+                ids = postings.get(word)
+                if ids is None:
+                    ids = postings[word] = set()
+                ids.add(taskId)
+        index.vocabulary = sorted(postings)
+        return index
@@ -1,12 +1,288 @@
+import calendar
+import datetime
+import sys
+import time
+
+
+dayCache = {}
+
+
+def parseDate(text):
+    # "d/m/yyyy" -> day ordinal. Anything that would not be written back the same way is
+    # kept as the original string so no file content is lost.
+    if not text:
+        return None
+    parts = text.split("/")
+    if len(parts) == 3 and all(part.isdigit() for part in parts):
+        try:
+            ordinal = datetime.date(int(parts[2]), int(parts[1]), int(parts[0])).toordinal()
+        except ValueError:
+            return text
+        if formatDate(ordinal) == text:
+            # Boards use few distinct days, share one int object per day
+            return dayCache.setdefault(ordinal, ordinal)
+    return text
+
+
+def formatDate(day):
+    if day is None:
+        return ""
+    if isinstance(day, str):
+        return day
+    date = datetime.date.fromordinal(day)
+    return str(date.day) + "/" + str(date.month) + "/" + str(date.year)
+
+
+def checkState(value):
+    if isinstance(value, str):
+        return value.strip() not in ("", "0")
+    return bool(value)
+
+
+months = {name: number for number, name in enumerate(calendar.month_abbr) if name}
+weekdays = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+epochDay = datetime.date(1970, 1, 1).toordinal()
+
+
+def localSeconds():
+    # Local wall-clock time as seconds, the way time.asctime(time.localtime()) shows it
+    return calendar.timegm(time.localtime())
+
+
+class HistoryEntry:
+    # One typed event of a task's history: when it happened, what happened and the column
+    # it left (fromColumn) and entered (column). Renders to the same text the history used
+    # to be stored as, e.g. "Moved to Done on Sun Oct 18 07:20:08 2026".
+    __slots__ = ("time", "action", "column", "fromColumn", "taskId")
+
+    Created = "Created"
+    Moved = "Moved"
+
+    def __init__(self, action, column=None, when=None, fromColumn=None, taskId=None):
+        self.action = sys.intern(action)
+        self.column = sys.intern(column) if column is not None else None
+        self.fromColumn = sys.intern(fromColumn) if fromColumn is not None else None
+        self.time = localSeconds() if when is None else when
+        self.taskId = taskId
+
+    def __str__(self):
+        stamp = time.asctime(time.gmtime(self.time))
+        if self.action == HistoryEntry.Moved:
+            return "Moved to " + (self.column or "") + " on " + stamp
+        return self.action + " on " + stamp
+
+    def __repr__(self):
+        return "HistoryEntry(%r)" % str(self)
+
+    @staticmethod
+    def parse(text):
+        # Entries are kept as HistoryEntry when the text is one of the generated forms,
+        # any other text is kept as it is
+        if not text:
+            return text
+        if text.startswith("Created on "):
+            action, column, stamp = HistoryEntry.Created, None, text[11:]
+        elif text.startswith("Moved to ") and " on " in text:
+            column, _, stamp = text[9:].rpartition(" on ")
+            action = HistoryEntry.Moved
+        else:
+            return text
+
+        parts = stamp.split()
+        if len(parts) != 5 or parts[1] not in months:
+            return text
+        try:
+            hour, minute, second = map(int, parts[3].split(":"))
+            day = datetime.date(int(parts[4]), months[parts[1]], int(parts[2]))
+        except (ValueError, OverflowError):
+            return text
+        if 0 <= hour < 24 and 0 <= minute < 60 and 0 <= second < 60 and day.year >= 1000:
+            # Only text that renders back the same becomes an entry. asctime's layout is
+            # rebuilt here, cheaper than formatting the entry, imports parse millions of these.
+            if stamp != "%s %s %2d %02d:%02d:%02d %d" % (weekdays[day.weekday()], parts[1], day.day, hour, minute,
+                                                          second, day.year):
+                return text
+            return HistoryEntry(action, column, (day.toordinal() - epochDay) * 86400 + hour * 3600 + minute * 60
+                                + second)
+        try:
+            when = calendar.timegm((day.year, day.month, day.day, hour, minute, second))
+        except (ValueError, OverflowError):
+            return text
+        entry = HistoryEntry(action, column, when)
+        return entry if str(entry) == text else text
+
+
+class TaskPair:
+    # List-like view of the two dates or check states of a task, kept for code written
+    # against the old [start, end] lists
+    __slots__ = ("task",)
+
+    def __init__(self, task):
+        self.task = task
+
+    def __len__(self):
+        return 2
+
+    def __iter__(self):
+        yield self[0]
+        yield self[1]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class TaskDates(TaskPair):
+    __slots__ = ()
+
+    def __getitem__(self, index):
+        return formatDate(self.task.end if range(2)[index] else self.task.start)
+
+    def __setitem__(self, index, value):
+        if range(2)[index]:
+            self.task.end = parseDate(value)
+        else:
+            self.task.start = parseDate(value)
+
+
+class TaskCheckStates(TaskPair):
+    __slots__ = ()
+
+    def __getitem__(self, index):
+        return "1" if self.task.flags & (1 << range(2)[index]) else "0"
+
+    def __setitem__(self, index, value):
+        bit = 1 << range(2)[index]
+        if checkState(value):
+            self.task.flags |= bit
+        else:
+            self.task.flags &= ~bit
+
+
 class Task:
+    __slots__ = ("title", "_describe", "start", "end", "flags", "_history", "id", "revision", "source",
+                 "sourceIndex")
+
     totalTask = 1
 
     def __init__(self, title="Task's title", describe="description", startDate="", endDate=""):
         self.title = title
-        self.describe = describe
+        self._describe = describe
         # self.priority = priority
-        self.date = [startDate, endDate]
-        self.dateCheckStatus = ["0", "0"]
-        self.history = []
-        self.id = Task.totalTask
+        # Day ordinals (or the raw text of a date that is not d/m/yyyy), see parseDate
+        self.start = parseDate(startDate)
+        self.end = parseDate(endDate)
+        # Bit 0: start date checked, bit 1: end date checked
+        self.flags = 0
+        self._history = []
+        self.id = Task.newId()
+        # Bumped on every edit so savers can tell which tasks changed since they last ran
+        self.revision = 0
+        # Set by db.parserXML when the description and history are left in the file
+        # until something reads them
+        self.source = None
+        self.sourceIndex = -1
+
+    @staticmethod
+    def newId():
+        taskId = Task.totalTask
         Task.totalTask += 1
+        return taskId
+
+    @staticmethod
+    def reserveId(taskId):
+        # Make sure ids handed out from now on do not clash with a loaded one
+        if taskId >= Task.totalTask:
+            Task.totalTask = taskId + 1
+
+    @property
+    def date(self):
+        return TaskDates(self)
+
+    @date.setter
+    def date(self, value):
+        self.start = parseDate(value[0])
+        self.end = parseDate(value[1])
+
+    @property
+    def dateCheckStatus(self):
+        return TaskCheckStates(self)
+
+    @dateCheckStatus.setter
+    def dateCheckStatus(self, value):
+        self.flags = int(checkState(value[0])) | int(checkState(value[1])) << 1
+
+    @property
+    def startDay(self):
+        return self.start if isinstance(self.start, int) else None
+
+    @property
+    def endDay(self):
+        return self.end if isinstance(self.end, int) else None
+
+    @property
+    def startDate(self):
+        return datetime.date.fromordinal(self.start) if isinstance(self.start, int) else None
+
+    @startDate.setter
+    def startDate(self, value: datetime.date):
+        self.start = value.toordinal() if value is not None else None
+
+    @property
+    def endDate(self):
+        return datetime.date.fromordinal(self.end) if isinstance(self.end, int) else None
+
+    @endDate.setter
+    def endDate(self, value: datetime.date):
+        self.end = value.toordinal() if value is not None else None
+
+    @property
+    def startChecked(self):
+        return bool(self.flags & 1)
+
+    @startChecked.setter
+    def startChecked(self, value):
+        self.flags = (self.flags & ~1) | int(bool(value))
+
+    @property
+    def endChecked(self):
+        return bool(self.flags & 2)
+
+    @endChecked.setter
+    def endChecked(self, value):
+        self.flags = (self.flags & ~2) | int(bool(value)) << 1
+
+    @property
+    def describe(self):
+        if self.source is not None:
+            self.loadDetails()
+        return self._describe
+
+    @describe.setter
+    def describe(self, value):
+        if self.source is not None:
+            self.loadDetails()
+        self._describe = value
+
+    @property
+    def history(self):
+        if self.source is not None:
+            self.loadDetails()
+        return self._history
+
+    @history.setter
+    def history(self, value):
+        if self.source is not None:
+            self.loadDetails()
+        self._history = value
+
+    def loadDetails(self):
+        source = self.source
+        if source is not None:
+            self.source = None
+            self._describe, self._history = source.loadDetails(self.sourceIndex)
+
+    def touch(self):
+        self.revision += 1
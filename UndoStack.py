@@ -0,0 +1,293 @@
+import sys
+import time
+from collections import deque
+
+import instrument
+from Task import HistoryEntry, Task, localSeconds
+
+# Rough per-object overhead used when estimating what a command keeps alive
+objectSize = 64
+
+
+def taskSize(task: Task):
+    # What a task held only by the undo stack costs, its details included
+    size = objectSize * 2 + sys.getsizeof(task.title)
+    if task.source is None:
+        size += sys.getsizeof(task.describe or "") + objectSize * len(task.history)
+    return size
+
+
+class Command:
+    # One undoable change, stored as what is needed to apply and reverse it rather than
+    # a copy of the board
+    __slots__ = ()
+
+    def redo(self, board):
+        raise NotImplementedError
+
+    def undo(self, board):
+        raise NotImplementedError
+
+    def size(self):
+        return objectSize
+
+    def merge(self, command) -> bool:
+        return False
+
+
+class InsertTasks(Command):
+    __slots__ = ("column", "row", "tasks", "events")
+
+    def __init__(self, column, row, tasks: list, events: list):
+        self.column = column
+        self.row = row
+        self.tasks = tasks
+        self.events = events
+
+    def redo(self, board):
+        board.insertTasks(self.column, self.row, self.tasks)
+        for task, event in zip(self.tasks, self.events):
+            board.appendEvent(task, event)
+
+    def undo(self, board):
+        for task, event in zip(self.tasks, self.events):
+            board.removeEvent(task, event)
+        board.takeTasks(self.column, self.row, self.row + len(self.tasks) - 1)
+
+    def size(self):
+        return objectSize + sum(taskSize(task) for task in self.tasks)
+
+
+class RemoveTasks(Command):
+    __slots__ = ("column", "rows", "tasks")
+
+    def __init__(self, column, rows: list, tasks: list):
+        self.column = column
+        self.rows = rows
+        self.tasks = tasks
+
+    def redo(self, board):
+        board.takeRows(self.column, self.rows)
+
+    def undo(self, board):
+        board.putRows(self.column, self.rows, self.tasks)
+
+    def size(self):
+        return objectSize + sum(taskSize(task) for task in self.tasks)
+
+
+class MoveTasks(Command):
+    __slots__ = ("source", "rows", "tasks", "target", "row", "events")
+
+    def __init__(self, source, rows: list, tasks: list, target, row, events: list):
+        self.source = source
+        self.rows = rows
+        self.tasks = tasks
+        self.target = target
+        self.row = row
+        self.events = events
+
+    def redo(self, board):
+        board.takeRows(self.source, self.rows, True)
+        board.insertTasks(self.target, self.row, self.tasks, True)
+        for task, event in zip(self.tasks, self.events):
+            board.appendEvent(task, event)
+
+    def undo(self, board):
+        for task, event in zip(self.tasks, self.events):
+            board.removeEvent(task, event)
+        board.takeTasks(self.target, self.row, self.row + len(self.tasks) - 1, True)
+        board.putRows(self.source, self.rows, self.tasks, True)
+
+    def size(self):
+        return objectSize * (1 + len(self.events)) + 16 * len(self.tasks)
+
+
+class InsertColumn(Command):
+    __slots__ = ("column", "position")
+
+    def __init__(self, column, position):
+        self.column = column
+        self.position = position
+
+    def redo(self, board):
+        board.addColumn(self.column, self.position)
+
+    def undo(self, board):
+        board.removeColumn(self.column)
+
+    def size(self):
+        return objectSize + sum(taskSize(task) for task in self.column.taskList)
+
+
+class RemoveColumn(InsertColumn):
+    __slots__ = ()
+
+    def redo(self, board):
+        InsertColumn.undo(self, board)
+
+    def undo(self, board):
+        InsertColumn.redo(self, board)
+
+
+class MoveColumn(Command):
+    __slots__ = ("column", "old", "new")
+
+    def __init__(self, column, old, new):
+        self.column = column
+        self.old = old
+        self.new = new
+
+    def redo(self, board):
+        board.moveColumn(self.column, self.new)
+
+    def undo(self, board):
+        board.moveColumn(self.column, self.old)
+
+
+class SetField(Command):
+    __slots__ = ("target", "name", "old", "new", "time")
+
+    def __init__(self, target, name, old, new):
+        self.target = target
+        self.name = name
+        self.old = old
+        self.new = new
+        self.time = time.monotonic()
+
+    def redo(self, board):
+        board.setField(self.target, self.name, self.new)
+
+    def undo(self, board):
+        board.setField(self.target, self.name, self.old)
+
+    def size(self):
+        return objectSize + sys.getsizeof(self.old) + sys.getsizeof(self.new)
+
+    def merge(self, command) -> bool:
+        # Keystrokes into the same field while the user keeps typing become one edit
+        if not isinstance(command, SetField) or command.target is not self.target or command.name != self.name \
+                or command.time - self.time > UndoStack.mergeInterval:
+            return False
+        self.new = command.new
+        self.time = command.time
+        return True
+
+
+class UndoStack:
+    # Board operations that can be undone. Each method applies its change through the
+    # Board and keeps a Command to reverse it. Old commands are dropped once the stack
+    # holds more than maxCount of them or their estimated size passes maxBytes.
+    maxCount = 1000
+    maxBytes = 16 * 2 ** 20
+    mergeInterval = 2.0
+
+    def __init__(self, board):
+        self.board = board
+        self.undoList = deque()
+        self.redoList = []
+        self.bytes = 0
+
+    def push(self, command: Command):
+        for done in self.redoList:
+            self.bytes -= done.size()
+        self.redoList = []
+
+        if self.undoList:
+            top = self.undoList[-1]
+            before = top.size()
+            if top.merge(command):
+                self.bytes += top.size() - before
+                return
+        self.undoList.append(command)
+        self.bytes += command.size()
+        while self.undoList and (len(self.undoList) > self.maxCount or self.bytes > self.maxBytes):
+            self.bytes -= self.undoList.popleft().size()
+
+    def canUndo(self):
+        return bool(self.undoList)
+
+    def canRedo(self):
+        return bool(self.redoList)
+
+    @instrument.timed("undo")
+    def undo(self):
+        if not self.undoList:
+            return False
+        command = self.undoList.pop()
+        command.undo(self.board)
+        self.redoList.append(command)
+        return True
+
+    @instrument.timed("redo")
+    def redo(self):
+        if not self.redoList:
+            return False
+        command = self.redoList.pop()
+        command.redo(self.board)
+        self.undoList.append(command)
+        return True
+
+    def clear(self):
+        self.undoList.clear()
+        self.redoList = []
+        self.bytes = 0
+
+    # Operations
+
+    def addTasks(self, column, row, tasks: list):
+        events = [self.board.recordEvent(task, HistoryEntry.Created, column.title) for task in tasks]
+        self.board.insertTasks(column, row, tasks)
+        self.push(InsertTasks(column, row, tasks, events))
+
+    def removeTasks(self, column, rows: list) -> list:
+        rows = sorted(set(rows))
+        for row in rows:
+            # Tasks left in the project file would lose their details at the next save
+            column.taskList[row].loadDetails()
+        tasks = self.board.takeRows(column, rows)
+        self.push(RemoveTasks(column, rows, tasks))
+        return tasks
+
+    def moveTasks(self, source, rows: list, target, row) -> list:
+        # row is the drop position in target before the rows are taken out of source. The
+        # whole selection moves as one batch and shares one history timestamp.
+        rows = sorted(set(rows))
+        if not rows:
+            return []
+        if source is target:
+            row -= len([x for x in rows if x < row])
+        tasks = self.board.takeRows(source, rows, True)
+        self.board.insertTasks(target, row, tasks, True)
+        events = []
+        if source is not target:
+            when = localSeconds()
+            events = [self.board.recordEvent(task, HistoryEntry.Moved, target.title, source.title, when)
+                      for task in tasks]
+        self.push(MoveTasks(source, rows, tasks, target, row, events))
+        return tasks
+
+    def addColumn(self, column, position=None):
+        if position is None:
+            position = len(self.board.columnList)
+        self.board.addColumn(column, position)
+        self.push(InsertColumn(column, position))
+
+    def removeColumn(self, column):
+        for task in column.taskList:
+            task.loadDetails()
+        position = self.board.removeColumn(column)
+        self.push(RemoveColumn(column, position))
+
+    def moveColumn(self, column, position):
+        old = self.board.moveColumn(column, position)
+        new = self.board.columnList.index(column)
+        if old != new:
+            self.push(MoveColumn(column, old, new))
+
+    def setField(self, target, name, value):
+        old = getattr(target, name)
+        if old == value:
+            return
+        self.board.setField(target, name, value)
+        self.push(SetField(target, name, old, value))
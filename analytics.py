@@ -0,0 +1,265 @@
+# Flow metrics of a board computed with NumPy over columnar copies of its event log.
+#
+# Times are the wall-clock seconds of the history events (see Task.localSeconds). The
+# done column defaults to the last column of the board and the backlog to the first,
+# every column in between counts as work in progress.
+from operator import attrgetter
+
+import numpy as np
+
+from Board import Board
+from Task import HistoryEntry, localSeconds
+
+daySeconds = 86400
+
+
+class ActionCodes(dict):
+    def __missing__(self, action):
+        return 2
+
+
+actionCodes = ActionCodes({HistoryEntry.Created: 0, HistoryEntry.Moved: 1})
+
+getTime = attrgetter("time")
+getTaskId = attrgetter("taskId")
+getAction = attrgetter("action")
+getColumn = attrgetter("column")
+getFromColumn = attrgetter("fromColumn")
+getId = attrgetter("id")
+
+
+class Codes(dict):
+    # Column name -> code, numbering names the first time they are looked up
+    def __init__(self, names: list):
+        super().__init__({None: -1})
+        self.names = names
+
+    def __missing__(self, name):
+        code = self[name] = len(self.names)
+        self.names.append(name)
+        return code
+
+
+class FlowData:
+    # One entry per event, sorted by time. Columns are stored as codes into columnNames,
+    # -1 when an event has no source or target column.
+
+    def __init__(self):
+        self.time = np.empty(0, np.int64)
+        self.task = np.empty(0, np.int64)
+        self.action = np.empty(0, np.int8)
+        self.source = np.empty(0, np.int32)
+        self.target = np.empty(0, np.int32)
+        self.columnNames = []
+        self.columnCodes = Codes(self.columnNames)
+        self.lastEvent = None
+        self.eventCount = 0
+
+    def columnCode(self, name):
+        return self.columnCodes[name]
+
+    def extend(self, events: list):
+        count = len(events)
+        code = self.columnCodes.__getitem__
+        time = np.fromiter(map(getTime, events), np.int64, count)
+        task = np.fromiter(map(getTaskId, events), np.int64, count)
+        action = np.fromiter(map(actionCodes.__getitem__, map(getAction, events)), np.int8, count)
+        source = np.fromiter(map(code, map(getFromColumn, events)), np.int32, count)
+        target = np.fromiter(map(code, map(getColumn, events)), np.int32, count)
+
+        if self.eventCount and count and time[0] < self.time[-1]:
+            # Late events, merge them into place
+            order = np.argsort(np.concatenate((self.time, time)), kind="stable")
+        else:
+            order = None
+        self.time = np.concatenate((self.time, time))
+        self.task = np.concatenate((self.task, task))
+        self.action = np.concatenate((self.action, action))
+        self.source = np.concatenate((self.source, source))
+        self.target = np.concatenate((self.target, target))
+        if order is not None:
+            for name in ("time", "task", "action", "source", "target"):
+                setattr(self, name, getattr(self, name)[order])
+        self.eventCount += count
+
+
+def firstPerTask(task, mask, time):
+    # Ids and times of the first event of each task among the masked events. Events are
+    # in time order, so np.unique's first index is the earliest one.
+    ids, first = np.unique(task[mask], return_index=True)
+    return ids, time[mask][first]
+
+
+class FlowAnalytics:
+    def __init__(self, board: Board, doneColumn=None, backlogColumn=None):
+        self.board = board
+        self.doneColumn = doneColumn
+        self.backlogColumn = backlogColumn
+        self.flow = FlowData()
+        self.cache = {}
+        self.cacheKey = None
+
+    # Data
+
+    def key(self):
+        return self.board.revision, tuple((column.title, column.WIPLimit) for column in self.board.columnList)
+
+    def data(self) -> FlowData:
+        log = self.board.eventLog
+        events = log.all.events
+        flow = self.flow
+        if flow.eventCount == len(events) and (not events or events[-1] is flow.lastEvent):
+            return flow
+
+        if flow.eventCount and flow.eventCount <= len(events) and events[flow.eventCount - 1] is flow.lastEvent:
+            # Only appended since last time
+            flow.extend(events[flow.eventCount:])
+        else:
+            flow = self.flow = FlowData()
+            flow.extend(events)
+        flow.lastEvent = events[-1] if events else None
+        return flow
+
+    def cached(self, name, compute, *args):
+        key = self.key()
+        if key != self.cacheKey:
+            self.cache = {}
+            self.cacheKey = key
+        if (name, args) not in self.cache:
+            self.cache[(name, args)] = compute(*args)
+        return self.cache[(name, args)]
+
+    def columnRoles(self, flow: FlowData):
+        titles = [column.title for column in self.board.columnList]
+        done = self.doneColumn if self.doneColumn is not None else (titles[-1] if titles else None)
+        backlog = self.backlogColumn if self.backlogColumn is not None else (titles[0] if titles else None)
+        inProgress = [title for title in titles if title != done and title != backlog]
+        return (flow.columnCode(done) if done is not None else -2,
+                np.array([flow.columnCode(title) for title in inProgress], np.int32))
+
+    # Metrics
+
+    def leadTimes(self):
+        # (task ids, seconds from the first event of a task until it first entered done)
+        return self.cached("leadTimes", self.computeLeadTimes)
+
+    def computeLeadTimes(self):
+        flow = self.data()
+        done, _ = self.columnRoles(flow)
+        doneIds, doneTimes = firstPerTask(flow.task, flow.target == done, flow.time)
+        startIds, startTimes = firstPerTask(flow.task, np.ones(len(flow.task), bool), flow.time)
+        startTimes = startTimes[np.searchsorted(startIds, doneIds)]
+        return doneIds, doneTimes - startTimes
+
+    def cycleTimes(self):
+        # (task ids, seconds from first entering a work-in-progress column until done)
+        return self.cached("cycleTimes", self.computeCycleTimes)
+
+    def computeCycleTimes(self):
+        flow = self.data()
+        done, inProgress = self.columnRoles(flow)
+        doneIds, doneTimes = firstPerTask(flow.task, flow.target == done, flow.time)
+        startIds, startTimes = firstPerTask(flow.task, np.isin(flow.target, inProgress), flow.time)
+        ids, doneIndex, startIndex = np.intersect1d(doneIds, startIds, assume_unique=True, return_indices=True)
+        cycle = doneTimes[doneIndex] - startTimes[startIndex]
+        keep = cycle >= 0
+        return ids[keep], cycle[keep]
+
+    def throughput(self, period=daySeconds):
+        # (period start times, number of tasks that first entered done in each period)
+        return self.cached("throughput", self.computeThroughput, period)
+
+    def computeThroughput(self, period):
+        flow = self.data()
+        done, _ = self.columnRoles(flow)
+        _, doneTimes = firstPerTask(flow.task, flow.target == done, flow.time)
+        if not len(doneTimes):
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        origin = doneTimes.min() // period * period
+        counts = np.bincount((doneTimes - origin) // period)
+        return origin + period * np.arange(len(counts), dtype=np.int64), counts
+
+    def transitions(self):
+        return self.cached("transitions", self.computeTransitions)
+
+    def computeTransitions(self):
+        # (times, column codes, +1/-1) for every time a task entered or left a column,
+        # plus tasks that were already in a column before their first recorded event
+        flow = self.data()
+        leaving = flow.source >= 0
+        entering = flow.target >= 0
+        times = [flow.time[leaving], flow.time[entering]]
+        columns = [flow.source[leaving], flow.target[entering]]
+        deltas = [np.full(leaving.sum(), -1, np.int64), np.ones(entering.sum(), np.int64)]
+
+        _, firstIndex = np.unique(flow.task, return_index=True)
+        before = firstIndex[(flow.action[firstIndex] != 0) & (flow.source[firstIndex] >= 0)]
+        origin = flow.time[0] if len(flow.time) else localSeconds()
+        times.append(np.full(len(before), origin, np.int64))
+        columns.append(flow.source[before])
+        deltas.append(np.ones(len(before), np.int64))
+
+        # Tasks without any event sit in their current column the whole time
+        ids = []
+        codes = []
+        for column in self.board.columnList:
+            ids.extend(map(getId, column.taskList))
+            codes.append(np.full(len(column.taskList), flow.columnCode(column.title), np.int32))
+        quiet = np.concatenate(codes)[~np.isin(np.array(ids, np.int64), flow.task)] if ids else np.empty(0, np.int32)
+        times.append(np.full(len(quiet), origin, np.int64))
+        columns.append(quiet)
+        deltas.append(np.ones(len(quiet), np.int64))
+
+        times = np.concatenate(times)
+        order = np.argsort(times, kind="stable")
+        return times[order], np.concatenate(columns)[order], np.concatenate(deltas)[order], origin
+
+    def cumulativeFlow(self, period=daySeconds):
+        # (sample times, counts[sample, column]) with the number of tasks in each board
+        # column at the end of each period, in board column order
+        return self.cached("cumulativeFlow", self.computeCumulativeFlow, period)
+
+    def computeCumulativeFlow(self, period):
+        times, columns, deltas, origin = self.transitions()
+        flow = self.flow
+        start = origin // period * period
+        end = max(int(times[-1]) if len(times) else start, localSeconds())
+        bins = (end - start) // period + 1
+        matrix = np.zeros((bins, len(flow.columnNames)), np.int64)
+        np.add.at(matrix, ((times - start) // period, columns), deltas)
+        counts = np.cumsum(matrix, axis=0)
+        boardColumns = [flow.columnCode(column.title) for column in self.board.columnList]
+        if counts.shape[1] < len(flow.columnNames):
+            counts = np.pad(counts, ((0, 0), (0, len(flow.columnNames) - counts.shape[1])))
+        return start + period * np.arange(1, bins + 1, dtype=np.int64), counts[:, boardColumns]
+
+    def wipOverTime(self, period=daySeconds):
+        # (sample times, number of tasks in work-in-progress columns)
+        return self.cached("wipOverTime", self.computeWipOverTime, period)
+
+    def computeWipOverTime(self, period):
+        samples, counts = self.cumulativeFlow(period)
+        titles = [column.title for column in self.board.columnList]
+        done, inProgress = self.columnRoles(self.flow)
+        codes = [self.flow.columnCode(title) for title in titles]
+        mask = np.isin(np.array(codes, np.int32), inProgress)
+        return samples, counts[:, mask].sum(axis=1)
+
+    def wipBreaches(self):
+        # {column title: seconds spent above its WIP limit} for columns with a limit
+        return self.cached("wipBreaches", self.computeWipBreaches)
+
+    def computeWipBreaches(self):
+        times, columns, deltas, origin = self.transitions()
+        now = localSeconds()
+        result = {}
+        for column in self.board.columnList:
+            limit = column.WIPLimit
+            if limit <= 0:
+                continue
+            mask = columns == self.flow.columnCode(column.title)
+            columnTimes = times[mask]
+            counts = np.cumsum(deltas[mask])
+            spans = np.diff(np.append(columnTimes, max(now, int(columnTimes[-1]) if len(columnTimes) else now)))
+            result[column.title] = int(spans[counts > limit].sum())
+        return result
@@ -0,0 +1,227 @@
+# Cold storage for finished tasks. Archived tasks leave the board and are appended to
+# <project file>.archive, one zlib-compressed JSON record each (a bulk.taskRow plus the
+# day it is filed under), and are never rewritten. The .archive.idx file next to it is
+# the index, also append-only: per task the id, where its record is, its day and its
+# title. Looking tasks up by id, day or title words reads only the index, restoring one
+# reads one record. Restoring appends a tombstone entry to the index.
+import bisect
+import json
+import os
+import struct
+import zlib
+
+from SearchIndex import SearchIndex, tokenize
+from Task import HistoryEntry, epochDay, localSeconds
+
+recordHeader = struct.Struct("<I")
+# id, record offset, record size (0 for a tombstone), day, title length; the title follows
+indexEntry = struct.Struct("<qQIiH")
+
+# Preset dictionary for the records, which are too small to compress well on their own.
+# Archives written with it can only be read with it, never change it.
+recordDictionary = (b'"history":["Created on Moved to  on Mon Tue Wed Thu Fri Sat Sun Jan Feb Mar Apr May Jun Jul '
+                    b'Aug Sep Oct Nov Dec 2020 2021 2022 2023 2024 2025 2026 "],"startChecked":false,"endChecked":'
+                    b'true,"start":"","end":"","describe":"description","day":{"id":,"column":"Done","title":"')
+
+
+def archiveName(projectFile):
+    return projectFile + ".archive"
+
+
+def finishedDay(task):
+    # Day of the task's last timed history event, None without one
+    for event in reversed(task.history):
+        if isinstance(event, HistoryEntry):
+            return event.time // 86400 + epochDay
+    return None
+
+
+class ArchiveEntry:
+    __slots__ = ("id", "offset", "size", "day", "title")
+
+    def __init__(self, taskId, offset, size, day, title):
+        self.id = taskId
+        self.offset = offset
+        self.size = size
+        self.day = day
+        self.title = title
+
+    def pack(self):
+        title = self.title.encode("utf-8")[:0xffff]
+        return indexEntry.pack(self.id, self.offset, self.size, self.day, len(title)) + title
+
+
+class Archive:
+    # The index is read on first use, records only when a task is fetched
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.indexName = fileName + ".idx"
+        self._entries = None
+        self._titles = None
+        self._days = None
+        # Where the last whole entry of the index ends, as far as it was read
+        self.indexEnd = 0
+
+    def exists(self):
+        return os.path.exists(self.indexName)
+
+    @property
+    def entries(self) -> dict:
+        if self._entries is None:
+            self._entries = self.readIndex()
+        return self._entries
+
+    def readIndex(self) -> dict:
+        # An entry cut short by a crash is left in the file here, the next append drops it
+        entries = {}
+        try:
+            with open(self.indexName, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        self.indexEnd = self.readEntries(data, entries)
+        return entries
+
+    @staticmethod
+    def readEntries(data, entries: dict) -> int:
+        # Applies the whole entries at the start of data to entries, returns where they end
+        position = 0
+        while position + indexEntry.size <= len(data):
+            taskId, offset, size, day, titleLength = indexEntry.unpack_from(data, position)
+            end = position + indexEntry.size + titleLength
+            if end > len(data):
+                break
+            if size:
+                entries[taskId] = ArchiveEntry(taskId, offset, size, day,
+                                               data[position + indexEntry.size:end].decode("utf-8", "replace"))
+            else:
+                entries.pop(taskId, None)
+            position = end
+        return position
+
+    def lock(self):
+        # Held around appends, so the appends of other copies of the program do not interleave
+        from storage import FileLock
+        return FileLock(self.indexName)
+
+    def titleIndex(self) -> SearchIndex:
+        if self._titles is None:
+            self._titles = SearchIndex.fromTokens((entry.id, tokenize(entry.title)) for entry in self.entries.values())
+        return self._titles
+
+    def dayKeys(self) -> list:
+        if self._days is None:
+            self._days = sorted((entry.day, entry.id) for entry in self.entries.values())
+        return self._days
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, taskId):
+        return taskId in self.entries
+
+    def highestId(self):
+        return max(self.entries, default=0)
+
+    def add(self, rows: list):
+        # rows are bulk.taskRow dicts with a "day". They are on disk when this returns, so
+        # the tasks can be dropped from the board afterwards.
+        entries = self.entries
+        added = []
+        with self.lock():
+            with open(self.fileName, "ab") as data:
+                data.seek(0, os.SEEK_END)
+                offset = data.tell()
+                for row in rows:
+                    compressor = zlib.compressobj(9, zdict=recordDictionary)
+                    payload = compressor.compress(json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+                                                  .encode("utf-8")) + compressor.flush()
+                    data.write(recordHeader.pack(len(payload)))
+                    data.write(payload)
+                    offset += recordHeader.size
+                    added.append(ArchiveEntry(row["id"], offset, len(payload), row["day"], row["title"]))
+                    offset += len(payload)
+                data.flush()
+                os.fsync(data.fileno())
+            self.appendIndex(added)
+
+        for entry in added:
+            self.forget(entry.id)
+            entries[entry.id] = entry
+            if self._titles is not None:
+                self._titles.addTokens(entry.id, tokenize(entry.title))
+            if self._days is not None:
+                bisect.insort(self._days, (entry.day, entry.id))
+
+    def appendIndex(self, entries: list):
+        # Called under lock(). Entries other copies of the program appended since the index
+        # was read are taken in first, and an entry cut short by a crash is dropped so the
+        # new ones line up.
+        with open(self.indexName, "a+b") as out:
+            out.seek(self.indexEnd)
+            tail = out.read()
+            if tail:
+                end = self.indexEnd + self.readEntries(tail, self._entries)
+                self._titles = None
+                self._days = None
+                if end != self.indexEnd + len(tail):
+                    out.truncate(end)
+                self.indexEnd = end
+            data = b"".join(entry.pack() for entry in entries)
+            out.write(data)
+            out.flush()
+            os.fsync(out.fileno())
+            self.indexEnd += len(data)
+
+    def get(self, taskId) -> dict:
+        # The archived row of a task, read from its record alone
+        entry = self.entries.get(taskId)
+        if entry is None:
+            raise ValueError("no archived task " + repr(taskId))
+        with open(self.fileName, "rb") as data:
+            data.seek(entry.offset)
+            payload = data.read(entry.size)
+        decompressor = zlib.decompressobj(zdict=recordDictionary)
+        return json.loads((decompressor.decompress(payload) + decompressor.flush()).decode("utf-8"))
+
+    def remove(self, taskId):
+        entry = self.entries.get(taskId)
+        if entry is None:
+            return
+        with self.lock():
+            self.appendIndex([ArchiveEntry(taskId, 0, 0, entry.day, "")])
+        self.forget(taskId)
+
+    def forget(self, taskId):
+        entry = self.entries.pop(taskId, None)
+        if entry is None:
+            return
+        if self._titles is not None:
+            self._titles.remove(taskId)
+        if self._days is not None:
+            key = (entry.day, entry.id)
+            position = bisect.bisect_left(self._days, key)
+            if position < len(self._days) and self._days[position] == key:
+                del self._days[position]
+
+    # Queries, results are ArchiveEntry objects, newest day first
+
+    def search(self, text=None, first=None, last=None) -> list:
+        # Entries whose title has every word of text (the last one as a prefix) and whose
+        # day is between first and last (day ordinals, both included)
+        keys = self.dayKeys()
+        low = 0 if first is None else bisect.bisect_left(keys, (first,))
+        high = len(keys) if last is None else bisect.bisect_left(keys, (last + 1,))
+        ids = [taskId for day, taskId in reversed(keys[low:high])]
+        matches = self.titleIndex().search(text) if text else None
+        if matches is not None:
+            ids = [taskId for taskId in ids if taskId in matches]
+        return [self.entries[taskId] for taskId in ids]
+
+
+def archiveRow(column, task, day=None) -> dict:
+    from bulk import taskRow
+    row = taskRow(column, task)
+    row["day"] = day if day is not None else (finishedDay(task) or localSeconds() // 86400 + epochDay)
+    return row
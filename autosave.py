@@ -0,0 +1,202 @@
+import os
+import time
+
+from PySide6.QtCore import QFileSystemWatcher, QObject, QRunnable, QThreadPool, QTimer, Signal
+
+import instrument
+from Board import Board
+from storage import ConflictError, Storage
+
+
+class SaveSignals(QObject):
+    # Emitted from the worker thread, delivered to the AutoSaver on the GUI thread
+    progress = Signal(int, int)
+    finished = Signal(float)
+    failed = Signal(str)
+    conflicted = Signal()
+
+
+class SaveJob(QRunnable):
+    def __init__(self, write, revision, signals: SaveSignals):
+        super(SaveJob, self).__init__()
+        self.setAutoDelete(False)
+        self.write = write
+        self.revision = revision
+        self.signals = signals
+        self.done = False
+        self.error = None
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            with instrument.measure("save.write"):
+                self.write(self.signals.progress.emit)
+        except ConflictError as e:
+            self.error = str(e)
+            self.signals.conflicted.emit()
+            return
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            self.signals.failed.emit(self.error)
+            return
+        self.done = True
+        self.signals.finished.emit(time.perf_counter() - start)
+
+
+class AutoSaver(QObject):
+    # Saves the board in the background once edits have paused for `delay` seconds, or at
+    # the latest `maxDelay` seconds after the first unsaved edit. Changes are noticed
+    # through Board.revision, polled every `interval` ms. The board is snapshotted on the
+    # GUI thread (Storage.snapshot) and written by a single worker thread, one save at a
+    # time; edits made during a write go into the next one. A write refused because the
+    # file changed on disk emits conflicted, the owner merges and calls saveNow().
+    started = Signal()
+    progress = Signal(int, int)
+    saved = Signal(float)
+    failed = Signal(str)
+    conflicted = Signal()
+
+    def __init__(self, board: Board, storage: Storage, delay=1.5, maxDelay=10.0, interval=250, parent=None):
+        super(AutoSaver, self).__init__(parent)
+        self.board = board
+        self.storage = storage
+        self.delay = delay
+        self.maxDelay = maxDelay
+
+        self.savedRevision = board.revision
+        self.seenRevision = board.revision
+        self.lastChange = None
+        self.firstChange = None
+        self.requested = False
+        self.job = None
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = SaveSignals()
+        self.signals.progress.connect(self.progress)
+        self.signals.finished.connect(self.OnFinished)
+        self.signals.failed.connect(self.OnFailed)
+        self.signals.conflicted.connect(self.OnConflicted)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.Poll)
+        self.timer.start(interval)
+
+    def dirty(self):
+        return self.board.revision != self.savedRevision
+
+    def saving(self):
+        return self.job is not None
+
+    def Poll(self):
+        now = time.monotonic()
+        if self.board.revision != self.seenRevision:
+            self.seenRevision = self.board.revision
+            self.lastChange = now
+            if self.firstChange is None:
+                self.firstChange = now
+        if self.saving() or not self.dirty():
+            return
+        if self.requested or self.lastChange is None or now - self.lastChange >= self.delay \
+                or now - self.firstChange >= self.maxDelay:
+            self.start()
+
+    def saveNow(self):
+        self.requested = True
+        if not self.saving():
+            self.start()
+
+    def start(self):
+        self.requested = False
+        self.firstChange = None
+        revision = self.board.revision
+        try:
+            with instrument.measure("save.snapshot"):
+                write = self.storage.snapshot(self.board)
+        except Exception as e:
+            self.failed.emit(str(e) or type(e).__name__)
+            return
+        self.job = SaveJob(write, revision, self.signals)
+        self.started.emit()
+        self.pool.start(self.job)
+
+    def OnFinished(self, seconds):
+        if self.job is None:
+            return
+        self.savedRevision = self.job.revision
+        self.job = None
+        self.saved.emit(seconds)
+        if self.requested and self.dirty():
+            self.start()
+
+    def OnFailed(self, message):
+        if self.job is None:
+            return
+        self.job = None
+        # Try again once the next delay has passed
+        self.lastChange = self.firstChange = time.monotonic()
+        self.failed.emit(message)
+
+    def OnConflicted(self):
+        if self.job is None:
+            return
+        self.job = None
+        self.conflicted.emit()
+
+    def markSaved(self):
+        # The board is known to match the file, e.g. after merging it in with no edits of
+        # its own pending
+        self.savedRevision = self.seenRevision = self.board.revision
+        self.lastChange = self.firstChange = None
+
+    def flush(self):
+        # Wait for the write in progress and save what is left on this thread, for when
+        # the window closes. The worker's signals may not have been delivered yet.
+        self.timer.stop()
+        self.pool.waitForDone()
+        if self.job is not None:
+            if self.job.done:
+                self.savedRevision = self.job.revision
+            self.job = None
+        if self.dirty():
+            try:
+                self.storage.save(self.board)
+            except ConflictError:
+                self.storage.merge(self.board)
+                self.storage.save(self.board)
+            self.savedRevision = self.board.revision
+
+
+class FileWatcher(QObject):
+    # Emits changed when the project file was changed by someone else, checked `delay` ms
+    # after the last file system event. The directory is watched too, a file replaced by
+    # a rename (the way saves work here) is no longer watched.
+    changed = Signal()
+
+    def __init__(self, storage: Storage, delay=300, parent=None):
+        super(FileWatcher, self).__init__(parent)
+        self.storage = storage
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.OnEvent)
+        self.watcher.directoryChanged.connect(self.OnEvent)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.Check)
+        self.Watch()
+
+    def Watch(self):
+        fileName = os.path.abspath(self.storage.fileName)
+        paths = [path for path in (fileName, os.path.dirname(fileName))
+                 if os.path.exists(path) and path not in self.watcher.files() + self.watcher.directories()]
+        if paths:
+            self.watcher.addPaths(paths)
+
+    def OnEvent(self, path):
+        self.timer.start()
+
+    def Check(self):
+        self.Watch()
+        if self.storage.changedOnDisk():
+            self.changed.emit()
+
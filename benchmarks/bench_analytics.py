@@ -0,0 +1,109 @@
+# Flow analytics (lead/cycle time, throughput, cumulative flow, WIP breaches) with the
+# NumPy module compared against a plain loop over every task's history.
+#
+#   python benchmarks/bench_analytics.py [taskCount ...]
+import random
+import sys
+
+from common import Timer
+from Board import Board
+from Column import Column
+from Task import Task, HistoryEntry, localSeconds
+
+from analytics import daySeconds, FlowAnalytics
+
+
+def makeFlowBoard(taskCount, seed=1):
+    # Tasks created in the backlog and moved right one column at a time over a year
+    rng = random.Random(seed)
+    board = Board("Analytics Board")
+    for title in ("Backlog", "Doing", "Review", "Done"):
+        board.columnList.append(Column(title, 50))
+    now = localSeconds()
+    for y in range(taskCount):
+        task = Task("Task " + str(y), "", "", "")
+        when = now - rng.randrange(365 * daySeconds)
+        task.history.append(HistoryEntry(HistoryEntry.Created, "Backlog", when))
+        stage = rng.randrange(4)
+        for x in range(1, stage + 1):
+            when = min(now, when + rng.randrange(1, 10 * daySeconds))
+            task.history.append(HistoryEntry(HistoryEntry.Moved, board.columnList[x].title, when))
+        board.columnList[stage].taskList.append(task)
+    return board
+
+
+def loopAnalytics(board: Board, period=daySeconds):
+    titles = [column.title for column in board.columnList]
+    done, backlog = titles[-1], titles[0]
+    lead, cycle, throughput = {}, {}, {}
+    changes = []
+    for column in board.columnList:
+        for task in column.taskList:
+            first = start = None
+            location = None
+            for event in task.history:
+                if first is None:
+                    first = event.time
+                if event.column in titles[1:-1] and start is None:
+                    start = event.time
+                if event.column == done and task.id not in lead:
+                    lead[task.id] = event.time - first
+                    if start is not None:
+                        cycle[task.id] = event.time - start
+                    day = event.time // period * period
+                    throughput[day] = throughput.get(day, 0) + 1
+                if location is not None:
+                    changes.append((event.time, location, -1))
+                changes.append((event.time, event.column, 1))
+                location = event.column
+    changes.sort()
+    counts = dict.fromkeys(titles, 0)
+    flow = {}
+    for when, title, delta in changes:
+        counts[title] += delta
+        flow[when // period] = dict(counts)
+    return lead, cycle, throughput, flow
+
+
+def main():
+    sizes = [int(x) for x in sys.argv[1:]] or [10000, 100000]
+    print("%8s %10s %12s %12s %12s" % ("tasks", "loop (s)", "numpy cold", "numpy warm", "append 1"))
+    for taskCount in sizes:
+        board = makeFlowBoard(taskCount)
+        board.eventLog
+
+        with Timer() as loop:
+            lead, cycle, throughput, _ = loopAnalytics(board)
+
+        analytics = FlowAnalytics(board)
+
+        def runAll():
+            analytics.leadTimes()
+            analytics.cycleTimes()
+            analytics.throughput()
+            analytics.cumulativeFlow()
+            analytics.wipOverTime()
+            analytics.wipBreaches()
+
+        with Timer() as cold:
+            runAll()
+        with Timer() as warm:
+            runAll()
+
+        ids, times = analytics.leadTimes()
+        assert len(ids) == len(lead) and all(lead[i] == t for i, t in zip(ids.tolist(), times.tolist()))
+        ids, times = analytics.cycleTimes()
+        assert len(ids) == len(cycle) and all(cycle[i] == t for i, t in zip(ids.tolist(), times.tolist()))
+        assert analytics.throughput()[1].sum() == sum(throughput.values())
+
+        task = board.columnList[0].taskList[0]
+        board.recordEvent(task, HistoryEntry.Moved, "Doing", "Backlog")
+        with Timer() as update:
+            runAll()
+
+        print("%8d %10.3f %12.3f %12.5f %12.3f" % (taskCount, loop.elapsed, cold.elapsed, warm.elapsed,
+                                                   update.elapsed))
+
+
+if __name__ == "__main__":
+    main()
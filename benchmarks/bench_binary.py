@@ -0,0 +1,63 @@
+# The binary project format (binarydb) against XML: file size, full save, lazy and full
+# load, time until the first column is read and time to read the details of one task
+# from a freshly opened file.
+#
+#   python benchmarks/bench_binary.py [taskCount ...]
+import os
+import sys
+import tempfile
+
+from common import makeBoard, Timer
+
+from storage import openStorage
+
+
+def measure(fileName, board):
+    storage = openStorage(fileName)
+    with Timer() as save:
+        storage.save(board)
+    storage.close()
+
+    storage = openStorage(fileName)
+    with Timer() as lazy:
+        storage.load(lazy=True)
+    storage.close()
+
+    storage = openStorage(fileName)
+    with Timer() as full:
+        storage.load(lazy=False)
+    storage.close()
+
+    storage = openStorage(fileName)
+    with Timer() as first:
+        for loaded, column, task in storage.stream():
+            if column is not None and column is not loaded.columnList[0]:
+                break
+    storage.close()
+
+    storage = openStorage(fileName)
+    with Timer() as detail:
+        loaded = storage.load(lazy=True)
+        column = loaded.columnList[-1]
+        column.taskList[len(column.taskList) // 2].describe
+    storage.close()
+    return save.elapsed, lazy.elapsed, full.elapsed, first.elapsed, detail.elapsed, os.path.getsize(fileName)
+
+
+def main():
+    counts = [int(x) for x in sys.argv[1:]] or [10000, 100000]
+    directory = tempfile.mkdtemp()
+    print("%8s %7s %10s %11s %11s %13s %12s %10s" % ("tasks", "format", "save (ms)", "lazy (ms)", "full (ms)",
+                                                     "1st col (ms)", "detail (ms)", "size (KB)"))
+    for taskCount in counts:
+        board = makeBoard(taskCount)
+        for extension in ("xml", "kbin"):
+            fileName = os.path.join(directory, "project%d.%s" % (taskCount, extension))
+            save, lazy, full, first, detail, size = measure(fileName, board)
+            print("%8d %7s %10.1f %11.1f %11.1f %13.1f %12.1f %10d" % (
+                taskCount, extension, save * 1000, lazy * 1000, full * 1000, first * 1000, detail * 1000,
+                size // 1024))
+
+
+if __name__ == "__main__":
+    main()
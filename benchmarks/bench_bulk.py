@@ -0,0 +1,72 @@
+# Streaming CSV and JSON Lines import and export. Writes a generated file of rowCount
+# tasks, reads it back without building a board (memory should stay flat), imports it
+# into a board and exports the board again.
+#
+#   python benchmarks/bench_bulk.py [rowCount ...]
+import os
+import sys
+import tempfile
+
+from common import rss, Timer
+
+import bulk
+from Board import Board
+from Task import Task
+
+
+def generatedRows(rowCount, columnCount=5):
+    history = ["Created on Mon Jan  1 09:00:00 2024", "Moved to Column 1 on Tue Jan  2 10:30:00 2024"]
+    for y in range(rowCount):
+        yield {"id": y + 1, "column": "Column " + str(y % columnCount), "title": "Task " + str(y),
+               "describe": "Description of task " + str(y), "start": "2024-01-01", "end": "2024-01-31",
+               "startChecked": True, "endChecked": y % 2 == 0, "history": history}
+
+
+def rate(count, timer):
+    return count / max(timer.elapsed, 1e-9)
+
+
+def main():
+    sizes = [int(x) for x in sys.argv[1:]] or [1000000]
+    print("%8s %6s %12s %12s %12s %12s %10s %10s" % ("rows", "format", "write/s", "read/s", "import/s",
+                                                     "export/s", "read MB", "board MB"))
+    with tempfile.TemporaryDirectory() as directory:
+        for rowCount in sizes:
+            for fileType in bulk.formats:
+                fileName = os.path.join(directory, "tasks." + fileType)
+                opener = {"newline": ""} if fileType == "csv" else {}
+                writer = bulk.writeCSV if fileType == "csv" else bulk.writeJSONL
+                reader = bulk.readCSV if fileType == "csv" else bulk.readJSONL
+
+                with open(fileName, "w", encoding="utf-8", **opener) as out, Timer() as written:
+                    writer(generatedRows(rowCount), out)
+
+                # Streaming read with tasks built and dropped, the way a filter or converter would
+                before = rss()
+                peak = before
+                with open(fileName, encoding="utf-8", **opener) as source, Timer() as read:
+                    for count, row in enumerate(reader(source), 1):
+                        bulk.taskFromRow(row)
+                        if count % 100000 == 0:
+                            peak = max(peak, rss())
+                readGrowth = max(peak, rss()) - before
+
+                Task.totalTask = 1
+                board = Board("Import")
+                before = rss()
+                with Timer() as imported:
+                    bulk.importFile(board, fileName, fileType)
+                boardSize = rss() - before
+                assert sum(len(column.taskList) for column in board.columnList) == rowCount
+
+                with Timer() as exported:
+                    bulk.exportFile(board, fileName, fileType)
+                del board
+
+                print("%8d %6s %12.0f %12.0f %12.0f %12.0f %10.1f %10.1f" % (
+                    rowCount, fileType, rate(rowCount, written), rate(rowCount, read), rate(rowCount, imported),
+                    rate(rowCount, exported), readGrowth, boardSize))
+
+
+if __name__ == "__main__":
+    main()
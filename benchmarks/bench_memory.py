@@ -0,0 +1,69 @@
+# Memory held by the task model (tracemalloc) compared with the original layout of
+# plain objects with list dates/check states and free-text history strings.
+#
+#   python benchmarks/bench_memory.py [taskCount ...]
+import gc
+import sys
+import time
+import tracemalloc
+
+from common import makeBoard
+
+
+class LegacyTask:
+    totalTask = 1
+
+    def __init__(self, title="Task's title", describe="description", startDate="", endDate=""):
+        self.title = title
+        self.describe = describe
+        self.date = [startDate, endDate]
+        self.dateCheckStatus = ["0", "0"]
+        self.history = []
+        self.id = LegacyTask.totalTask
+        LegacyTask.totalTask += 1
+
+
+class LegacyColumn:
+    def __init__(self, title="Column name", WIPLimit=0):
+        self.title = title
+        self.WIPLimit = WIPLimit
+        self.taskList = []
+
+
+def makeLegacyBoard(taskCount, columnCount=3, historyLength=2):
+    columns = [LegacyColumn("Column " + str(x)) for x in range(columnCount)]
+    now = time.time()
+    for y in range(taskCount):
+        # Fresh strings per task, as parsing a project file produces them
+        task = LegacyTask("Task " + str(y), "Description of task " + str(y), "1/1/" + str(2024),
+                          "31/1/" + str(2024))
+        task.dateCheckStatus = [str(1), str(0)]
+        for z in range(historyLength):
+            task.history.append("Moved to Column " + str(z % columnCount) + " on "
+                                + time.asctime(time.localtime(now - 3600 * (historyLength - z))))
+        columns[y % columnCount].taskList.append(task)
+    return columns
+
+
+def measure(build, taskCount):
+    gc.collect()
+    tracemalloc.start()
+    board = build(taskCount)
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del board
+    return current
+
+
+def main():
+    counts = [int(x) for x in sys.argv[1:]] or [10000, 100000]
+    print("%8s %14s %14s %14s %14s" % ("tasks", "legacy (MB)", "compact (MB)", "B/task legacy", "B/task compact"))
+    for taskCount in counts:
+        legacy = measure(lambda n: makeLegacyBoard(n, historyLength=4), taskCount)
+        compact = measure(lambda n: makeBoard(n, historyLength=4), taskCount)
+        print("%8d %14.1f %14.1f %14d %14d" % (taskCount, legacy / 2 ** 20, compact / 2 ** 20,
+                                               legacy // taskCount, compact // taskCount))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# Save latency of a full rewrite (db.buildXML) against an XMLSaver that only
+# re-serializes the tasks edited since its previous save.
+#
+#   python benchmarks/bench_save.py [taskCount ...]
+import os
+import random
+import sys
+import tempfile
+
+from common import makeBoard, Timer
+
+import db
+
+
+def main():
+    counts = [int(x) for x in sys.argv[1:]] or [100, 1000, 10000, 100000]
+    directory = tempfile.mkdtemp()
+    print("%8s %14s %14s %14s %10s" % ("tasks", "full (ms)", "1 edit (ms)", "1% edits (ms)", "size (KB)"))
+    for taskCount in counts:
+        board = makeBoard(taskCount)
+        tasks = [task for column in board.columnList for task in column.taskList]
+        fileName = os.path.join(directory, "project.xml")
+
+        with Timer() as full:
+            db.buildXML(board, os.path.join(directory, "project"))
+
+        saver = db.XMLSaver(fileName)
+        saver.save(board)
+
+        task = random.choice(tasks)
+        task.title += " (edited)"
+        task.touch()
+        with Timer() as single:
+            saver.save(board)
+
+        for task in random.sample(tasks, max(1, taskCount // 100)):
+            task.describe += " (edited)"
+            task.touch()
+        with Timer() as percent:
+            saver.save(board)
+
+        print("%8d %14.2f %14.2f %14.2f %10d" % (taskCount, full.elapsed * 1000, single.elapsed * 1000,
+                                                 percent.elapsed * 1000, os.path.getsize(fileName) // 1024))
+
+
+if __name__ == "__main__":
+    main()
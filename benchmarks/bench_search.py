@@ -0,0 +1,54 @@
+# Task search with the inverted index compared against a substring scan of every task,
+# typing a query one character at a time.
+#
+#   python benchmarks/bench_search.py [taskCount ...]
+import sys
+
+from common import Timer, makeBoard
+
+
+def scan(board, text):
+    text = text.lower()
+    result = set()
+    for column in board.columnList:
+        for task in column.taskList:
+            if text in task.title.lower() or text in task.describe.lower() \
+                    or any(text in str(event).lower() for event in task.history):
+                result.add(task.id)
+    return result
+
+
+def main():
+    sizes = [int(x) for x in sys.argv[1:]] or [10000, 100000]
+    print("%8s %10s %14s %14s %14s" % ("tasks", "build (s)", "scan/key (ms)", "index/key (ms)", "edit+search"))
+    for taskCount in sizes:
+        board = makeBoard(taskCount)
+        # makeBoard deals the tasks out over its three columns in turn
+        probe = taskCount // 2
+        query = "task " + str(probe)
+        with Timer() as build:
+            board.searchIndex
+
+        prefixes = [query[:n] for n in range(1, len(query) + 1)]
+        with Timer() as scanned:
+            for prefix in prefixes[-3:]:
+                scan(board, prefix)
+        with Timer() as indexed:
+            for prefix in prefixes:
+                result = board.search(prefix)
+        assert board.columnList[probe % 3].taskList[probe // 3].id in result
+
+        task = board.columnList[0].taskList[0]
+        with Timer() as edited:
+            for x in range(100):
+                task.describe = "Edited description " + str(x)
+                board.taskChanged(task)
+                board.search("edited")
+
+        print("%8d %10.3f %14.2f %14.3f %14.3f" % (taskCount, build.elapsed, scanned.elapsed * 1000 / 3,
+                                                   indexed.elapsed * 1000 / len(prefixes),
+                                                   edited.elapsed * 1000 / 100))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Cold startup of the application on an XML project: time from process start to the
+# first paint of the window and to the board being editable. "progressive" is main.py's
+# MainWindow, "blocking" reads the whole project and builds the board before showing it,
+# the way the window used to start.
+#
+#   python benchmarks/bench_startup.py [taskCount ...]
+#
+# Each run is its own process so module imports are counted.
+import time
+
+processStart = time.perf_counter()
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+
+def run(mode, fileName):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtCore import QObject, QEvent, QTimer
+    from PySide6.QtWidgets import QApplication
+
+    result = {"mode": mode}
+
+    class FirstPaint(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Type.Paint and "paint" not in result:
+                result["paint"] = time.perf_counter() - processStart
+            return False
+
+    app = QApplication([])
+    firstPaint = FirstPaint()
+    app.installEventFilter(firstPaint)
+
+    def interactive():
+        result["interactive"] = time.perf_counter() - processStart
+        # Let the last columns paint before quitting
+        QTimer.singleShot(0, app.quit)
+
+    if mode == "progressive":
+        import main
+        window = main.MainWindow(fileName)
+        window.loaded.connect(interactive)
+        window.show()
+    else:
+        from PySide6.QtWidgets import QMainWindow
+        import gui
+        from service import BoardService
+        from storage import openStorage
+        storage = openStorage(fileName)
+        window = QMainWindow()
+        window.setCentralWidget(gui.MainBoard(BoardService(storage.load(), storage)))
+        window.show()
+        QTimer.singleShot(0, interactive)
+    app.exec()
+    return result
+
+
+def main():
+    from common import makeBoard
+    from storage import XMLStorage
+
+    counts = [int(x) for x in sys.argv[1:]] or [1000, 50000]
+    print("%8s %12s %16s %20s" % ("tasks", "mode", "first paint (s)", "interactive (s)"))
+    with tempfile.TemporaryDirectory() as directory:
+        for taskCount in counts:
+            fileName = os.path.join(directory, "project%d.xml" % taskCount)
+            XMLStorage(fileName).save(makeBoard(taskCount, columnCount=5))
+            for mode in ("blocking", "progressive"):
+                output = subprocess.run([sys.executable, __file__, "--child", mode, fileName],
+                                        capture_output=True, text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print("%8d %12s %16.3f %20.3f" % (taskCount, mode, result["paint"], result["interactive"]))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        print(json.dumps(run(sys.argv[2], sys.argv[3])), flush=True)
+        os._exit(0)
+    else:
+        main()
@@ -0,0 +1,56 @@
+# Load, full save and single-edit latency of the XML, SQLite and binary project formats.
+#
+#   python benchmarks/bench_storage.py [taskCount ...]
+import os
+import random
+import sys
+import tempfile
+
+from common import makeBoard, Timer
+
+from service import BoardService
+from storage import openStorage
+
+
+def measure(fileName, board):
+    storage = openStorage(fileName)
+    with Timer() as save:
+        storage.save(board)
+    storage.close()
+
+    storage = openStorage(fileName)
+    with Timer() as load:
+        loaded = storage.load()
+
+    # Edits and moves take the app's path: through the service, then a save
+    service = BoardService(loaded, storage)
+    tasks = [(column, task) for column in loaded.columnList for task in column.taskList]
+    column, task = random.choice(tasks)
+    service.editTask(task, title=task.title + " (edited)")
+    with Timer() as edit:
+        storage.save(loaded)
+
+    target = random.choice(loaded.columnList)
+    service.moveTask(task, target, random.randint(0, len(target.taskList)))
+    with Timer() as move:
+        storage.save(loaded)
+    storage.close()
+    return load.elapsed, save.elapsed, edit.elapsed, move.elapsed, os.path.getsize(fileName)
+
+
+def main():
+    counts = [int(x) for x in sys.argv[1:]] or [1000, 10000, 100000]
+    directory = tempfile.mkdtemp()
+    print("%8s %7s %10s %10s %10s %10s %10s" % ("tasks", "format", "load (ms)", "save (ms)", "edit (ms)",
+                                                "move (ms)", "size (KB)"))
+    for taskCount in counts:
+        board = makeBoard(taskCount)
+        for extension in ("xml", "db", "kbin"):
+            fileName = os.path.join(directory, "project%d.%s" % (taskCount, extension))
+            load, save, edit, move, size = measure(fileName, board)
+            print("%8d %7s %10.1f %10.1f %10.2f %10.2f %10d" % (taskCount, extension, load * 1000, save * 1000,
+                                                                edit * 1000, move * 1000, size // 1024))
+
+
+if __name__ == "__main__":
+    main()
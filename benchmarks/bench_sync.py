@@ -0,0 +1,165 @@
+# Load test of the sync server (sync.py). The server runs in its own process on
+# localhost with a board of 1000 tasks. Every simulated client keeps one request in
+# flight and waits for it to come back in the broadcast: 60% moves, 30% title edits, 5%
+# adds and 5% deletes of tasks it added. Reports requests per second, deltas delivered
+# per second over all clients and the latency from sending a request to getting its
+# delta back. Clients only scan the broadcast for their own deltas.
+#
+#   python benchmarks/bench_sync.py [clientCount ...]
+import asyncio
+import json
+import multiprocessing
+import random
+import socket
+import sys
+import time
+
+from common import makeBoard
+
+import sync
+from service import BoardService
+
+taskCount = 1000
+duration = 5.0
+# Connections opened at a time while the clients start
+connecting = 50
+
+
+def runServer(port):
+    sync.serve(BoardService(makeBoard(taskCount)), "localhost", port)
+
+
+def freePort():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def waitForServer(port, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            socket.create_connection(("localhost", port), 0.5).close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+class Client:
+    def __init__(self, port):
+        self.port = port
+        self.random = random.Random()
+        self.clientId = None
+        self.columns = []
+        self.tasks = []
+        self.added = []
+        self.latencies = []
+        self.errors = 0
+        self.delivered = 0
+        self.marker = None
+        self.waiting = None
+
+    async def connect(self, gate):
+        async with gate:
+            self.reader, self.writer = await asyncio.open_connection("localhost", self.port, limit=2 ** 24)
+            self.writer.write(sync.messageLine({"op": "hello"}))
+            snapshot = json.loads(await self.reader.readline())
+        self.clientId = snapshot["client"]
+        self.columns = [column["id"] for column in snapshot["board"]["columns"]]
+        self.tasks = [row["id"] for column in snapshot["board"]["columns"] for row in column["tasks"]]
+
+    async def read(self):
+        buffer = b""
+        while True:
+            chunk = await self.reader.read(2 ** 16)
+            if not chunk:
+                return
+            buffer += chunk
+            end = buffer.rfind(b"\n") + 1
+            if not end:
+                continue
+            lines, buffer = buffer[:end], buffer[end:]
+            self.delivered += lines.count(b"\n")
+            if self.waiting is None or self.waiting.done():
+                continue
+            position = lines.find(self.marker)
+            if position < 0:
+                position = lines.find(b'{"op":"error"')
+            if position >= 0:
+                start = lines.rfind(b"\n", 0, position) + 1
+                self.waiting.set_result(lines[start:lines.index(b"\n", position)])
+
+    def nextRequest(self):
+        choice = self.random.random()
+        if choice < 0.05:
+            return {"type": "add", "column": self.random.choice(self.columns), "tasks": [{"title": "Load test"}]}
+        if choice < 0.1 and self.added:
+            return {"type": "delete", "tasks": [self.added.pop()]}
+        if choice < 0.4:
+            return {"type": "edit", "task": self.random.choice(self.tasks),
+                    "fields": {"title": "Edited by %d" % self.clientId}}
+        return {"type": "move", "tasks": [self.random.choice(self.tasks)], "column": self.random.choice(self.columns),
+                "row": self.random.randint(0, 50)}
+
+    async def run(self, started, stopAt):
+        reading = asyncio.ensure_future(self.read())
+        await started.wait()
+        loop = asyncio.get_running_loop()
+        requestId = 0
+        while time.perf_counter() < stopAt:
+            requestId += 1
+            request = self.nextRequest()
+            request["id"] = requestId
+            self.marker = b',"client":%d,"id":%d,' % (self.clientId, requestId)
+            self.waiting = loop.create_future()
+            sent = time.perf_counter()
+            self.writer.write(sync.messageLine(request))
+            line = await self.waiting
+            self.latencies.append(time.perf_counter() - sent)
+            if line.startswith(b'{"op":"error"'):
+                self.errors += 1
+            elif request["type"] == "add":
+                self.added.append(json.loads(line)["delta"]["tasks"][0]["id"])
+        self.writer.close()
+        reading.cancel()
+
+
+async def measure(port, clientCount):
+    clients = [Client(port) for x in range(clientCount)]
+    gate = asyncio.Semaphore(connecting)
+    await asyncio.gather(*(client.connect(gate) for client in clients))
+    started = asyncio.Event()
+    stopAt = time.perf_counter() + duration
+    running = [asyncio.ensure_future(client.run(started, stopAt)) for client in clients]
+    for client in clients:
+        client.delivered = 0
+    began = time.perf_counter()
+    started.set()
+    await asyncio.gather(*running)
+    elapsed = time.perf_counter() - began
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    return (len(latencies) / elapsed, sum(client.delivered for client in clients) / elapsed,
+            latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000,
+            sum(client.errors for client in clients))
+
+
+def main():
+    counts = [int(x) for x in sys.argv[1:]] or [10, 100, 300]
+    print("%8s %12s %14s %10s %10s %8s" % ("clients", "ops/s", "delivered/s", "p50 (ms)", "p99 (ms)", "errors"))
+    for clientCount in counts:
+        port = freePort()
+        server = multiprocessing.Process(target=runServer, args=(port,), daemon=True)
+        server.start()
+        try:
+            waitForServer(port)
+            result = asyncio.run(measure(port, clientCount))
+        finally:
+            server.terminate()
+            server.join()
+        print("%8d %12.0f %14.0f %10.2f %10.2f %8d" % ((clientCount,) + result))
+
+
+if __name__ == "__main__":
+    main()
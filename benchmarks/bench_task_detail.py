@@ -0,0 +1,64 @@
+# Startup time and memory of a board when every card owns a TaskDetail (eager)
+# compared to building detail editors on demand from the shared pool (lazy).
+#
+#   python benchmarks/bench_task_detail.py [taskCount ...]
+#
+# Each mode runs in its own process so the RSS numbers do not leak into each other.
+import json
+import os
+import subprocess
+import sys
+
+from common import makeBoard, rss, Timer
+
+
+def run(mode, taskCount):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    import gui
+
+    app = QApplication([])
+    board = makeBoard(taskCount)
+    before = rss()
+
+    with Timer() as timer:
+        window = gui.MainBoard(gui.BoardService(board))
+        details = []
+        if mode == "eager":
+            # What every TaskCard used to build in its constructor
+            for column in board.columnList:
+                for task in column.taskList:
+                    details.append(gui.TaskDetail(task))
+        app.processEvents()
+
+    with Timer() as openTimer:
+        task = board.columnList[0].taskList[0]
+        if mode == "eager":
+            details[0].show()
+        else:
+            gui.detailPool.acquire(task).show()
+        app.processEvents()
+
+    return {"mode": mode, "tasks": taskCount, "startup": timer.elapsed,
+            "open": openTimer.elapsed, "rss": rss() - before}
+
+
+def main():
+    counts = [int(x) for x in sys.argv[1:]] or [300, 1000, 3000]
+    print("%8s %6s %12s %12s %10s" % ("tasks", "mode", "startup (s)", "open (ms)", "RSS (MB)"))
+    for taskCount in counts:
+        for mode in ("eager", "lazy"):
+            output = subprocess.run([sys.executable, __file__, "--child", mode, str(taskCount)],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print("%8d %6s %12.3f %12.2f %10.1f" % (taskCount, mode, result["startup"],
+                                                    result["open"] * 1000, result["rss"]))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        print(json.dumps(run(sys.argv[2], int(sys.argv[3]))), flush=True)
+        # Skip interpreter teardown, PySide6 may crash while finalizing thousands of widgets
+        os._exit(0)
+    else:
+        main()
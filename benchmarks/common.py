@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from Task import Task, HistoryEntry, localSeconds
+
+
+def makeBoard(taskCount, columnCount=3, historyLength=2):
+    board = Board("Benchmark Board")
+    for x in range(columnCount):
+        board.columnList.append(Column("Column " + str(x)))
+
+    now = localSeconds()
+    for y in range(taskCount):
+        task = Task("Task " + str(y), "Description of task " + str(y), "1/1/2024", "31/1/2024")
+        task.dateCheckStatus = ["1", "0"]
+        for z in range(historyLength):
+            task.history.append(HistoryEntry(HistoryEntry.Moved, "Column " + str(z % columnCount),
+                                             now - 3600 * (historyLength - z)))
+        board.columnList[y % columnCount].taskList.append(task)
+
+    return board
+
+
+def rss():
+    # Resident set size of this process in MB
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage / 2 ** 20 if sys.platform == "darwin" else usage / 2 ** 10
+
+
+class Timer:
+    def __init__(self):
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = time.perf_counter() - self.start
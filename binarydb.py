@@ -0,0 +1,422 @@
+# Binary project files (.kbin), a snapshot of the board read through mmap. XML stays the
+# format projects are exchanged in, this one is for large boards that must open fast.
+#
+#   header    "KBIN", format version, counts, the board title and where each table starts
+#   columns   fixed-width records: title, WIP limit, first task and task count
+#   tasks     fixed-width records in board order: id, title, description, dates, check
+#             states and the task's run of history events
+#   events    fixed-width records: time, action, column entered and column left
+#   strings   UTF-8 text that records point at as (offset, length), each distinct text once
+#
+# Nothing is parsed on load: a column is a slice of the task table and a task is one
+# struct.unpack_from on the mapped file, so columns can be shown as they are decoded.
+# Descriptions and histories stay in the file until used, as with lazily loaded XML (see
+# Task.loadDetails). Saving writes a new file and renames it over the old one; the details
+# of tasks never read are copied over from the old file as bytes.
+import mmap
+import os
+import struct
+import threading
+from array import array
+
+import instrument
+from Board import Board
+from Column import Column
+from Task import HistoryEntry, Task
+from db import writeAtomic
+from storage import ConflictError, FileLock, FileStamp, Storage
+
+magic = b"KBIN"
+version = 1
+# magic, version, unused, column, task and event counts, board title, offsets of the
+# column, task, event and string tables
+header = struct.Struct("<4sHHIIIIIQQQQ")
+# title, WIP limit, first task, task count
+columnRecord = struct.Struct("<IIiII")
+# id, title, description, start, end, first event, event count, flags
+taskRecord = struct.Struct("<qIIIIIIIIIIH2x")
+# time, action, column, fromColumn, flags
+eventRecord = struct.Struct("<qIIIIIIB3x")
+
+# String reference of None
+noText = (0xffffffff, 0)
+# Task flags: the two check states, then the kind of the start and of the end date. Days
+# are stored as their ordinal, dates kept as text (see parseDate) as a string.
+dayDate = 1
+textDate = 2
+startShift = 2
+endShift = 4
+# Event flags. A history entry that is plain text keeps it in the column field.
+hasColumn = 1
+hasFrom = 2
+textEvent = 4
+
+
+class StringTable:
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.known = {}
+
+    def add(self, text):
+        # (offset, length) of text, str or bytes, added when it is not in the table yet
+        if text is None:
+            return noText
+        data = text.encode("utf-8") if isinstance(text, str) else bytes(text)
+        ref = self.known.get(data)
+        if ref is None:
+            if self.size + len(data) >= noText[0]:
+                raise ValueError("project too large for the binary format")
+            ref = self.known[data] = (self.size, len(data))
+            self.chunks.append(data)
+            self.size += len(data)
+        return ref
+
+
+def packDate(day, strings):
+    # (kind, two record fields)
+    if day is None:
+        return 0, 0, 0
+    if isinstance(day, int):
+        return dayDate, day, 0
+    return (textDate,) + strings.add(day)
+
+
+def packEvent(event, strings):
+    if isinstance(event, HistoryEntry):
+        flags = (hasColumn if event.column is not None else 0) | (hasFrom if event.fromColumn is not None else 0)
+        return eventRecord.pack(event.time, *strings.add(event.action), *strings.add(event.column),
+                                *strings.add(event.fromColumn), flags)
+    return eventRecord.pack(0, *noText, *strings.add(event), *noText, textEvent)
+
+
+class BinarySource:
+    # A binary project file mapped read-only. Tasks read from it lazily get their details
+    # from here, by their record index in the file they were read from. After a save
+    # relocate() maps the new file and those indexes to where the tasks are in it.
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        # Details may be read by a save running on another thread
+        self.lock = threading.RLock()
+        self.file = None
+        self.data = None
+        self.view = None
+        # Record index of every task of the first file in the current one, None while
+        # that is still the first file, -1 for tasks that are gone
+        self.moved = None
+        self.open()
+        self.firstCount = self.taskCount
+
+    def open(self):
+        with self.lock:
+            if self.data is not None:
+                return
+            self.file = open(self.fileName, "rb")
+            size = os.fstat(self.file.fileno()).st_size
+            if size < header.size:
+                self.file.close()
+                raise ValueError(self.fileName + " is not a binary project file")
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.data)
+            (fileMagic, fileVersion, unused, self.columnCount, self.taskCount, self.eventCount, titleOffset,
+             titleLength, self.columnTable, self.taskTable, self.eventTable, self.stringTable) \
+                = header.unpack_from(self.data, 0)
+            if fileMagic != magic or self.stringTable > size:
+                self.close()
+                raise ValueError(self.fileName + " is not a binary project file")
+            if fileVersion > version:
+                self.close()
+                raise ValueError(self.fileName + " was written by a newer version of the program")
+            self.title = self.text(titleOffset, titleLength)
+
+    def close(self):
+        with self.lock:
+            if self.data is not None:
+                self.view.release()
+                self.data.close()
+                self.file.close()
+                self.view = self.data = self.file = None
+
+    def text(self, offset, length):
+        if offset == noText[0]:
+            return None
+        start = self.stringTable + offset
+        return str(self.view[start:start + length], "utf-8")
+
+    def raw(self, offset, length):
+        if offset == noText[0]:
+            return None
+        start = self.stringTable + offset
+        return self.view[start:start + length].tobytes()
+
+    def date(self, kind, first, second):
+        if kind == dayDate:
+            return first
+        if kind == textDate:
+            return self.text(first, second)
+        return None
+
+    def column(self, position):
+        # (title, WIPLimit, first task, task count)
+        titleOffset, titleLength, WIPLimit, first, count = columnRecord.unpack_from(
+            self.data, self.columnTable + position * columnRecord.size)
+        return self.text(titleOffset, titleLength), WIPLimit, first, count
+
+    def tasks(self, first, count):
+        # The tasks of records first.., without their descriptions and histories
+        text, date = self.text, self.date
+        position = self.taskTable + first * taskRecord.size
+        for (taskId, titleOffset, titleLength, describeOffset, describeLength, start, startText, end, endText,
+             firstEvent, eventCount, flags) in taskRecord.iter_unpack(self.view[position:
+                                                                              position + count * taskRecord.size]):
+            task = Task(text(titleOffset, titleLength), None)
+            task.id = taskId
+            if flags >> startShift:
+                task.start = date(flags >> startShift & 3, start, startText)
+                task.end = date(flags >> endShift & 3, end, endText)
+            task.flags = flags & 3
+            yield task
+
+    def record(self, index):
+        # Record of a task read from the first file, in the current one
+        with self.lock:
+            self.open()
+            position = index if self.moved is None else self.moved[index]
+            if position < 0:
+                raise LookupError("details of task %d are no longer in %s" % (index, self.fileName))
+            return self.recordAt(position)
+
+    def recordAt(self, position):
+        # Record at position in the current file
+        return taskRecord.unpack_from(self.data, self.taskTable + position * taskRecord.size)
+
+    def loadDetails(self, index):
+        with self.lock:
+            return self.details(self.record(index))
+
+    def details(self, record):
+        # (description, history) of a task record
+        history = []
+        for position in range(record[9], record[9] + record[10]):
+            (when, actionOffset, actionLength, columnOffset, columnLength, fromOffset, fromLength,
+             flags) = eventRecord.unpack_from(self.data, self.eventTable + position * eventRecord.size)
+            if flags & textEvent:
+                history.append(self.text(columnOffset, columnLength))
+            else:
+                history.append(HistoryEntry(self.text(actionOffset, actionLength),
+                                            self.text(columnOffset, columnLength) if flags & hasColumn else None,
+                                            when,
+                                            self.text(fromOffset, fromLength) if flags & hasFrom else None))
+        return self.text(record[3], record[4]), history
+
+    def rawDetails(self, index, strings: StringTable):
+        # The description reference and event records of a task, added to strings as
+        # bytes without decoding them
+        with self.lock:
+            record = self.record(index)
+            events = []
+            for position in range(record[9], record[9] + record[10]):
+                fields = eventRecord.unpack_from(self.data, self.eventTable + position * eventRecord.size)
+                events.append(eventRecord.pack(fields[0], *strings.add(self.raw(fields[1], fields[2])),
+                                               *strings.add(self.raw(fields[3], fields[4])),
+                                               *strings.add(self.raw(fields[5], fields[6])), fields[7]))
+            return strings.add(self.raw(record[3], record[4])), events
+
+    def fileStamp(self) -> FileStamp:
+        # FileStamp of the version of the file mapped
+        with self.lock:
+            self.open()
+            return FileStamp.read(self.fileName, self.data, os.fstat(self.file.fileno()))
+
+    def relocate(self, moved: dict):
+        # The file was replaced, moved maps record indexes in the first file to the new one
+        with self.lock:
+            self.close()
+            self.moved = array("q", [moved.get(index, -1) for index in range(self.firstCount)])
+            self.open()
+
+
+def buildFile(title, columns, source=None, moved=None, progress=None) -> list:
+    # The chunks of a binary project file. columns are (title, WIPLimit, entries) with an
+    # entry (id, title, start, end, flags, describe, history, index) per task, where index
+    # is the task's record in source when its details are still there, -1 otherwise.
+    # moved gets the new record index of those tasks.
+    strings = StringTable()
+    columnData = []
+    taskData = []
+    eventData = []
+    total = sum(len(entries) for columnTitle, WIPLimit, entries in columns)
+    for columnTitle, WIPLimit, entries in columns:
+        columnData.append(columnRecord.pack(*strings.add(columnTitle), WIPLimit, len(taskData), len(entries)))
+        for taskId, taskTitle, start, end, flags, describe, history, index in entries:
+            firstEvent = len(eventData)
+            if index >= 0:
+                moved[index] = len(taskData)
+                describeRef, events = source.rawDetails(index, strings)
+                eventData.extend(events)
+            else:
+                describeRef = strings.add(describe)
+                eventData.extend(packEvent(event, strings) for event in history)
+            startKind, start, startText = packDate(start, strings)
+            endKind, end, endText = packDate(end, strings)
+            taskData.append(taskRecord.pack(taskId, *strings.add(taskTitle), *describeRef, start, startText, end,
+                                            endText, firstEvent, len(eventData) - firstEvent,
+                                            flags & 3 | startKind << startShift | endKind << endShift))
+            if progress is not None and len(taskData) % 4096 == 0:
+                progress(len(taskData), total)
+
+    titleRef = strings.add(title)
+    columnTable = header.size
+    taskTable = columnTable + len(columnData) * columnRecord.size
+    eventTable = taskTable + len(taskData) * taskRecord.size
+    stringTable = eventTable + len(eventData) * eventRecord.size
+    chunks = [header.pack(magic, version, 0, len(columnData), len(taskData), len(eventData), *titleRef,
+                          columnTable, taskTable, eventTable, stringTable),
+              b"".join(columnData), b"".join(taskData), b"".join(eventData)]
+    chunks.extend(strings.chunks)
+    if progress is not None:
+        progress(total, total)
+    return chunks
+
+
+def readBoard(source: BinarySource) -> Board:
+    # The board in the version of the file source maps, with all details
+    with source.lock:
+        source.open()
+        board = Board(source.title)
+        for position in range(source.columnCount):
+            title, WIPLimit, first, count = source.column(position)
+            column = Column(title, WIPLimit)
+            for index, task in enumerate(source.tasks(first, count), first):
+                task.describe, task.history = source.details(source.recordAt(index))
+                column.taskList.append(task)
+            board.columnList.append(column)
+    return board
+
+
+def readBinaryInfo(fileName):
+    # Title and (column title, task count) pairs from the header and column table alone
+    source = BinarySource(fileName)
+    try:
+        return source.title, [(title, count) for title, WIPLimit, first, count
+                              in map(source.column, range(source.columnCount))]
+    finally:
+        source.close()
+
+
+class BinaryStorage(Storage):
+    # Every save writes the whole file, under the project's FileLock. As with XMLStorage,
+    # once the file was read or written, writes are refused with ConflictError when it
+    # changed since, merge() then brings the other changes in first (merge.mergeBoards).
+
+    def __init__(self, fileName="project.kbin"):
+        super(BinaryStorage, self).__init__(fileName)
+        # Where the lazily loaded tasks of the board get their details
+        self.source = None
+        # The file as last read or written: its FileStamp, and a BinarySource mapping that
+        # version or, after a merge, its merge.BoardState. revisions are the Task.revision
+        # of the tasks when it was written.
+        self.stamp = None
+        self.base = None
+        self.revisions = None
+
+    @instrument.timed("load")
+    def load(self, lazy=True) -> Board:
+        board = None
+        for board, column, task in self.stream(lazy):
+            pass
+        return board
+
+    def stream(self, lazy=True):
+        source = BinarySource(self.fileName)
+        board = Board(source.title)
+        yield board, None, None
+        maxId = 0
+        for position in range(source.columnCount):
+            title, WIPLimit, first, count = source.column(position)
+            column = Column(title, WIPLimit)
+            board.columnList.append(column)
+            yield board, column, None
+            taskList = column.taskList
+            for index, task in enumerate(source.tasks(first, count), first):
+                if lazy:
+                    task.source = source
+                    task.sourceIndex = index
+                else:
+                    task.describe, task.history = source.loadDetails(index)
+                taskList.append(task)
+                if task.id > maxId:
+                    maxId = task.id
+                yield board, column, task
+        # New tasks must not reuse the ids of stored ones
+        Task.reserveId(maxId)
+        if lazy:
+            self.source = source
+        # The version mapped is the one read, whatever the file is by now
+        self.setBase(source)
+
+    def setBase(self, base, revisions=None, stamp=None):
+        old = self.base
+        if isinstance(old, BinarySource) and old is not base and old is not self.source:
+            old.close()
+        self.base = base
+        self.revisions = revisions
+        self.stamp = stamp if stamp is not None else base.fileStamp()
+
+    def baseState(self):
+        from merge import BoardState
+        if isinstance(self.base, BinarySource):
+            return BoardState.fromBoard(readBoard(self.base), self.revisions)
+        return self.base
+
+    def snapshot(self, board: Board):
+        from merge import revisions
+        source = self.source
+        columns = []
+        for column in board.columnList:
+            entries = []
+            for task in column.taskList:
+                if task.source is not None and task.source is source:
+                    entries.append((task.id, task.title, task.start, task.end, task.flags, None, None,
+                                    task.sourceIndex))
+                else:
+                    entries.append((task.id, task.title, task.start, task.end, task.flags, task.describe,
+                                    list(task.history), -1))
+            columns.append((column.title, column.WIPLimit, entries))
+        title = board.title
+        taken = revisions(board)
+
+        def write(progress=None):
+            with FileLock(self.fileName):
+                if self.changedOnDisk():
+                    raise ConflictError(self.fileName + " was changed by someone else")
+                moved = {}
+                writeAtomic(self.fileName, buildFile(title, columns, source, moved, progress))
+                if source is not None:
+                    source.relocate(moved)
+                self.setBase(source if source is not None else BinarySource(self.fileName), taken)
+        return write
+
+    def changedOnDisk(self) -> bool:
+        # A file this storage has not read or written yet is simply written over
+        return self.stamp is not None and not self.stamp.matches(self.fileName)
+
+    @instrument.timed("merge")
+    def merge(self, board: Board):
+        from merge import mergeBoards
+        with FileLock(self.fileName, shared=True):
+            other = BinarySource(self.fileName)
+        try:
+            result, base = mergeBoards(board, self.baseState(), readBoard(other))
+            stamp = other.fileStamp()
+        finally:
+            other.close()
+        self.setBase(base, stamp=stamp)
+        return result
+
+    def close(self):
+        if self.source is not None:
+            self.source.close()
+        if isinstance(self.base, BinarySource):
+            self.base.close()
@@ -0,0 +1,194 @@
+# Streaming import and export of tasks as CSV or JSON Lines, one task per row:
+#
+#   id, column, title, describe, start, end, startChecked, endChecked, history
+#
+# Dates are written as yyyy-mm-dd and read as that or d/m/yyyy. History is one event
+# text per line in CSV and a list of texts in JSON Lines. Rows are read and written
+# through generators and added to the board in batches, so memory use does not grow
+# with the size of the file beyond the tasks themselves.
+import csv
+import datetime
+import itertools
+import json
+import os
+import time
+
+from Board import Board
+from Column import Column
+from Task import Task, HistoryEntry, parseDate
+
+fieldNames = ["id", "column", "title", "describe", "start", "end", "startChecked", "endChecked", "history"]
+formats = ("csv", "jsonl")
+defaultColumn = "Imported"
+
+
+def fileFormat(fileName):
+    extension = os.path.splitext(fileName)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError("unknown format of " + fileName + ", use .csv or .jsonl")
+
+
+def isoDate(day):
+    if isinstance(day, int):
+        return datetime.date.fromordinal(day).isoformat()
+    return day or ""
+
+
+def readDate(text):
+    if not text:
+        return None
+    if len(text) == 10 and text[4] == "-":
+        try:
+            return datetime.date.fromisoformat(text).toordinal()
+        except ValueError:
+            return text
+    return parseDate(text)
+
+
+def readCheck(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y", "x")
+    return bool(value)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+# Export
+
+def taskRow(column: Column, task: Task) -> dict:
+    return {
+        "id": task.id,
+        "column": column.title,
+        "title": task.title,
+        "describe": task.describe or "",
+        "start": isoDate(task.start),
+        "end": isoDate(task.end),
+        "startChecked": task.startChecked,
+        "endChecked": task.endChecked,
+        "history": [str(event) for event in task.history],
+    }
+
+
+def boardRows(board: Board):
+    for column in board.columnList:
+        for task in column.taskList:
+            yield taskRow(column, task)
+
+
+def writeCSV(rows, out):
+    writer = csv.writer(out)
+    writer.writerow(fieldNames)
+    count = 0
+    for row in rows:
+        writer.writerow((row["id"], row["column"], row["title"], row["describe"], row["start"], row["end"],
+                         int(row["startChecked"]), int(row["endChecked"]), "\n".join(row["history"])))
+        count += 1
+    return count
+
+
+def writeJSONL(rows, out):
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    count = 0
+    for row in rows:
+        out.write(dumps(row))
+        out.write("\n")
+        count += 1
+    return count
+
+
+# Import
+
+def readCSV(source):
+    reader = csv.reader(source)
+    header = next(reader, None)
+    if header is None:
+        return
+    # Columns may come in any order and unknown ones are ignored
+    positions = [(name, header.index(name)) for name in fieldNames if name in header]
+    if not any(name == "title" for name, position in positions):
+        raise ValueError("CSV has no title column")
+    for values in reader:
+        if not values:
+            continue
+        row = {name: values[position] for name, position in positions if position < len(values)}
+        history = row.get("history")
+        row["history"] = history.split("\n") if history else []
+        yield row
+
+
+def readJSONL(source):
+    loads = json.loads
+    for number, line in enumerate(source, 1):
+        if line.strip():
+            try:
+                yield loads(line)
+            except ValueError:
+                raise ValueError("line " + str(number) + " is not valid JSON")
+
+
+def taskFromRow(row: dict) -> Task:
+    task = Task(row.get("title") or "", row.get("describe") or "")
+    task.start = readDate(row.get("start"))
+    task.end = readDate(row.get("end"))
+    task.flags = readCheck(row.get("startChecked")) | readCheck(row.get("endChecked")) << 1
+    task.history = [HistoryEntry.parse(event) for event in row.get("history") or ()]
+    return task
+
+
+def importRows(board: Board, rows, batchSize=5000, progress=None) -> int:
+    # Appends the tasks of rows to the columns they name, creating missing columns.
+    # Ids are kept when they are free on the board. progress(count, seconds) is called
+    # after every batch.
+    columns = {}
+    for column in board.columnList:
+        columns.setdefault(column.title, column)
+    index = board.taskIndex
+    count = 0
+    started = time.perf_counter()
+    for batch in batches(rows, batchSize):
+        byColumn = {}
+        batchIds = set()
+        for row in batch:
+            title = row.get("column") or defaultColumn
+            column = columns.get(title)
+            if column is None:
+                column = columns[title] = Column(title)
+                board.addColumn(column)
+            task = taskFromRow(row)
+            taskId = row.get("id")
+            if taskId not in (None, ""):
+                taskId = int(taskId)
+                if taskId not in index and taskId not in batchIds:
+                    task.id = taskId
+                    Task.reserveId(taskId)
+            batchIds.add(task.id)
+            byColumn.setdefault(column, []).append(task)
+        for column, tasks in byColumn.items():
+            board.insertTasks(column, len(column.taskList), tasks)
+        count += len(batch)
+        if progress is not None:
+            progress(count, time.perf_counter() - started)
+    return count
+
+
+def importFile(board: Board, fileName, fileType=None, batchSize=5000, progress=None) -> int:
+    fileType = fileType or fileFormat(fileName)
+    with open(fileName, newline="" if fileType == "csv" else None, encoding="utf-8") as source:
+        rows = readCSV(source) if fileType == "csv" else readJSONL(source)
+        return importRows(board, rows, batchSize, progress)
+
+
+def exportFile(board: Board, fileName, fileType=None) -> int:
+    fileType = fileType or fileFormat(fileName)
+    with open(fileName, "w", newline="" if fileType == "csv" else None, encoding="utf-8") as out:
+        return (writeCSV if fileType == "csv" else writeJSONL)(boardRows(board), out)
@@ -0,0 +1,277 @@
+# Works on a project from the command line, without Qt, e.g.
+#
+#   python cli.py columns
+#   python cli.py add TODO "Write report" --end 30/10/2026
+#   python cli.py move 12 Done
+#   python cli.py list --search report --due overdue
+#   python cli.py -p project.db export board.json
+#   python cli.py import tickets.csv
+#   python cli.py archive --age 90 && python cli.py archive-search report
+#   python cli.py serve --host 0.0.0.0    then python main.py kanban://<host>:8765 elsewhere
+#
+# Changes are saved to the project file when the command succeeds.
+import argparse
+import sys
+import time
+
+import bulk
+import instrument
+from Column import Column
+from Task import Task, formatDate
+from bulk import fileFormat, formats
+from service import BoardService, dueFilters
+from sync import defaultPort
+
+
+def describeTask(column: Column, task: Task):
+    # One line per task: id, column, title and the checked dates
+    dates = ""
+    if task.startChecked or task.endChecked:
+        dates = "\t" + (formatDate(task.start) if task.startChecked else "") + " - " \
+                + (formatDate(task.end) if task.endChecked else "")
+    return "%d\t%s\t%s%s" % (task.id, column.title, task.title, dates)
+
+
+def columnsCommand(service, args):
+    for position in range(len(service.board.columnList)):
+        column = service.board.columnList[position]
+        limit = "/" + str(column.WIPLimit) if column.WIPLimit else ""
+        print("%d\t%s\t%d%s" % (position, column.title, len(column.taskList), limit))
+
+
+def listCommand(service, args):
+    for column, task in service.query(args.search, args.column, args.due):
+        print(describeTask(column, task))
+
+
+def addCommand(service, args):
+    task = service.addTask(args.column, args.title, args.describe or "", args.start, args.end)
+    print(task.id)
+    return True
+
+
+def moveCommand(service, args):
+    for taskId in args.task:
+        service.moveTask(taskId, args.column, args.row)
+    return True
+
+
+def deleteCommand(service, args):
+    for taskId in args.task:
+        service.deleteTask(taskId)
+    return True
+
+
+def editCommand(service, args):
+    fields = {name: getattr(args, name) for name in ("title", "describe", "start", "end")
+              if getattr(args, name) is not None}
+    if args.check_start is not None:
+        fields["startChecked"] = args.check_start
+    if args.check_end is not None:
+        fields["endChecked"] = args.check_end
+    service.editTask(args.task, **fields)
+    return True
+
+
+def addColumnCommand(service, args):
+    service.addColumn(args.title, args.wip, args.position)
+    return True
+
+
+def editColumnCommand(service, args):
+    service.editColumn(args.column, args.title, args.wip)
+    if args.position is not None:
+        service.moveColumn(args.column if args.title is None else args.title, args.position)
+    return True
+
+
+def removeColumnCommand(service, args):
+    service.removeColumn(args.column)
+    return True
+
+
+def exportCommand(service, args):
+    fileType = args.format
+    if fileType is None and args.output != "-" and not args.output.lower().endswith(".json"):
+        fileType = fileFormat(args.output)
+    if fileType in formats and args.output == "-":
+        writer = bulk.writeCSV if fileType == "csv" else bulk.writeJSONL
+        writer(bulk.boardRows(service.board), sys.stdout)
+    elif fileType in formats:
+        with Timer() as timer:
+            count = service.exportTasks(args.output, fileType)
+        report("Exported", count, timer.elapsed)
+    elif args.output == "-":
+        service.exportJSON(sys.stdout)
+    else:
+        with open(args.output, "w", encoding="utf-8") as out:
+            service.exportJSON(out)
+
+
+def importCommand(service, args):
+    def progress(count, seconds):
+        print("\r%d rows, %.0f rows/s" % (count, count / max(seconds, 1e-9)), end="", file=sys.stderr)
+
+    with Timer() as timer:
+        count = service.importTasks(args.input, args.format, args.batch, progress if args.progress else None)
+    if args.progress:
+        print(file=sys.stderr)
+    report("Imported", count, timer.elapsed)
+    return True
+
+
+def archiveCommand(service, args):
+    count = service.archiveTasks(args.column or None, args.age, args.cap)
+    print("Archived %d tasks" % count)
+    return count > 0
+
+
+def archiveSearchCommand(service, args):
+    for entry in service.searchArchive(" ".join(args.words), args.since, args.until):
+        print("%d\t%s\t%s" % (entry.id, formatDate(entry.day), entry.title))
+
+
+def restoreCommand(service, args):
+    for taskId in args.task:
+        task = service.restoreTask(taskId, args.column)
+        print(describeTask(service.location(task)[0], task))
+    return True
+
+
+def serveCommand(service, args):
+    from sync import serve
+    print("Sharing %s on %s:%d, Ctrl+C to stop" % (service.storage.fileName, args.host, args.port), file=sys.stderr)
+    try:
+        serve(service, args.host, args.port)
+    except OSError as error:
+        raise ValueError("cannot serve on %s:%d: %s" % (args.host, args.port, error.strerror or error))
+    return True
+
+
+def report(action, count, seconds):
+    print("%s %d tasks in %.2f s (%.0f rows/s)" % (action, count, seconds, count / max(seconds, 1e-9)))
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = time.perf_counter() - self.started
+
+
+def makeParser():
+    parser = argparse.ArgumentParser(description="Edit and query a Kanban project without the GUI.")
+    parser.add_argument("-p", "--project", help="project file, project.db or project.xml when not given")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("columns", help="list the columns")
+    command.set_defaults(run=columnsCommand)
+
+    command = commands.add_parser("list", help="list tasks")
+    command.add_argument("--column")
+    command.add_argument("--search", help="words the tasks must contain, the last one as a prefix")
+    command.add_argument("--due", choices=dueFilters)
+    command.set_defaults(run=listCommand)
+
+    command = commands.add_parser("add", help="add a task and print its id")
+    command.add_argument("column")
+    command.add_argument("title")
+    command.add_argument("--describe")
+    command.add_argument("--start", help="d/m/yyyy")
+    command.add_argument("--end", help="d/m/yyyy")
+    command.set_defaults(run=addCommand)
+
+    command = commands.add_parser("move", help="move tasks to a column")
+    command.add_argument("task", nargs="+", type=int)
+    command.add_argument("column")
+    command.add_argument("--row", type=int, help="position in the column, the end when not given")
+    command.set_defaults(run=moveCommand)
+
+    command = commands.add_parser("delete", help="delete tasks")
+    command.add_argument("task", nargs="+", type=int)
+    command.set_defaults(run=deleteCommand)
+
+    command = commands.add_parser("edit", help="change fields of a task")
+    command.add_argument("task", type=int)
+    command.add_argument("--title")
+    command.add_argument("--describe")
+    command.add_argument("--start", help="d/m/yyyy")
+    command.add_argument("--end", help="d/m/yyyy")
+    command.add_argument("--check-start", type=lambda text: text not in ("0", "no", "false"), metavar="yes|no")
+    command.add_argument("--check-end", type=lambda text: text not in ("0", "no", "false"), metavar="yes|no")
+    command.set_defaults(run=editCommand)
+
+    command = commands.add_parser("add-column", help="add a column")
+    command.add_argument("title")
+    command.add_argument("--wip", type=int, default=0, help="WIP limit, 0 for none")
+    command.add_argument("--position", type=int)
+    command.set_defaults(run=addColumnCommand)
+
+    command = commands.add_parser("edit-column", help="rename, limit or move a column")
+    command.add_argument("column")
+    command.add_argument("--title")
+    command.add_argument("--wip", type=int)
+    command.add_argument("--position", type=int)
+    command.set_defaults(run=editColumnCommand)
+
+    command = commands.add_parser("remove-column", help="remove a column and its tasks")
+    command.add_argument("column")
+    command.set_defaults(run=removeColumnCommand)
+
+    command = commands.add_parser("export", help="write the board as JSON, or its tasks as CSV or JSON Lines")
+    command.add_argument("output", nargs="?", default="-", help="file name, - for standard output")
+    command.add_argument("--format", choices=("json",) + formats, help="taken from the file name when not given")
+    command.set_defaults(run=exportCommand)
+
+    command = commands.add_parser("import", help="add the tasks of a CSV or JSON Lines file")
+    command.add_argument("input")
+    command.add_argument("--format", choices=formats, help="taken from the file name when not given")
+    command.add_argument("--batch", type=int, default=5000, help="rows added to the board at a time")
+    command.add_argument("--progress", action="store_true", help="show rows per second while importing")
+    command.set_defaults(run=importCommand)
+
+    command = commands.add_parser("archive", help="move old tasks to the project's archive")
+    command.add_argument("--column", action="append", help="column to archive from, the last one when not given")
+    command.add_argument("--age", type=int, help="archive tasks not touched for this many days")
+    command.add_argument("--cap", type=int, help="keep at most this many tasks in each column")
+    command.set_defaults(run=archiveCommand)
+
+    command = commands.add_parser("archive-search", help="list archived tasks, newest first")
+    command.add_argument("words", nargs="*", help="words the titles must contain, the last one as a prefix")
+    command.add_argument("--since", help="d/m/yyyy")
+    command.add_argument("--until", help="d/m/yyyy")
+    command.set_defaults(run=archiveSearchCommand)
+
+    command = commands.add_parser("restore", help="bring archived tasks back to the board")
+    command.add_argument("task", nargs="+", type=int)
+    command.add_argument("--column", help="column to restore to, the one they were archived from when not given")
+    command.set_defaults(run=restoreCommand)
+
+    command = commands.add_parser("serve", help="share the board through a sync server until interrupted")
+    command.add_argument("--host", default="localhost", help="address to listen on, 0.0.0.0 for the whole network")
+    command.add_argument("--port", type=int, default=defaultPort)
+    command.set_defaults(run=serveCommand)
+    return parser
+
+
+def main(argv=None):
+    parser = makeParser()
+    args = parser.parse_args(argv)
+
+    service = BoardService.open(args.project)
+    try:
+        if args.run(service, args):
+            service.save()
+    except ValueError as error:
+        parser.error(str(error))
+    finally:
+        service.close()
+        if instrument.enabled and instrument.dumpFile:
+            instrument.dump(instrument.dumpFile)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,73 +1,513 @@
+import mmap
+import os
+import re
+import threading
+import weakref
 import xml.etree.ElementTree as ET
+from array import array
 
 from Board import Board
 from Column import Column
-from Task import Task
+from Task import Task, HistoryEntry, formatDate
+
+
+def escapeText(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def escapeAttrib(text):
+    return escapeText(text).replace("\"", "&quot;").replace("\r", "&#13;").replace("\n", "&#10;") \
+        .replace("\t", "&#09;")
+
+
+def textElement(indent, tag, text, attrib=""):
+    # Same layout ElementTree produces after ET.indent
+    if text:
+        return indent + "<" + tag + attrib + ">" + escapeText(text) + "</" + tag + ">"
+    return indent + "<" + tag + attrib + " />"
+
+
+def historyAttrib(event):
+    # Typed fields of an event, the text stays readable for older versions
+    if not isinstance(event, HistoryEntry):
+        return ""
+    attrib = " time=\"" + str(event.time) + "\" action=\"" + escapeAttrib(event.action) + "\""
+    if event.fromColumn is not None:
+        attrib += " from=\"" + escapeAttrib(event.fromColumn) + "\""
+    if event.column is not None:
+        attrib += " to=\"" + escapeAttrib(event.column) + "\""
+    return attrib
+
+
+def historyEntry(element):
+    action = element.attrib.get("action")
+    if action is None:
+        return HistoryEntry.parse(element.text)
+    return HistoryEntry(action, element.attrib.get("to"), int(element.attrib.get("time")), element.attrib.get("from"))
+
+
+def taskXML(pj_task: Task):
+    parts = ["\n\t\t\t<Task id=\"" + str(pj_task.id) + "\" title=\"" + escapeAttrib(pj_task.title) + "\">",
+             textElement("\n\t\t\t\t", "description", pj_task.describe),
+             # textElement("\n\t\t\t\t", "priority", str(pj_task.priority)),
+             "\n\t\t\t\t<date>",
+             textElement("\n\t\t\t\t\t", "StartDate", formatDate(pj_task.start),
+                         " state=\"1\"" if pj_task.startChecked else " state=\"0\""),
+             textElement("\n\t\t\t\t\t", "EndDate", formatDate(pj_task.end),
+                         " state=\"1\"" if pj_task.endChecked else " state=\"0\""),
+             "\n\t\t\t\t</date>"]
+
+    if pj_task.history:
+        parts.append("\n\t\t\t\t<historyList>")
+        for event in pj_task.history:
+            parts.append(textElement("\n\t\t\t\t\t", "history", str(event), historyAttrib(event)))
+        parts.append("\n\t\t\t\t</historyList>")
+    else:
+        parts.append("\n\t\t\t\t<historyList />")
+
+    parts.append("\n\t\t\t</Task>")
+    return "".join(parts)
+
+
+def syncDirectory(directory):
+    # Makes a rename in the directory survive a crash, directories cannot be opened for
+    # this outside POSIX
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def writeAtomic(fileName, chunks, beforeReplace=None):
+    # Write into a temporary file next to the target and rename it over the target, so
+    # a crash during the write leaves the previous file untouched. The temporary file is
+    # created the way open() creates a file, under the current umask, and takes the
+    # target's permissions when the target already exists.
+    directory = os.path.dirname(os.path.abspath(fileName))
+    flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0)
+    while True:
+        tmpName = os.path.join(directory, "." + os.path.basename(fileName) + "." + os.urandom(4).hex() + ".tmp")
+        try:
+            fd = os.open(tmpName, flags, 0o666)
+            break
+        except FileExistsError:
+            pass
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            if hasattr(os, "fchmod"):
+                try:
+                    os.fchmod(f.fileno(), os.stat(fileName).st_mode & 0o7777)
+                except FileNotFoundError:
+                    pass
+            os.fsync(f.fileno())
+        if beforeReplace is not None:
+            beforeReplace()
+        os.replace(tmpName, fileName)
+    except BaseException:
+        if os.path.exists(tmpName):
+            os.remove(tmpName)
+        raise
+    syncDirectory(directory)
+
+
+class RawTask:
+    # Placeholder in a snapshot for a task that is copied over from the file it was
+    # lazily read from, the bytes are only read when the snapshot is written
+    __slots__ = ("source", "sourceIndex", "id", "title")
+
+    def __init__(self, task: Task):
+        self.source = task.source
+        self.sourceIndex = task.sourceIndex
+        self.id = task.id
+        self.title = task.title
+
+
+class XMLSaver:
+    # Keeps the serialized XML of every task between saves. A task is serialized again
+    # only when its revision changed (see Task.touch), the rest of the file is stitched
+    # together from the cached fragments and committed with writeAtomic.
+    # The layout is the same as indenting the full tree with ET.indent.
+    # snapshot() does the part that reads the board, the returned write() does the file
+    # I/O and can run on another thread while the board keeps changing.
+
+    def __init__(self, fileName="project.xml"):
+        self.fileName = fileName
+        self.taskCache = {}
+        self.lastWritten = 0
+        self.position = 0
+        self.moved = {}
+
+    def taskFragment(self, task: Task):
+        cached = self.taskCache.get(id(task))
+        if cached is not None and cached[0] is task and cached[1] == task.revision:
+            return cached[2]
+
+        fragment = taskXML(task).encode("utf-8")
+        self.taskCache[id(task)] = (task, task.revision, fragment)
+        self.lastWritten += 1
+        return fragment
+
+    def columnFragments(self, pjColumn: Column):
+        tag = "\n\t\t<Column title=\"" + escapeAttrib(pjColumn.title) + "\" WIPLimit=\"" \
+              + escapeAttrib(str(pjColumn.WIPLimit)) + "\""
+        if not pjColumn.taskList:
+            yield (tag + " />").encode("utf-8")
+            return
+
+        yield (tag + ">").encode("utf-8")
+        for task in pjColumn.taskList:
+            if isinstance(task.source, LazyXMLSource) and task.revision == 0:
+                # Never loaded nor edited, copied over from the file it was read from
+                yield RawTask(task)
+            else:
+                yield self.taskFragment(task)
+        yield b"\n\t\t</Column>"
+
+    def fragments(self, project: Board):
+        yield b"<?xml version='1.0' encoding='utf-8'?>\n<Project>\n\t"
+        board = "<Board title=\"" + escapeAttrib(project.title) + "\""
+        if not project.columnList:
+            yield (board + " />").encode("utf-8")
+        else:
+            yield (board + ">").encode("utf-8")
+            for pjColumn in project.columnList:
+                yield from self.columnFragments(pjColumn)
+            yield b"\n\t</Board>"
+        yield b"\n</Project>"
+
+    def resolve(self, parts: list, progress=None):
+        for x in range(len(parts)):
+            part = parts[x]
+            if isinstance(part, RawTask):
+                raw = part.source.read(part.sourceIndex)
+                if not raw.startswith(b"<Task id=\"%d\"" % part.id):
+                    # Written without (or with a different) id, only the start tag changes
+                    tag = "<Task id=\"" + str(part.id) + "\" title=\"" + escapeAttrib(part.title) + "\">"
+                    raw = tag.encode("utf-8") + raw[raw.index(b">") + 1:]
+                start = self.position + 4
+                self.moved.setdefault(part.source, {})[part.sourceIndex] = (start, start + len(raw))
+                part = b"\n\t\t\t" + raw
+            yield part
+            if progress is not None and (x % 4096 == 4095 or x == len(parts) - 1):
+                progress(x + 1, len(parts))
+
+    def counted(self, chunks):
+        for chunk in chunks:
+            yield chunk
+            self.position += len(chunk)
+
+    def sameFileSources(self):
+        return [source for source in list(LazyXMLSource.opened)
+                if os.path.abspath(source.fileName) == os.path.abspath(self.fileName)]
+
+    @staticmethod
+    def rawSources(parts: list) -> set:
+        return {part.source for part in parts if isinstance(part, RawTask)}
+
+    def save(self, project: Board):
+        self.snapshot(project)()
+
+    def snapshot(self, project: Board):
+        self.lastWritten = 0
+        parts = list(self.fragments(project))
+        taskCount = 0
+        for pjColumn in project.columnList:
+            taskCount += len(pjColumn.taskList)
+
+        # Drop fragments of deleted tasks once they outnumber the live ones
+        if len(self.taskCache) > 2 * taskCount + 64:
+            live = set()
+            for pjColumn in project.columnList:
+                live.update(id(task) for task in pjColumn.taskList)
+            self.taskCache = {key: value for key, value in self.taskCache.items() if key in live}
+        return lambda progress=None: self.write(parts, progress)
+
+    def write(self, parts: list, progress=None):
+        self.position = 0
+        self.moved = {}
+        copied = self.rawSources(parts)
+        sources = []
+
+        def beforeReplace():
+            # Lazy tasks copied over from the file being replaced now live at new offsets.
+            # Their sources stay locked until they are relocated. Other boards read from
+            # the file keep reading the version they were read from.
+            for source in self.sameFileSources():
+                if source not in copied:
+                    source.keep()
+                    continue
+                source.lock.acquire()
+                sources.append(source)
+                source.close()
+
+        try:
+            writeAtomic(self.fileName, self.counted(self.resolve(parts, progress)), beforeReplace)
+            for source in sources:
+                source.relocate(self.moved.get(source, {}))
+        finally:
+            for source in sources:
+                source.lock.release()
+            self.moved = {}
+
+
+# Board, column and task tags of a project file, for reading its layout without parsing it
+layoutPattern = re.compile(rb"<(Board|Column|Task)[\s>/]|</(Column)>")
+idPattern = re.compile(rb'\sid="(\d+)"')
+
+
+def startTag(data, start):
+    # Attributes of the start tag at data[start]
+    end = data.find(b">", start) + 1
+    tag = data[start:end]
+    if not tag.endswith(b"/>"):
+        tag = tag[:-1] + b"/>"
+    return ET.fromstring(tag).attrib
+
+
+def scanXML(data):
+    # Layout of a project file from a plain byte scan: (board title, [(column title,
+    # WIPLimit, [(task id, start, end)])]), with the byte range of each task element.
+    # Tasks written without an id have None.
+    title = None
+    columns = []
+    pos = 0
+    match = layoutPattern.search(data)
+    while match is not None:
+        start = match.start()
+        tag = match.group(1)
+        if tag == b"Task":
+            tagEnd = data.find(b">", start)
+            end = tagEnd + 1 if data[tagEnd - 1:tagEnd] == b"/" else data.find(b"</Task>", tagEnd) + len(b"</Task>")
+            taskId = idPattern.search(data, start, tagEnd)
+            if columns:
+                columns[-1][2].append((int(taskId.group(1)) if taskId else None, start, end))
+            pos = end
+        elif tag == b"Column":
+            attrib = startTag(data, start)
+            columns.append((attrib.get("title"), attrib.get("WIPLimit"), []))
+            pos = match.end()
+        elif tag == b"Board" and title is None:
+            title = startTag(data, start).get("title")
+            pos = match.end()
+        else:
+            pos = match.end()
+        match = layoutPattern.search(data, pos)
+    return title, columns
+
+
+def taskParts(fragment) -> tuple:
+    # Hashes of the four parts of a task element as XMLSaver writes it: the start tag (id
+    # and title), the description, the dates and the history. Whitespace around the parts
+    # is ignored. Only comparable within one process.
+    fragment = fragment.strip()
+    head = fragment.find(b">") + 1
+    date = fragment.find(b"<date", head)
+    history = fragment.find(b"<historyList", date)
+    if date < 0 or history < 0:
+        return hash(fragment), 0, 0, 0
+    return (hash(fragment[:head]), hash(fragment[head:date].strip()), hash(fragment[date:history].strip()),
+            hash(fragment[history:].strip()))
 
 
 def buildXML(project: Board, projectName="project"):
-    root = ET.Element("Project")
-    _board = ET.SubElement(root, "Board", title=project.title)
-
-    for x in range(len(project.columnList)):
-        pjColumn: Column = project.columnList[x]
-        _column = ET.SubElement(_board, "Column", title=pjColumn.title, WIPLimit=str(pjColumn.WIPLimit))
-        for y in range(len(pjColumn.taskList)):
-            pj_task: Task = pjColumn.taskList[y]
-            task = ET.SubElement(_column, "Task", title=pj_task.title)
-
-            description = ET.SubElement(task, 'description')
-            description.text = pj_task.describe
-
-            # priority = ET.SubElement(task, 'priority')
-            # priority.text = str(pj_task.priority)
-
-            date = ET.SubElement(task, 'date')
-            StartDate = ET.SubElement(date, 'StartDate', state=pj_task.dateCheckStatus[0])
-            StartDate.text = pj_task.date[0]
-            EndDate = ET.SubElement(date, "EndDate", state=pj_task.dateCheckStatus[1])
-            EndDate.text = pj_task.date[1]
-
-            his = ET.SubElement(task, "historyList")
-            if range(len(pj_task.history)) != 0:
-                for z in range(len(pj_task.history)):
-                    history = ET.SubElement(his, "history")
-                    history.text = str(pj_task.history[z])
-
-    tree = ET.ElementTree(root)
-    ET.indent(tree, space="\t", level=0)
-    tree.write(projectName + ".xml", encoding='utf-8', xml_declaration=True)
-
-
-def parserXML(fileAddress):
-    tree = ET.parse(fileAddress)
-    root = tree.getroot()
-    _board = Board(root.find("Board").attrib.get("title"))
-    for n in root.iter("Column"):
-        columnWIP = n.attrib.get("WIPLimit")
-        columnTitle = n.attrib.get("title")
-        _column = Column(columnTitle, columnWIP)
-        _board.columnList.append(_column)
-        for m in n.iter("Task"):
-            if m:
-                # task_id = m.attrib.get("id")
-                taskTitle = m.attrib.get("title")
-                taskDescribe = m.find("description").text
-                # taskPriority = m.find("priority").text
-                taskStartDate = m.find("date").find("StartDate").text
-                taskEndDate = m.find("date").find("EndDate").text
-                _task = Task(taskTitle, taskDescribe, taskStartDate, taskEndDate)
-
-                _task.dateCheckStatus[0] = m.find("date").find("StartDate").attrib.get("state")
-                _task.dateCheckStatus[1] = m.find("date").find("EndDate").attrib.get("state")
-
-                taskHisList = m.find("historyList")
-                if len(taskHisList.findall("history")):
-                    for v in taskHisList.iter("history"):
-                        _task.history.append(v.text)
+    XMLSaver(projectName + ".xml").save(project)
+
+
+class LazyXMLSource:
+    # Gives back the description and history of tasks that parserXML left in the file.
+    # Tasks are addressed by their position in document order, their byte ranges are
+    # found with a plain byte scan the first time one of them is needed.
+
+    opened = weakref.WeakSet()
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.taskCount = 0
+        self.complete = False
+        self.starts = None
+        self.ends = None
+        self.file = None
+        # The file's content, where an open file cannot be replaced (see keep)
+        self.data = None
+        # Tasks may be read by a save running on another thread
+        self.lock = threading.RLock()
+        LazyXMLSource.opened.add(self)
+
+    def scan(self):
+        starts = array("q")
+        ends = array("q")
+        # The file held open, which may have been replaced under its name since
+        self.open()
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = mm.find(b"<Task")
+            while pos != -1:
+                if mm[pos + 5:pos + 6] not in (b" ", b">", b"/", b"\t", b"\n", b"\r"):
+                    pos = mm.find(b"<Task", pos + 5)
+                    continue
+                tagEnd = mm.find(b">", pos)
+                if mm[tagEnd - 1:tagEnd] == b"/":
+                    end = tagEnd + 1
+                else:
+                    end = mm.find(b"</Task>", tagEnd) + len(b"</Task>")
+                starts.append(pos)
+                ends.append(end)
+                pos = mm.find(b"<Task", end)
+
+        if len(starts) < self.taskCount or (self.complete and len(starts) != self.taskCount):
+            raise ValueError(self.fileName + ": could not locate the tasks in the file")
+        self.starts = starts
+        self.ends = ends
+
+    def read(self, index):
+        with self.lock:
+            if self.starts is None:
+                self.scan()
+            if self.starts[index] < 0:
+                raise LookupError("details of task %d are no longer in %s" % (index, self.fileName))
+            if self.data is not None:
+                return self.data[self.starts[index]:self.ends[index]]
+            self.open()
+            self.file.seek(self.starts[index])
+            return self.file.read(self.ends[index] - self.starts[index])
+
+    def open(self):
+        with self.lock:
+            if self.file is None and self.data is None:
+                self.file = open(self.fileName, "rb")
+
+    def keep(self):
+        # The file is about to be replaced by the save of another board: go on reading this
+        # version of it through the open handle, or from memory where open files cannot be
+        # replaced
+        with self.lock:
+            self.open()
+            if self.starts is None:
+                self.scan()
+            if os.name == "nt" and self.file is not None:
+                self.file.seek(0)
+                self.data = self.file.read()
+                self.close()
+
+    def loadDetails(self, index):
+        m = ET.fromstring(self.read(index))
+        taskDescribe = m.find("description").text
+        taskHistory = [historyEntry(v) for v in m.find("historyList").iter("history")]
+        return taskDescribe, taskHistory
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def relocate(self, offsets: dict):
+        # Called by XMLSaver after it copied the untouched tasks into a new version of
+        # the file. Tasks it did not write are gone from the file. The new version is
+        # opened at once, the name may point to yet another one later.
+        with self.lock:
+            self.close()
+            self.data = None
+            starts = array("q", [-1]) * self.taskCount
+            ends = array("q", [-1]) * self.taskCount
+            for index, (start, end) in offsets.items():
+                starts[index] = start
+                ends[index] = end
+            self.starts = starts
+            self.ends = ends
+            self.open()
+
+
+def taskFromElement(m, details=True) -> Task:
+    taskId = m.attrib.get("id")
+    taskTitle = m.attrib.get("title")
+    # taskPriority = m.find("priority").text
+    date = m.find("date")
+    startDate = date.find("StartDate")
+    endDate = date.find("EndDate")
+    _task = Task(taskTitle, None, startDate.text, endDate.text)
+    if taskId is not None:
+        # Files written before ids were stored get fresh ones
+        _task.id = int(taskId)
+        Task.reserveId(_task.id)
+    _task.dateCheckStatus[0] = startDate.attrib.get("state")
+    _task.dateCheckStatus[1] = endDate.attrib.get("state")
+    if details:
+        _task.describe = m.find("description").text
+        for v in m.find("historyList").iter("history"):
+            _task.history.append(historyEntry(v))
+    return _task
+
+
+def streamXML(fileAddress, lazy=True, source=None):
+    # Builds the board while reading the file and yields (board, column, task) as each
+    # board, column and task is added, so callers can show progress. Columns are added as
+    # soon as their start tag is read. Elements are cleared once used, keeping memory
+    # flat on large files. With lazy=True descriptions and histories stay in the file
+    # and are read back through source, a new LazyXMLSource when None, when first
+    # accessed. Raises ValueError for a column or task out of place.
+    if not lazy:
+        source = None
+    elif source is None:
+        source = LazyXMLSource(fileAddress)
+    if source is not None:
+        # Held open so the details can still be read after another program replaces the file
+        source.open()
+    _board = None
+    _column = None
+    columnElement = None
+    taskIndex = 0
+
+    for event, n in ET.iterparse(fileAddress, events=("start", "end")):
+        if event == "start":
+            if n.tag == "Board" and _board is None:
+                _board = Board(n.attrib.get("title"))
+                yield _board, None, None
+            elif n.tag == "Column":
+                if _board is None:
+                    raise ValueError(fileAddress + ": <Column> outside of a <Board>")
+                columnWIP = n.attrib.get("WIPLimit")
+                columnTitle = n.attrib.get("title")
+                _column = Column(columnTitle, columnWIP)
+                _board.columnList.append(_column)
+                columnElement = n
+                yield _board, _column, None
+            continue
+
+        if n.tag == "Task":
+            if columnElement is None:
+                raise ValueError(fileAddress + ": <Task> outside of a <Column>")
+            m = n
+            if len(m):
+                _task = taskFromElement(m, not lazy)
+                if lazy:
+                    _task.source = source
+                    _task.sourceIndex = taskIndex
 
                 _column.taskList.append(_task)
+            taskIndex += 1
+            if source is not None:
+                source.taskCount = taskIndex
+            if len(m):
+                yield _board, _column, _task
+            columnElement.clear()
+        elif n.tag == "Column":
+            n.clear()
+            columnElement = None
+
+    if source is not None:
+        source.complete = True
+
 
+def parserXML(fileAddress, lazy=True, source=None):
+    _board = None
+    for _board, _column, _task in streamXML(fileAddress, lazy, source):
+        pass
     return _board
 
 
@@ -1,15 +1,23 @@
+import bisect
 import sys
 import time
 
-from PySide6.QtCore import QMimeData, Signal, QDate
-from PySide6.QtGui import Qt, QDropEvent, QMouseEvent, QDrag, QCloseEvent, QDragEnterEvent
+import shiboken6
+from PySide6.QtCore import QMimeData, Signal, QAbstractListModel, QModelIndex, QByteArray, QSize, \
+    QItemSelectionModel, QObject, QRect
+from PySide6.QtGui import Qt, QDropEvent, QMouseEvent, QDrag, QCloseEvent, QDragEnterEvent, QTextCharFormat, QPainter, \
+    QPen, QKeySequence, QShortcut
 from PySide6.QtWidgets import (
     QWidget,
     QLabel,
     QTextEdit,
     QListWidget,
+    QListView,
     QFrame,
     QListWidgetItem,
+    QStyle,
+    QStyledItemDelegate,
+    QStyleOptionViewItem,
     QVBoxLayout,
     QAbstractItemView,
     QPushButton,
@@ -18,20 +26,25 @@ from PySide6.QtWidgets import (
     QGridLayout,
     QLineEdit,
     QSpinBox,
-    QMessageBox,
-    QBoxLayout
+    QComboBox,
+    QMessageBox
 )
 
-from Board import Board
+import instrument
+from autosave import AutoSaver, FileWatcher
+from Board import Board, BoardObserver
 from Column import Column
 from Task import Task
-from db import buildXML
-from utils import DateCheckBox, DateCalendar
+from service import BoardService, dueFilters
+from storage import XMLStorage
+from sync import SyncedService
+from utils import DateCheckBox, DateCalendar, dayToQDate, qDateToDay
 
 
 class TaskDetail(QWidget):
     closeSignal = Signal()
 
+    @instrument.timed("widgets.taskDetail")
     def __init__(self, task: Task):
 
         super(TaskDetail, self).__init__()
@@ -39,6 +52,9 @@ class TaskDetail(QWidget):
         self.setMinimumSize(700, 500)
 
         self.task = task
+        self.service = None
+        self.onClose = None
+        self.editing = False
 
         self.init_UI()
         self.InitHistoryItem(self.task.history)
@@ -61,7 +77,7 @@ class TaskDetail(QWidget):
 
         self.checkStart.OnCheck.connect(self.OnChecked)
         self.checkEnd = DateCheckBox("End Date:", self.task.date, 1, self.task.dateCheckStatus[1])
-        self.checkStart.OnCheck.connect(self.OnChecked)
+        self.checkEnd.OnCheck.connect(self.OnChecked)
         self.calender = DateCalendar()
         self.setDate()
         self.calender.RangeSelected(self.calender.highlightFormat)
@@ -87,133 +103,345 @@ class TaskDetail(QWidget):
 
         self.setLayout(mainLayout)
 
+    def setTask(self, task: Task):
+        # Rebind a pooled editor to another task without rebuilding its widgets.
+        # Signals are blocked so that loading the new values does not write them back
+        # into the task being edited.
+        self.task = task
+        widgets = (self.descriptionEdit, self.titleLabel, self.checkStart, self.checkEnd, self.calender)
+        for widget in widgets:
+            widget.blockSignals(True)
+
+        self.descriptionEdit.setPlainText(task.describe)
+        self.titleLabel.setText(task.title)
+        self.checkStart.setDate(task.date, task.dateCheckStatus[0])
+        self.checkEnd.setDate(task.date, task.dateCheckStatus[1])
+
+        self.calender.RangeSelected(QTextCharFormat())
+        self.calender.StartDate = None
+        self.calender.EndDate = None
+        self.setDate()
+        self.calender.RangeSelected(self.calender.highlightFormat)
+
+        self.MovementHistoryList.clear()
+        self.InitHistoryItem(task.history)
+
+        for widget in widgets:
+            widget.blockSignals(False)
+
     def InitHistoryItem(self, hisList: list):
         for i in hisList:
-            his_item = QListWidgetItem(i)
+            his_item = QListWidgetItem(str(i))
             self.MovementHistoryList.addItem(his_item)
 
+    def Edit(self, name, value):
+        # Edits go through the board service when the task is on a board
+        if self.service is None:
+            setattr(self.task, name, value)
+            self.task.touch()
+            return
+        self.editing = True
+        try:
+            self.service.setField(self.task, name, value)
+        finally:
+            self.editing = False
+
+    def Refresh(self):
+        # The task was changed from somewhere else, e.g. undo
+        if not self.editing:
+            self.setTask(self.task)
+
     def OnContentChange(self):
-        self.task.describe = self.descriptionEdit.toPlainText()
+        self.Edit("describe", self.descriptionEdit.toPlainText())
 
     def OnTitleChange(self):
-        self.task.title = self.titleLabel.text()
+        self.Edit("title", self.titleLabel.text())
 
     def OnStartDateChange(self):
-        self.task.date[0] = str(self.calender.selectedDate().day()) + "/" \
-                            + str(self.calender.selectedDate().month()) + "/" \
-                            + str(self.calender.selectedDate().year())
+        self.Edit("start", qDateToDay(self.calender.selectedDate()))
 
         if self.checkStart.isChecked():
             self.checkStart.OnBoxCheck()
 
     def OnChecked(self):
-        self.task.dateCheckStatus[0] = str(int(self.checkStart.isChecked()))
-        self.task.dateCheckStatus[1] = str(int(self.checkEnd.isChecked()))
+        self.Edit("flags", int(self.checkStart.isChecked()) | int(self.checkEnd.isChecked()) << 1)
 
     def OnEndDateChange(self):
-        self.task.date[1] = str(self.calender.selectedDate().day()) + "/" \
-                            + str(self.calender.selectedDate().month()) + "/" \
-                            + str(self.calender.selectedDate().year())
+        self.Edit("end", qDateToDay(self.calender.selectedDate()))
 
         if self.checkEnd.isChecked():
             self.checkEnd.OnBoxCheck()
 
     def setDate(self):
-        date: str = self.task.date[0]
-        if date:
-            day, month, year = date.split("/")
-            self.calender.StartDate = QDate(int(year), int(month), int(day))
-
-        date: str = self.task.date[1]
-        if date:
-            day, month, year = date.split("/")
-            self.calender.EndDate = QDate(int(year), int(month), int(day))
+        if self.task.startDay is not None:
+            self.calender.StartDate = dayToQDate(self.task.startDay)
+        if self.task.endDay is not None:
+            self.calender.EndDate = dayToQDate(self.task.endDay)
 
     def closeEvent(self, event: QCloseEvent) -> None:
         self.closeSignal.emit()
         super().closeEvent(event)
 
 
-class TaskCard(QWidget):
+class TaskDetailPool:
+    # TaskDetail windows are only built when a card is opened. Closed editors are kept
+    # (up to maxSize) and rebound to the next task instead of being rebuilt.
+    maxSize = 2
+
+    def __init__(self):
+        self.idle = []
+        self.opened = {}
+
+    def acquire(self, task: Task, onClose=None, service: BoardService = None) -> TaskDetail:
+        detail = self.opened.get(id(task))
+        if detail is None:
+            if self.idle:
+                detail = self.idle.pop()
+                detail.setTask(task)
+            else:
+                detail = TaskDetail(task)
+                detail.closeSignal.connect(lambda: self.release(detail))
+            self.opened[id(task)] = detail
+        detail.onClose = onClose
+        detail.service = service
+        detail.calender.setDateIndex(service.board.dateIndex if service is not None else None)
+        return detail
+
+    def release(self, detail: TaskDetail):
+        if self.opened.get(id(detail.task)) is detail:
+            del self.opened[id(detail.task)]
+        if detail.onClose:
+            detail.onClose()
+            detail.onClose = None
+
+        if len(self.idle) < self.maxSize:
+            self.idle.append(detail)
+        else:
+            detail.deleteLater()
 
-    def __init__(self, task: Task):
-        super().__init__()
+    def closeAll(self, service: BoardService):
+        # Closes the editors of a board that is going away
+        for detail in list(self.opened.values()):
+            if detail.service is service:
+                detail.close()
 
-        self.task = task
 
-        self.titleLabel = QLabel(task.title)
-        self.titleLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
+detailPool = TaskDetailPool()
 
-        self.taskDetail = TaskDetail(self.task)
-        self.taskDetail.closeSignal.connect(lambda: self.titleLabel.setText(self.task.title))
 
-        # Layout
-        layout = QVBoxLayout()
-        layout.addWidget(self.titleLabel)
-        self.setLayout(layout)
+TaskRole = Qt.ItemDataRole.UserRole
+# True/False whether a card matches the current search, None when nothing is searched
+MatchRole = Qt.ItemDataRole.UserRole + 1
+TaskMimeType = "application/x-kanban-task-rows"
 
-    def mouseDoubleClickEvent(self, event) -> None:
-        self.taskDetail.show()
-        super(TaskCard, self).mouseDoubleClickEvent(event)
 
+class TaskListModel(QAbstractListModel):
+    # Rows are read straight from column.taskList, so the column is always in sync
+    # with what the view shows and no widget exists per task. Changes go through the
+    # board, which reports them back through BoardWidgets.
+
+    def __init__(self, column: Column, board: Board):
+        super(TaskListModel, self).__init__()
+        self.column = column
+        self.board = board
+        self.matches = None
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.column.taskList)
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        task: Task = self.column.taskList[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole or role == Qt.ItemDataRole.ToolTipRole:
+            return task.title
+        if role == TaskRole:
+            return task
+        if role == MatchRole:
+            return None if self.matches is None else task.id in self.matches
+        return None
+
+    def flags(self, index: QModelIndex):
+        if not index.isValid():
+            return Qt.ItemFlag.ItemIsDropEnabled
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsDragEnabled
+
+    def supportedDropActions(self):
+        return Qt.DropAction.MoveAction
+
+    def mimeTypes(self):
+        return [TaskMimeType]
+
+    def mimeData(self, indexes):
+        # The drop is handled by TaskList from the source view's selection, the payload
+        # only has to identify this as a task drag.
+        mimeData = QMimeData()
+        rows = sorted(set(index.row() for index in indexes))
+        mimeData.setData(TaskMimeType, QByteArray(",".join(map(str, rows)).encode()))
+        return mimeData
+
+    def refreshTask(self, task: Task):
+        entry = self.board.findTask(task.id)
+        if entry is not None and entry.column is self.column:
+            index = self.index(entry.position)
+            self.dataChanged.emit(index, index)
+
+    def setMatches(self, matches):
+        # The board's match set, shared by the models of all columns and only read per row
+        self.matches = matches
+
+
+class TaskCardDelegate(QStyledItemDelegate):
+    margin = 3
+    padding = 8
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex):
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        palette = option.palette
+        rect = option.rect.adjusted(self.margin, self.margin, -self.margin, -self.margin)
+        match = index.data(MatchRole)
+        if match is False:
+            painter.setOpacity(0.35)
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.setBrush(palette.highlight())
+            textColor = palette.highlightedText().color()
+        else:
+            painter.setBrush(palette.button())
+            textColor = palette.buttonText().color()
+        if match:
+            painter.setPen(QPen(palette.highlight().color(), 2))
+        else:
+            painter.setPen(palette.mid().color())
+        painter.drawRoundedRect(rect, 4, 4)
 
-class TaskList(QListWidget):
-    def __init__(self, column: Column):
+        painter.setPen(textColor)
+        textRect = rect.adjusted(self.padding, 0, -self.padding, 0)
+        title = option.fontMetrics.elidedText(index.data(), Qt.TextElideMode.ElideRight, textRect.width())
+        painter.drawText(textRect, Qt.AlignmentFlag.AlignCenter, title)
+
+        painter.restore()
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex):
+        height = option.fontMetrics.height() + 2 * (self.margin + self.padding)
+        return QSize(option.rect.width(), height)
+
+
+class TaskList(QListView):
+    @instrument.timed("widgets.taskList")
+    def __init__(self, column: Column, service: BoardService):
         super(TaskList, self).__init__()
         self.column = column
+        self.service = service
+
+        self.setModel(TaskListModel(self.column, service.board))
+        self.setItemDelegate(TaskCardDelegate(self))
+        # All cards have the same height, which lets the view lay out only the visible rows
+        self.setUniformItemSizes(True)
 
         self.setAcceptDrops(True)
-        self.dragEnabled()
+        self.setDragEnabled(True)
         self.setDragDropMode(QAbstractItemView.DragDropMode.DragDrop)
+        self.setDefaultDropAction(Qt.DropAction.MoveAction)
+        self.setDropIndicatorShown(True)
         self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
-        self.initList(self.column.taskList)
 
-    def initList(self, list: list):
-        for i in list:
-            item = QListWidgetItem()
-            itemWidget = TaskCard(i)
-            item.setSizeHint(itemWidget.sizeHint())
-            self.addItem(item)
-            self.setItemWidget(item, itemWidget)
+    def count(self):
+        return self.model().rowCount()
+
+    def selectedRows(self):
+        rows = [index.row() for index in self.selectionModel().selectedIndexes()]
+        if not rows and self.currentIndex().isValid():
+            rows = [self.currentIndex().row()]
+        return sorted(rows)
+
+    def mouseDoubleClickEvent(self, event: QMouseEvent) -> None:
+        index = self.indexAt(event.position().toPoint())
+        if index.isValid():
+            task: Task = index.data(TaskRole)
+            taskDetail = detailPool.acquire(task, lambda: self.OnDetailClosed(task), self.service)
+            taskDetail.show()
+            taskDetail.raise_()
+            taskDetail.activateWindow()
+        super(TaskList, self).mouseDoubleClickEvent(event)
+
+    def OnDetailClosed(self, task: Task):
+        # The column may have been destroyed while the detail was open
+        if shiboken6.isValid(self):
+            self.model().refreshTask(task)
+
+    def dropRow(self, event: QDropEvent):
+        index = self.indexAt(event.position().toPoint())
+        if not index.isValid():
+            return self.model().rowCount()
+        rect = self.visualRect(index)
+        if event.position().toPoint().y() > rect.center().y():
+            return index.row() + 1
+        return index.row()
 
-    def dropEvent(self, event: QDropEvent) -> None:
-        source: TaskList = event.source()
-        item: QListWidgetItem = source.currentItem()
-        itemWidget: TaskCard = source.itemWidget(item)
-        _task = itemWidget.task
-        if _task is None:
-            _task = Task()
-        if source != self:
-            parentBoard: SubBoard = self.parentWidget()
-            _task.history.append(
-                "Moved to " + parentBoard.titleLabel.text() + " on " + time.asctime(time.localtime(time.time())))
-            item = source.takeItem(source.currentRow())
-            self.addItem(item)
-            self.setItemWidget(item, TaskCard(_task))
-            event.setDropAction(Qt.DropAction.TargetMoveAction)
+    def dragEnterEvent(self, event: QDragEnterEvent) -> None:
+        if isinstance(event.source(), TaskList):
+            super().dragEnterEvent(event)
         else:
-            event.setDropAction(Qt.DropAction.MoveAction)
-        super().dropEvent(event)
+            event.ignore()
 
-    def buildTaskList(self):
-        list = []
-        for i in range(self.count()):
-            task: TaskCard = self.itemWidget(self.item(i))
-            if task:
-                list.append(task.task)
+    @instrument.timed("drop.tasks")
+    def dropEvent(self, event: QDropEvent) -> None:
+        source = event.source()
+        if not isinstance(source, TaskList):
+            event.ignore()
+            return
+
+        rows = source.selectedRows()
+        if source is not self and not self.column.canAccept(len(rows)):
+            # One check for the whole selection, it moves completely or not at all
+            event.ignore()
+            dialog = QMessageBox()
+            dialog.setWindowTitle("Task move fail!")
+            dialog.setText("Maximum Reached!")
+            dialog.exec()
+            return
 
-        return list
+        tasks = self.service.moveTasks(source.column, rows, self.column, self.dropRow(event))
+        if not tasks:
+            event.ignore()
+            return
+        instrument.count("drop.tasksMoved", len(tasks))
+        row = self.service.board.findTask(tasks[0].id).position
 
+        self.clearSelection()
+        for x in range(row, row + len(tasks)):
+            self.selectionModel().select(self.model().index(x), QItemSelectionModel.SelectionFlag.Select)
 
-class SubBoard(QFrame):
-    DestroySignal = Signal()
+        # The rows have already been moved, the source view must not remove them again
+        event.setDropAction(Qt.DropAction.TargetMoveAction)
+        event.accept()
 
+    def setMatches(self, matches, first=-1):
+        # first is the column's first matching row, -1 without one
+        self.model().setMatches(matches)
+        if first >= 0:
+            self.scrollTo(self.model().index(first))
+        self.viewport().update()
+
+
+class SubBoard(QFrame):
     # columnIndex = 0
+    # Height of the drag preview, the top of the column is enough to recognise it
+    previewHeight = 240
 
-    def __init__(self, column: Column):
+    @instrument.timed("widgets.column")
+    def __init__(self, column: Column, service: BoardService):
         super(SubBoard, self).__init__()
 
         self.column = column
+        self.service = service
+        self.dragStart = None
+        # Rendered on the first drag and kept until the column changes
+        self.preview = None
         # self.index = SubBoard.columnIndex
         # SubBoard.columnIndex += 1
 
@@ -234,10 +462,18 @@ class SubBoard(QFrame):
         self.titleLabel.textChanged.connect(self.ColumnTitleChanged)
         self.wip = QSpinBox()
         self.wip.setFixedSize(50, 30)
-        self.wip.textChanged.connect(self.WIPChanged)
+        self.wip.setMaximum(9999)
+        self.wip.setValue(column.WIPLimit)
+        self.wip.valueChanged.connect(self.WIPChanged)
+        self.countLabel = QLabel()
+        self.UpdateCount()
 
         # Task List
-        self.taskList = TaskList(self.column)
+        self.taskList = TaskList(self.column, self.service)
+        model = self.taskList.model()
+        for signal in (model.dataChanged, model.rowsInserted, model.rowsRemoved, model.modelReset,
+                       self.taskList.verticalScrollBar().valueChanged):
+            signal.connect(self.InvalidatePreview)
 
         # Main layout
         layout = QVBoxLayout()
@@ -248,6 +484,7 @@ class SubBoard(QFrame):
         layout.addLayout(buttonLayout)
         # Label Layout
         labelLayout.addWidget(self.titleLabel)
+        labelLayout.addWidget(self.countLabel)
         labelLayout.addWidget(self.wip)
         # Button layout
         buttonLayout.addWidget(self.addButton)
@@ -257,17 +494,8 @@ class SubBoard(QFrame):
         self.setLayout(layout)
 
     def AddButtonClicked(self):
-        if int(self.column.WIPLimit) == 0 or self.taskList.count() < int(self.column.WIPLimit):
-            item = QListWidgetItem()
-            task = Task()
-            task.history.append("Created on " + time.asctime(time.localtime(time.time())))
-            itemWidget = TaskCard(task)
-            item.setSizeHint(itemWidget.sizeHint())
-            self.column.taskList.append(task)
-            self.taskList.addItem(item)
-            self.taskList.setItemWidget(item, itemWidget)
-            self.column.taskList = self.taskList.buildTaskList()
-
+        if self.column.canAccept():
+            self.service.addTasks(self.column, [Task()])
         else:
             dialog = QMessageBox()
             dialog.setWindowTitle("Task add fail!")
@@ -275,49 +503,194 @@ class SubBoard(QFrame):
             dialog.exec()
 
     def DelButtonClicked(self):
-        selectedItems = self.taskList.selectedItems()
-        if selectedItems:
-            for item in selectedItems:
-                self.taskList.takeItem(self.taskList.row(item))
-            self.column.taskList = self.taskList.buildTaskList()
+        selectedRows = self.taskList.selectedRows()
+        if selectedRows:
+            self.service.deleteTasks(self.column, selectedRows)
 
     def DestroyButtonClicked(self):
-        # for index in reversed(range(self.layout().count() - 1)):
-        #     self.layout().takeAt(index).widget().deleteLater()
-        self.column = None
-        self.deleteLater()
-        self.DestroySignal.emit()
+        # The widget is removed by MainBoard once the board dropped the column
+        self.service.removeColumn(self.column)
 
     def WIPChanged(self):
-        self.column.WIPLimit = self.wip.text()
+        self.service.setField(self.column, "WIPLimit", self.wip.value())
+        self.UpdateCount()
+
+    def UpdateCount(self):
+        # Task count against the WIP limit, red once the column is over it
+        count = len(self.column.taskList)
+        limit = self.column.WIPLimit
+        self.countLabel.setText(str(count) + "/" + str(limit) if limit else str(count))
+        self.countLabel.setStyleSheet("color: red" if self.column.overLimit() else "")
 
     def ColumnTitleChanged(self):
-        self.column.title = self.titleLabel.text()
+        self.service.setField(self.column, "title", self.titleLabel.text())
+
+    def Refresh(self):
+        if self.titleLabel.text() != self.column.title:
+            self.titleLabel.blockSignals(True)
+            self.titleLabel.setText(self.column.title)
+            self.titleLabel.blockSignals(False)
+        if self.wip.value() != self.column.WIPLimit:
+            self.wip.blockSignals(True)
+            self.wip.setValue(self.column.WIPLimit)
+            self.wip.blockSignals(False)
+        self.UpdateCount()
+        self.InvalidatePreview()
+
+    def InvalidatePreview(self, *args):
+        self.preview = None
+
+    def Preview(self):
+        if self.preview is None:
+            self.preview = self.grab(QRect(0, 0, self.width(), min(self.height(), self.previewHeight)))
+        return self.preview
+
+    def resizeEvent(self, event) -> None:
+        self.preview = None
+        super().resizeEvent(event)
+
+    def mousePressEvent(self, event: QMouseEvent) -> None:
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.dragStart = event.position().toPoint()
+        super().mousePressEvent(event)
+
+    def mouseReleaseEvent(self, event: QMouseEvent) -> None:
+        self.dragStart = None
+        super().mouseReleaseEvent(event)
 
     def mouseMoveEvent(self, event: QMouseEvent) -> None:
-        if event.buttons() == Qt.MouseButton.LeftButton:
+        # One drag per press, once the mouse has moved further than a click would
+        if self.dragStart is not None and event.buttons() & Qt.MouseButton.LeftButton and \
+                (event.position().toPoint() - self.dragStart).manhattanLength() >= QApplication.startDragDistance():
+            hotSpot = self.dragStart
+            self.dragStart = None
+            preview = self.Preview()
             drag = QDrag(self)
-            widgetImage = self.grab()
-            mimeData = QMimeData()
-            drag.setMimeData(mimeData)
-            drag.setPixmap(widgetImage)
-            drag.setHotSpot(event.position().toPoint() - self.rect().topLeft())
+            drag.setMimeData(QMimeData())
+            drag.setPixmap(preview)
+            hotSpot.setY(min(hotSpot.y(), preview.height() - 1))
+            drag.setHotSpot(hotSpot)
             drag.exec()
 
         super().mouseMoveEvent(event)
 
 
+class BoardWidgets(BoardObserver):
+    # Keeps the widgets of a MainBoard in step with the changes made through its board,
+    # those made by undo and redo included
+
+    def __init__(self, mainBoard):
+        self.mainBoard = mainBoard
+
+    def model(self, column: Column):
+        if not shiboken6.isValid(self.mainBoard):
+            return None
+        widget = self.mainBoard.columnWidgets.get(id(column))
+        return widget.taskList.model() if widget is not None else None
+
+    def tasksAboutToBeInserted(self, column: Column, row: int, count: int):
+        model = self.model(column)
+        if model is not None:
+            model.beginInsertRows(QModelIndex(), row, row + count - 1)
+
+    def tasksInserted(self, column: Column, row: int, count: int):
+        model = self.model(column)
+        if model is not None:
+            model.endInsertRows()
+            self.mainBoard.columnWidgets[id(column)].UpdateCount()
+
+    def tasksAboutToBeRemoved(self, column: Column, first: int, last: int):
+        model = self.model(column)
+        if model is not None:
+            model.beginRemoveRows(QModelIndex(), first, last)
+
+    def tasksRemoved(self, column: Column, first: int, last: int):
+        model = self.model(column)
+        if model is not None:
+            model.endRemoveRows()
+            self.mainBoard.columnWidgets[id(column)].UpdateCount()
+
+    def columnInserted(self, column: Column, position: int):
+        if shiboken6.isValid(self.mainBoard):
+            self.mainBoard.InsertColumnWidget(column, position)
+
+    def columnRemoved(self, column: Column, position: int):
+        if shiboken6.isValid(self.mainBoard):
+            self.mainBoard.RemoveColumnWidget(column)
+
+    def columnMoved(self, column: Column, old: int, new: int):
+        if shiboken6.isValid(self.mainBoard):
+            self.mainBoard.MoveColumnWidget(column, new)
+
+    def fieldChanged(self, target, name):
+        if not shiboken6.isValid(self.mainBoard):
+            return
+        if isinstance(target, Task):
+            entry = self.mainBoard.board.findTask(target.id)
+            model = self.model(entry.column) if entry is not None else None
+            if model is not None:
+                model.refreshTask(target)
+            detail = detailPool.opened.get(id(target))
+            if detail is not None:
+                detail.Refresh()
+        elif isinstance(target, Column):
+            widget = self.mainBoard.columnWidgets.get(id(target))
+            if widget is not None:
+                widget.Refresh()
+        else:
+            self.mainBoard.Refresh()
+
+
+class SyncBridge(QObject):
+    # Runs the calls a SyncClient posts from its thread on the GUI thread, in order
+    posted = Signal(object)
+
+    def __init__(self, client, parent=None):
+        super(SyncBridge, self).__init__(parent)
+        self.posted.connect(self.Run)
+        client.setPost(self.posted.emit)
+        # Messages that arrive once the board's widgets are deleted are kept by the client
+        self.destroyed.connect(lambda: client.setPost(None))
+
+    def Run(self, call):
+        call()
+
+
 class MainBoard(QWidget):
-    def __init__(self, board: Board):
+    @instrument.timed("widgets.board")
+    def __init__(self, service: BoardService):
         super().__init__()
 
-        self.board = board
+        # Widgets read the board directly and change it through the service
+        self.service = service
+        self.board = service.board
+        if service.storage is None:
+            service.storage = XMLStorage("project.xml")
+        self.storage = service.storage
+        self.autoSaver = AutoSaver(self.board, self.storage, parent=self)
+        # Changes made to the file by others are merged into the open board
+        self.fileWatcher = FileWatcher(self.storage, parent=self)
+        self.fileWatcher.changed.connect(self.MergeFromDisk)
+        self.autoSaver.conflicted.connect(self.MergeFromDisk)
+        # id(column) -> SubBoard
+        self.columnWidgets = {}
+        self.columnEdges = []
+        self.board.observers.append(BoardWidgets(self))
 
         self.setAcceptDrops(True)
 
         self.InitUI()
         self.InitColumn()
 
+        if isinstance(service, SyncedService):
+            # Deltas from the sync server are read on the client's thread and applied here
+            self.syncBridge = SyncBridge(service.client, self)
+            # The server saves the board
+            self.autoSaver.timer.stop()
+            self.saveStatus.setText("Shared through " + self.storage.fileName)
+            service.client.onError = lambda message: self.saveStatus.setText("Refused by server: " + message)
+            service.client.onClosed = self.OnDisconnected
+
     def InitUI(self):
         # Button
         addButton = QPushButton("+")
@@ -327,6 +700,30 @@ class MainBoard(QWidget):
         # openFileButton.clicked.connect(self.OnOpenButtonClicked)
         saveFileButton = QPushButton("Save")
         saveFileButton.clicked.connect(self.OnSaveButtonClicked)
+
+        # Undo
+        undoButton = QPushButton("Undo")
+        undoButton.clicked.connect(self.service.undo)
+        redoButton = QPushButton("Redo")
+        redoButton.clicked.connect(self.service.redo)
+        QShortcut(QKeySequence.StandardKey.Undo, self).activated.connect(self.service.undo)
+        QShortcut(QKeySequence.StandardKey.Redo, self).activated.connect(self.service.redo)
+
+        # Save status
+        self.saveStatus = QLabel()
+        self.autoSaver.started.connect(lambda: self.saveStatus.setText("Saving..."))
+        self.autoSaver.progress.connect(self.OnSaveProgress)
+        self.autoSaver.saved.connect(self.OnSaved)
+        self.autoSaver.failed.connect(self.OnSaveFailed)
+
+        # Search
+        self.searchBox = QLineEdit()
+        self.searchBox.setPlaceholderText("Search")
+        self.searchBox.setClearButtonEnabled(True)
+        self.searchBox.textChanged.connect(self.OnSearchChange)
+        self.dueFilter = QComboBox()
+        self.dueFilter.addItems(["All dates", "Overdue", "Due this week"])
+        self.dueFilter.currentIndexChanged.connect(self.OnSearchChange)
         # closeProjectButton = QPushButton("Close")
         # closeProjectButton.clicked.connect(self.OnCloseButtonClicked)
 
@@ -345,6 +742,11 @@ class MainBoard(QWidget):
         toolbarLayout = QHBoxLayout()
         # toolbarLayout.addWidget(openFileButton)
         toolbarLayout.addWidget(saveFileButton)
+        toolbarLayout.addWidget(undoButton)
+        toolbarLayout.addWidget(redoButton)
+        toolbarLayout.addWidget(self.saveStatus)
+        toolbarLayout.addWidget(self.searchBox)
+        toolbarLayout.addWidget(self.dueFilter)
         # toolbarLayout.addWidget(closeProjectButton)
 
         mainLayout.addLayout(self.boardLayout)
@@ -353,55 +755,126 @@ class MainBoard(QWidget):
         self.setLayout(mainLayout)
 
     def InitColumn(self):
-        for i in self.board.columnList:
-            insColumn = i
-            columnWidget = SubBoard(insColumn)
-            columnWidget.DestroySignal.connect(self.ColumnDel)
-            self.boardLayout.insertWidget(self.boardLayout.count() - 1, columnWidget)
+        for position in range(len(self.board.columnList)):
+            self.InsertColumnWidget(self.board.columnList[position], position)
 
     def AddColumn(self):
-        insColumn = Column()
-        columnWidget = SubBoard(insColumn)
-        columnWidget.DestroySignal.connect(self.ColumnDel)
-        self.board.columnList.append(insColumn)
-        self.boardLayout.insertWidget(self.boardLayout.count() - 1, columnWidget)
-
-    def ColumnDel(self):
-        allWidget = self.findChildren(SubBoard)
-        index = 0
-        for i in allWidget:
-            if self.sender() == i:
-                self.board.columnList.pop(index)
-            index += 1
+        self.service.addColumn()
+
+    # Column widgets follow the board's columnList, the layout holds them in the same
+    # order followed by the add button
+
+    def InsertColumnWidget(self, column: Column, position: int):
+        columnWidget = SubBoard(column, self.service)
+        self.columnWidgets[id(column)] = columnWidget
+        self.boardLayout.insertWidget(position, columnWidget)
+        matches = self.Matches()
+        if matches is not None:
+            columnWidget.taskList.setMatches(matches, self.FirstMatches(matches).get(id(column), -1))
+
+    def RemoveColumnWidget(self, column: Column):
+        columnWidget = self.columnWidgets.pop(id(column), None)
+        if columnWidget is not None:
+            self.boardLayout.removeWidget(columnWidget)
+            columnWidget.deleteLater()
+
+    def MoveColumnWidget(self, column: Column, position: int):
+        columnWidget = self.columnWidgets.get(id(column))
+        if columnWidget is not None:
+            self.boardLayout.removeWidget(columnWidget)
+            self.boardLayout.insertWidget(position, columnWidget)
+
+    def Refresh(self):
+        if self.projectTitle.text() != self.board.title:
+            self.projectTitle.blockSignals(True)
+            self.projectTitle.setText(self.board.title)
+            self.projectTitle.blockSignals(False)
 
     def OnSaveButtonClicked(self):
-        allBoard = self.findChildren(SubBoard)
-        for i in allBoard:
-            subBoard: SubBoard = i
-            subBoard.column.taskList = subBoard.taskList.buildTaskList()
-        buildXML(self.board)
+        # The task models write straight into the columns, there is nothing to collect
+        # from the widgets before saving.
+        self.autoSaver.saveNow()
+
+    def OnSaveProgress(self, done, total):
+        self.saveStatus.setText("Saving... " + str(done * 100 // max(total, 1)) + "%")
+
+    def OnSaved(self, seconds):
+        self.saveStatus.setText("Saved " + time.strftime("%H:%M:%S"))
+        # The watcher stays quiet while a save runs
+        if self.storage.changedOnDisk():
+            self.MergeFromDisk()
+
+    def MergeFromDisk(self):
+        # Someone else changed the project file: their changes are brought into the board
+        # card by card, then whatever is still only here is saved
+        if self.autoSaver.saving():
+            return
+        dirty = self.autoSaver.dirty()
+        try:
+            result = self.service.merge()
+        except (OSError, ValueError, SyntaxError) as e:
+            self.saveStatus.setText("Could not merge changes from disk: " + (str(e) or type(e).__name__))
+            return
+        self.Refresh()
+        if dirty or result.conflicts:
+            self.autoSaver.saveNow()
+        else:
+            self.autoSaver.markSaved()
+        self.saveStatus.setText("Merged from disk " + time.strftime("%H:%M:%S") + ": " + str(result))
+
+    def OnDisconnected(self):
+        self.saveStatus.setText("Disconnected from " + self.storage.fileName)
+        self.setEnabled(False)
+
+    def OnSaveFailed(self, message):
+        self.saveStatus.setText("Save failed: " + message)
 
     def OnTitleChange(self):
-        self.board.title = self.projectTitle.text()
+        self.service.setField(self.board, "title", self.projectTitle.text())
+
+    def Matches(self):
+        # Ids of the tasks passing both the search box and the date filter, None for all
+        due = self.dueFilter.currentIndex()
+        return self.service.matches(self.searchBox.text(), dueFilters[due - 1] if due else None)
+
+    def FirstMatches(self, matches):
+        # id(column) -> first matching row, from one pass over the matches
+        firsts = {}
+        if matches:
+            index = self.board.taskIndex
+            for taskId in matches:
+                entry = index.get(taskId)
+                if entry is not None and entry.position < firsts.get(id(entry.column), len(entry.column.taskList)):
+                    firsts[id(entry.column)] = entry.position
+        return firsts
+
+    def OnSearchChange(self):
+        matches = self.Matches()
+        firsts = self.FirstMatches(matches)
+        for key, columnWidget in self.columnWidgets.items():
+            columnWidget.taskList.setMatches(matches, firsts.get(key, -1))
+            columnWidget.InvalidatePreview()
 
     def dragEnterEvent(self, event: QDragEnterEvent) -> None:
         if isinstance(event.source(), SubBoard):
+            # Right edges of the column widgets in board order. Nothing can change the
+            # layout during a drag, so they are read once when it enters.
+            self.columnEdges = [self.boardLayout.itemAt(i).geometry().right() for i in range(len(self.columnWidgets))]
             event.accept()
 
+    def ColumnAt(self, x):
+        # Position of the column under x, the last one for anything right of it
+        return min(bisect.bisect_left(self.columnEdges, x), len(self.columnEdges) - 1)
+
+    @instrument.timed("drop.column")
     def dropEvent(self, event: QDropEvent) -> None:
         pos = event.position().toPoint()
 
         widget: SubBoard = event.source()
 
-        subLayout = self.layout().itemAt(1)
-        widgetIndex = -1
-        for i in range(subLayout.count()):
-            if subLayout.itemAt(i).geometry().contains(pos):
-                widgetIndex = i
-
-        if widgetIndex >= 0:
-            index = min(widgetIndex, subLayout.count() - 1)
-            subLayout.insertWidget(index, widget)
+        if isinstance(widget, SubBoard) and self.columnEdges and self.boardLayout.geometry().contains(pos):
+            # The board moves the widget through MoveColumnWidget
+            self.service.moveColumn(widget.column, self.ColumnAt(pos.x()))
 
         event.setDropAction(Qt.DropAction.MoveAction)
         event.accept()
@@ -411,7 +884,7 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
 
-    window = MainBoard(Board("Title"))
+    window = MainBoard(BoardService(Board("Title")))
     window.show()
 
     sys.exit(app.exec())
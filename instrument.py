@@ -0,0 +1,133 @@
+# Opt-in timers and counters around the slow paths (load, widget construction, drops,
+# saves, undo). Off unless KANBAN_PROFILE is set in the environment or enable() is called,
+# and while off a timed function costs one flag check. Each timed operation records its
+# call count, total and longest time and the change in resident memory it caused.
+#
+#   KANBAN_PROFILE=1 KANBAN_PROFILE_DUMP=profile.json python main.py
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+enabled = bool(os.environ.get("KANBAN_PROFILE"))
+dumpFile = os.environ.get("KANBAN_PROFILE_DUMP")
+
+lock = threading.Lock()
+stats = {}
+counters = {}
+pageSize = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss():
+    # Resident set size in bytes, 0 where it cannot be read cheaply
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * pageSize
+    except (OSError, ValueError):
+        return 0
+
+
+class Stat:
+    __slots__ = ("count", "total", "longest", "memory")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.longest = 0.0
+        self.memory = 0
+
+    def record(self, seconds, memory):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.longest:
+            self.longest = seconds
+        self.memory += memory
+
+    def toDict(self):
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else 0.0,
+                "max": self.longest, "memory": self.memory}
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def reset():
+    with lock:
+        stats.clear()
+        counters.clear()
+
+
+def record(name, seconds, memory=0):
+    with lock:
+        stat = stats.get(name)
+        if stat is None:
+            stat = stats[name] = Stat()
+        stat.record(seconds, memory)
+
+
+def count(name, amount=1):
+    if enabled:
+        with lock:
+            counters[name] = counters.get(name, 0) + amount
+
+
+class measure:
+    # with measure("name"): ... times the block when instrumentation is on
+    __slots__ = ("name", "started", "memory")
+
+    def __init__(self, name):
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        if enabled:
+            self.memory = rss()
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        if self.started is not None:
+            record(self.name, time.perf_counter() - self.started, rss() - self.memory)
+
+
+def timed(name):
+    # Decorator form of measure
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            memory = rss()
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started, rss() - memory)
+        return wrapper
+    return decorate
+
+
+def snapshot() -> dict:
+    with lock:
+        return {
+            "enabled": enabled,
+            "time": time.time(),
+            "python": sys.version.split()[0],
+            "rss": rss(),
+            "stats": {name: stat.toDict() for name, stat in sorted(stats.items())},
+            "counters": dict(sorted(counters.items())),
+        }
+
+
+def dump(fileName=None):
+    # Writes snapshot() as JSON to fileName, standard output when not given
+    data = json.dumps(snapshot(), indent=1)
+    if fileName is None:
+        print(data)
+    else:
+        with open(fileName, "w", encoding="utf-8") as out:
+            out.write(data + "\n")
@@ -1,47 +1,262 @@
 import os
+import sys
+import time
 
-from PySide6.QtWidgets import QApplication, QMessageBox, QMainWindow, QHBoxLayout, QWidget
+from PySide6.QtCore import Qt, QTimer, Signal
+from PySide6.QtGui import QKeySequence, QShortcut
+from PySide6.QtWidgets import QApplication, QMessageBox, QMainWindow, QLabel, QDockWidget, QListWidget, \
+    QListWidgetItem, QStackedWidget
 
-from Board import template
-from db import parserXML
-from gui import MainBoard, Board
+import instrument
+from workspace import Workspace
+
+FileRole = Qt.ItemDataRole.UserRole
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    # Shown with a placeholder before anything else is done. The project is then read a
+    # slice at a time from the event loop and each column appears as soon as all its tasks
+    # have been read, left to right, so the columns on screen come first. The board can be
+    # edited once the whole project is in. The widget modules are imported on first use.
+    # The other projects of the directory are listed on the left. Boards that were shown
+    # stay loaded with their widgets, up to the workspace's memory budget, and switching
+    # back to one only brings its page to the front.
+    loaded = Signal()
+    sliceTime = 0.03
+    budget = 256 * 2 ** 20
+
+    def __init__(self, fileName=None):
         super().__init__()
         self.setWindowTitle("Kanban - Python")
-        self.initUI()
+        if fileName and os.path.isdir(fileName):
+            directory, fileName = fileName, None
+        elif fileName and "://" in fileName:
+            # A shared board, see sync.py
+            directory = "."
+        else:
+            directory = os.path.dirname(fileName) if fileName else "."
+        self.workspace = Workspace(directory or ".", self.budget, self.OnEvict)
+        self.fileName = fileName
+        self.storage = None
+        self.boardWindow = None
+        self.stream = None
+        self.column = None
+        self.profileDock = None
+        self.started = time.perf_counter()
 
-    def initUI(self):
-        layout = QHBoxLayout()
+        self.placeholder = QLabel("Loading " + (fileName or "project") + "...")
+        self.placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.stack = QStackedWidget()
+        self.stack.addWidget(self.placeholder)
+        self.setCentralWidget(self.stack)
 
-        if os.path.exists("project.xml"):
-            board = parserXML("project.xml")
-            boardWindow = MainBoard(board)
-            layout.addWidget(boardWindow)
-        else:
-            reply = QMessageBox.question(self, "", "Project file not found. Load template?",
-                                         QMessageBox.Yes | QMessageBox.No)
+        self.projectList = QListWidget()
+        self.projectRows = []
+        self.projectList.itemActivated.connect(self.OnProjectActivated)
+        self.projectList.itemClicked.connect(self.OnProjectActivated)
+        self.projectDock = QDockWidget("Projects", self)
+        self.projectDock.setWidget(self.projectList)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.projectDock)
+        # File times are checked now and then, only changed files are read again
+        self.listTimer = QTimer(self)
+        self.listTimer.timeout.connect(self.RefreshProjects)
+        self.listTimer.start(5000)
+
+        self.loadTimer = QTimer(self)
+        self.loadTimer.timeout.connect(self.LoadSlice)
+        QTimer.singleShot(0, self.StartLoading)
+        # F12 shows the profiling overlay
+        QShortcut(QKeySequence(Qt.Key.Key_F12), self).activated.connect(self.ToggleProfile)
+
+    def StartLoading(self):
+        from service import findProject
+        self.OpenProject(findProject(self.fileName))
+        self.RefreshProjects()
+
+    def OpenProject(self, fileName):
+        from storage import openStorage
+        if "://" not in fileName:
+            fileName = os.path.normpath(fileName)
+        if fileName == self.fileName and self.boardWindow is not None:
+            return
+        with instrument.measure("workspace.switch"):
+            self.CancelLoading()
+            if self.fileName in self.workspace.cache:
+                # The board being left may have grown since it was estimated
+                self.workspace.cache.update(self.fileName)
+            self.fileName = fileName
+            self.SelectProject()
+            entry = self.workspace.cache.get(fileName)
+            if entry is not None:
+                self.boardWindow = entry.view
+                self.storage = entry.service.storage
+                self.stack.setCurrentWidget(entry.view)
+                return
+
+            self.boardWindow = None
+            self.started = time.perf_counter()
+            self.placeholder.setText("Loading " + fileName + "...")
+            self.stack.setCurrentWidget(self.placeholder)
+            self.storage = openStorage(fileName)
+
+        if self.storage.exists():
+            self.stream = self.storage.stream()
+            self.loadTimer.start(0)
+            return
+
+        from Board import Board, template
+        reply = QMessageBox.question(self, "", "Project file not found. Load template?",
+                                     QMessageBox.Yes | QMessageBox.No)
+        self.ShowBoard(template() if reply == QMessageBox.Yes else Board("New Project"))
+        self.Loaded()
+
+    def CancelLoading(self):
+        # A partly read project is dropped, never saved or cached
+        if self.stream is None:
+            return
+        self.loadTimer.stop()
+        self.stream = None
+        self.column = None
+        if self.boardWindow is not None:
+            self.stack.removeWidget(self.boardWindow)
+            self.boardWindow.deleteLater()
+        self.boardWindow = None
+        self.storage.close()
+        self.storage = None
+
+    def ShowBoard(self, board):
+        from gui import MainBoard
+        from service import BoardService
 
-            if reply == QMessageBox.Yes:
-                board = template()
-                boardWindow = MainBoard(board)
-                layout.addWidget(boardWindow)
-            else:
-                boardWindow = MainBoard(Board("New Project"))
-                layout.addWidget(boardWindow)
+        self.boardWindow = MainBoard((self.storage.serviceType or BoardService)(board, self.storage))
+        self.stack.addWidget(self.boardWindow)
+        self.stack.setCurrentWidget(self.boardWindow)
+
+    def LoadSlice(self):
+        with instrument.measure("load.slice"):
+            try:
+                if self.ReadSlice():
+                    return
+            except (OSError, ValueError) as e:
+                # Unreadable or malformed file, or unreachable sync server
+                fileName = self.fileName
+                self.CancelLoading()
+                self.placeholder.setText("Could not open " + fileName + ": " + (str(e) or type(e).__name__))
+                return
+        self.loadTimer.stop()
+        self.stream = None
+        self.ColumnRead()
+        self.column = None
+        self.Loaded()
+
+    def ReadSlice(self):
+        # True while there is more to read
+        deadline = time.perf_counter() + self.sliceTime
+        for board, column, task in self.stream:
+            if self.boardWindow is None:
+                # The board comes before any of its columns, MainBoard starts out empty
+                self.ShowBoard(board)
+                self.boardWindow.setEnabled(False)
+            if column is not self.column:
+                self.ColumnRead()
+                self.column = column
+            if time.perf_counter() > deadline:
+                return True
+        return False
+
+    def ColumnRead(self):
+        # Every task of the previous column has been read, show it
+        if self.column is not None:
+            self.boardWindow.InsertColumnWidget(self.column, len(self.boardWindow.columnWidgets))
+
+    def Loaded(self):
+        self.boardWindow.setEnabled(True)
+        self.workspace.cache.put(self.fileName, self.boardWindow.service, self.boardWindow)
+        if instrument.enabled:
+            instrument.record("load.interactive", time.perf_counter() - self.started)
+        self.loaded.emit()
+
+    def OnEvict(self, entry):
+        # A board pushed out of the workspace cache: saved, then its widgets and file let go
+        from gui import detailPool
+        detailPool.closeAll(entry.service)
+        if entry.view is not None:
+            entry.view.autoSaver.flush()
+            self.stack.removeWidget(entry.view)
+            entry.view.deleteLater()
+        entry.service.close()
+        instrument.count("workspace.evicted")
+
+    # Project list
+
+    def RefreshProjects(self):
+        projects = self.workspace.list()
+        known = [os.path.normpath(info.fileName) for info in projects]
+        if self.fileName and self.fileName not in known:
+            known.append(self.fileName)
+        rows = []
+        for fileName in known:
+            info = self.workspace.info(fileName) if os.path.exists(fileName) else None
+            toolTip = fileName
+            if info is not None:
+                toolTip += "\nModified " + time.strftime("%Y-%m-%d %H:%M", time.localtime(info.modified))
+            rows.append((fileName, self.ProjectText(fileName, info), toolTip))
+        if rows == self.projectRows:
+            return
+        self.projectRows = rows
+        self.projectList.blockSignals(True)
+        self.projectList.clear()
+        for fileName, text, toolTip in rows:
+            item = QListWidgetItem(text)
+            item.setData(FileRole, fileName)
+            item.setToolTip(toolTip)
+            self.projectList.addItem(item)
+        self.projectList.blockSignals(False)
+        self.SelectProject()
+
+    def ProjectText(self, fileName, info):
+        if info is None:
+            return os.path.basename(fileName) + ("\n(shared)" if "://" in fileName else "\n(new)")
+        loaded = " *" if os.path.normpath(fileName) in self.workspace.cache else ""
+        columns = ", ".join("%s %d" % column for column in info.columns)
+        return info.title + loaded + "\n" + (columns or "no columns")
+
+    def SelectProject(self):
+        for row in range(self.projectList.count()):
+            item = self.projectList.item(row)
+            if item.data(FileRole) == self.fileName:
+                self.projectList.blockSignals(True)
+                self.projectList.setCurrentItem(item)
+                self.projectList.blockSignals(False)
+
+    def OnProjectActivated(self, item):
+        self.OpenProject(item.data(FileRole))
+
+    def ToggleProfile(self):
+        if self.profileDock is None:
+            from utils import ProfileDock
+            self.profileDock = ProfileDock(self)
+            self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.profileDock)
+        else:
+            self.profileDock.setVisible(not self.profileDock.isVisible())
 
-        widget = QWidget()
-        widget.setLayout(layout)
-        self.setCentralWidget(widget)
-        self.adjustSize()
+    def closeEvent(self, event):
+        # A partly read project is never saved, its revision has not moved
+        self.loadTimer.stop()
+        self.listTimer.stop()
+        # Unsaved edits of every open board are written before the window goes away
+        for entry in self.workspace.cache:
+            if entry.view is not None:
+                entry.view.autoSaver.flush()
+        if instrument.enabled and instrument.dumpFile:
+            instrument.dump(instrument.dumpFile)
+        super().closeEvent(event)
 
 
 if __name__ == '__main__':
     app = QApplication([])
     app.setStyle("Fusion")
-    window = MainWindow()
+    window = MainWindow(sys.argv[1] if len(sys.argv) > 1 else None)
     screen_size = QApplication.primaryScreen().availableSize()
     window.resize(screen_size.width() / 3, screen_size.height() / 2)
     window.show()
@@ -0,0 +1,357 @@
+# Three-way merge of a board with a newer version of its project file written by someone
+# else. The base is the file as this program last read or wrote it, kept as a BoardState:
+# the layout and, per task id, hashes of the four parts of the task's element (see
+# db.taskParts) and the task's revision at the time. A task part changed on one side is
+# taken from that side; changed on both it stays as it is here, except the history, which
+# gets the other side's new events. Tasks follow a move made on one side, remote tasks
+# are added, and tasks deleted remotely go unless they were changed here. Columns are
+# matched by title. Binary project files are merged the same way, from the boards read
+# from the two versions (mergeBoards).
+#
+# Changes are made through the Board, so its observers (the open MainBoard) update the
+# affected cards only. They are not put on the undo stack.
+import xml.etree.ElementTree as ET
+
+from Board import Board
+from Column import Column, wipLimit
+from Task import HistoryEntry, Task
+from db import scanXML, taskFromElement, taskParts, taskXML
+
+partNames = ("title", "describe", "dates", "history")
+
+
+class BoardState:
+    __slots__ = ("title", "columns", "tasks", "revisions")
+
+    def __init__(self, title=None, columns=(), tasks=None, revisions=None):
+        self.title = title
+        # (title, WIPLimit, [task ids]) in board order
+        self.columns = list(columns)
+        # task id -> (column title, part hashes)
+        self.tasks = tasks if tasks is not None else {}
+        # task id -> Task.revision of the local task when the state was taken, 0 when missing
+        self.revisions = revisions if revisions is not None else {}
+
+    @staticmethod
+    def read(data, revisions=None, ranges=None):
+        # State of the project file held in data. ranges, when given, gets the byte range
+        # of every task element by id.
+        title, columns = scanXML(data)
+        tasks = {}
+        layout = []
+        for columnTitle, WIPLimit, entries in columns:
+            ids = []
+            for taskId, start, end in entries:
+                if taskId is None:
+                    continue
+                tasks[taskId] = (columnTitle, taskParts(data[start:end]))
+                ids.append(taskId)
+                if ranges is not None:
+                    ranges[taskId] = (start, end)
+            layout.append((columnTitle, WIPLimit, ids))
+        return BoardState(title, layout, tasks, revisions)
+
+    @staticmethod
+    def fromBoard(board: Board, revisions=None, tasks=None):
+        # State of a board read in full from a file in another format, with the parts
+        # hashed as its tasks would be written to XML. tasks, when given, gets every task
+        # by id.
+        states = {}
+        layout = []
+        for column in board.columnList:
+            ids = []
+            for task in column.taskList:
+                states[task.id] = (column.title, taskParts(taskXML(task).encode("utf-8")))
+                ids.append(task.id)
+                if tasks is not None:
+                    tasks[task.id] = task
+            layout.append((column.title, column.WIPLimit, ids))
+        return BoardState(board.title, layout, states, revisions)
+
+    def wip(self, title):
+        for columnTitle, WIPLimit, ids in self.columns:
+            if columnTitle == title:
+                return WIPLimit
+        return None
+
+
+def revisions(board: Board) -> dict:
+    return {task.id: task.revision for column in board.columnList for task in column.taskList}
+
+
+class MergeResult:
+    def __init__(self):
+        self.added = 0
+        self.removed = 0
+        self.updated = 0
+        self.moved = 0
+        self.columns = 0
+        # (task id, part name) changed on both sides, kept as they are here
+        self.conflicts = []
+
+    @property
+    def changes(self):
+        return self.added + self.removed + self.updated + self.moved + self.columns
+
+    def __str__(self):
+        text = "%d added, %d removed, %d updated, %d moved" % (self.added, self.removed, self.updated, self.moved)
+        if self.conflicts:
+            text += ", %d conflicts kept local" % len(self.conflicts)
+        return text
+
+
+def reorder(current: list, order: list):
+    # current with the items that are also in order put in that order, the others stay
+    # in their slots
+    shared = set(map(id, order)) & set(map(id, current))
+    wanted = iter([item for item in order if id(item) in shared])
+    return [next(wanted) if id(item) in shared else item for item in current]
+
+
+class Merger:
+    def __init__(self, board: Board, base: BoardState, data):
+        self.board = board
+        # Without a base the file's version of every task is taken
+        self.known = base is not None
+        self.base = base or BoardState()
+        self.ranges = {}
+        self.remote = self.readRemote(data)
+        self.result = MergeResult()
+        if self.remote.tasks:
+            Task.reserveId(max(self.remote.tasks))
+        # task id -> revision the next base should hold for it
+        self.nextRevisions = {}
+
+    def readRemote(self, data) -> BoardState:
+        self.data = data
+        return BoardState.read(data, ranges=self.ranges)
+
+    def remoteTask(self, taskId) -> Task:
+        start, end = self.ranges[taskId]
+        return taskFromElement(ET.fromstring(bytes(self.data[start:end])))
+
+    def localParts(self, task: Task):
+        base = self.base.tasks.get(task.id)
+        if base is not None and task.revision == self.base.revisions.get(task.id, 0):
+            return base[1]
+        return taskParts(taskXML(task).encode("utf-8"))
+
+    def columns(self) -> dict:
+        return {column.title: column for column in self.board.columnList}
+
+    def run(self) -> MergeResult:
+        board, base, remote = self.board, self.base, self.remote
+        index = board.taskIndex
+        # Columns whose order was not changed here follow the remote order
+        baseOrder = {title: ids for title, WIPLimit, ids in base.columns}
+        keepOrder = set()
+        for column in board.columnList:
+            ids = baseOrder.get(column.title)
+            if ids is not None:
+                here = set(task.id for task in column.taskList)
+                local = [task.id for task in column.taskList if task.id in base.tasks]
+                if local != [taskId for taskId in ids if taskId in here]:
+                    keepOrder.add(column.title)
+
+        if remote.title != base.title and board.title == base.title and remote.title is not None:
+            board.setField(board, "title", remote.title)
+            self.result.columns += 1
+        self.mergeColumns()
+
+        for taskId in list(dict.fromkeys(list(base.tasks) + list(remote.tasks))):
+            self.mergeTask(taskId, index.get(taskId))
+
+        self.removeColumns()
+        self.order(keepOrder)
+        if self.result.changes:
+            board.undoStack.clear()
+        return self.result
+
+    def mergeColumns(self):
+        board, base, remote = self.board, self.base, self.remote
+        baseTitles = set(title for title, WIPLimit, ids in base.columns)
+        for position in range(len(remote.columns)):
+            title, WIPLimit, ids = remote.columns[position]
+            local = self.columns()
+            column = local.get(title)
+            if column is None:
+                if title in baseTitles:
+                    # Removed here
+                    continue
+                # Next to the remote column before it, when that one is here
+                after = 0
+                for previous in reversed(remote.columns[:position]):
+                    if previous[0] in local:
+                        after = board.columnList.index(local[previous[0]]) + 1
+                        break
+                board.addColumn(Column(title, WIPLimit), after)
+                self.result.columns += 1
+            elif title in baseTitles:
+                baseWIP = wipLimit(base.wip(title))
+                remoteWIP = wipLimit(WIPLimit)
+                if remoteWIP != baseWIP and column.WIPLimit == baseWIP:
+                    board.setField(column, "WIPLimit", remoteWIP)
+                    self.result.columns += 1
+
+    def removeColumns(self):
+        # Columns removed remotely go when nothing is left in them here
+        remoteTitles = set(title for title, WIPLimit, ids in self.remote.columns)
+        for title, WIPLimit, ids in self.base.columns:
+            column = self.columns().get(title)
+            if title not in remoteTitles and column is not None and not column.taskList:
+                self.board.removeColumn(column)
+                self.result.columns += 1
+
+    def target(self, title) -> Column:
+        column = self.columns().get(title)
+        if column is None:
+            column = Column(title)
+            self.board.addColumn(column)
+            self.result.columns += 1
+        return column
+
+    def insertRow(self, column: Column, taskId, remoteTitle):
+        # Below the task that comes before it remotely, when that one is in the column
+        ids = next((ids for title, WIPLimit, ids in self.remote.columns if title == remoteTitle), [])
+        position = ids.index(taskId)
+        rows = {task.id: row for row, task in enumerate(column.taskList)}
+        for previous in reversed(ids[:position]):
+            if previous in rows:
+                return rows[previous] + 1
+        return 0
+
+    def mergeTask(self, taskId, entry):
+        board, result = self.board, self.result
+        base = self.base.tasks.get(taskId)
+        remote = self.remote.tasks.get(taskId)
+        if self.known and entry is not None and base is None and remote is not None \
+                and self.localParts(entry.task) != remote[1]:
+            # Ids are handed out by each program on its own, both added a task with this one
+            board.changeId(entry.task, Task.newId())
+            entry = None
+        if entry is None:
+            if base is None and remote is not None:
+                task = self.remoteTask(taskId)
+                column = self.target(remote[0])
+                board.insertTasks(column, self.insertRow(column, taskId, remote[0]), [task])
+                self.nextRevisions[taskId] = task.revision
+                result.added += 1
+            elif base is not None and remote is not None and remote[1] != base[1]:
+                # Deleted here, changed there: stays deleted
+                result.conflicts.append((taskId, "deleted"))
+            return
+
+        task = entry.task
+        if remote is None:
+            if base is None:
+                # New here
+                return
+            if task.revision == self.base.revisions.get(taskId, 0) and entry.column.title == base[0]:
+                board.removeTask(task)
+                result.removed += 1
+            else:
+                result.conflicts.append((taskId, "deleted"))
+            return
+
+        baseParts = base[1] if base is not None else (None,) * len(partNames)
+        localParts = self.localParts(task)
+        take = []
+        for x in range(len(partNames)):
+            if remote[1][x] == localParts[x] or remote[1][x] == baseParts[x]:
+                continue
+            if localParts[x] == baseParts[x] or not self.known:
+                take.append(x)
+            elif partNames[x] == "history":
+                take.append(x)
+            else:
+                result.conflicts.append((taskId, partNames[x]))
+        if take:
+            self.apply(task, self.remoteTask(taskId), take)
+            result.updated += 1
+
+        baseColumn = base[0] if base is not None else None
+        if remote[0] != baseColumn and remote[0] != entry.column.title \
+                and (entry.column.title == baseColumn or not self.known):
+            column = self.target(remote[0])
+            board.moveTask(task, column, self.insertRow(column, taskId, remote[0]))
+            result.moved += 1
+
+        # Tasks that now match the remote file count as unchanged from the next base
+        if self.localParts(task) == remote[1]:
+            self.nextRevisions[taskId] = task.revision
+
+    def apply(self, task: Task, remote: Task, parts: list):
+        board = self.board
+        for x in parts:
+            name = partNames[x]
+            if name == "title":
+                board.setField(task, "title", remote.title)
+            elif name == "describe":
+                board.setField(task, "describe", remote.describe)
+            elif name == "dates":
+                board.setField(task, "start", remote.start)
+                board.setField(task, "end", remote.end)
+                board.setField(task, "flags", remote.flags)
+            else:
+                # Events are only ever added, the ones not here yet are appended
+                known = set(map(str, task.history))
+                for event in remote.history:
+                    if str(event) not in known:
+                        if isinstance(event, HistoryEntry):
+                            event.taskId = task.id
+                            board.appendEvent(task, event)
+                        else:
+                            board.setField(task, "history", task.history + [event])
+
+    def order(self, keepOrder):
+        board = self.board
+        for title, WIPLimit, ids in self.remote.columns:
+            column = self.columns().get(title)
+            if column is None or title in keepOrder:
+                continue
+            index = board.taskIndex
+            remoteOrder = [index[taskId].task for taskId in ids if taskId in index]
+            wanted = reorder(column.taskList, remoteOrder)
+            for row in range(len(wanted)):
+                if column.taskList[row] is not wanted[row]:
+                    board.moveTask(wanted[row], column, row)
+                    self.result.moved += 1
+
+    def nextBase(self) -> BoardState:
+        # The remote file becomes the base. Tasks still different here keep the revision
+        # they had in the old base, so they still count as changed.
+        revisions = {}
+        for column in self.board.columnList:
+            for task in column.taskList:
+                revision = self.nextRevisions.get(task.id)
+                if revision is None:
+                    revision = self.base.revisions.get(task.id, 0) if task.id in self.base.tasks else -1
+                revisions[task.id] = revision
+        self.remote.revisions = revisions
+        return self.remote
+
+
+class BoardMerger(Merger):
+    # The other version is a board read in full, from a project file that is not XML.
+    # Its tasks are taken over as they are.
+
+    def readRemote(self, other: Board) -> BoardState:
+        self.tasks = {}
+        return BoardState.fromBoard(other, tasks=self.tasks)
+
+    def remoteTask(self, taskId) -> Task:
+        return self.tasks[taskId]
+
+
+def mergeBoard(board: Board, base: BoardState, data):
+    # Merges the project file in data into board, returns (MergeResult, next base)
+    merger = Merger(board, base, data)
+    result = merger.run()
+    return result, merger.nextBase()
+
+
+def mergeBoards(board: Board, base: BoardState, other: Board):
+    # mergeBoard with the other version read into a Board
+    merger = BoardMerger(board, base, other)
+    result = merger.run()
+    return result, merger.nextBase()
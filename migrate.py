@@ -0,0 +1,71 @@
+# Converts a project between the XML, SQLite and binary formats, e.g.
+#
+#   python migrate.py project.xml project.db
+#   python migrate.py project.db project.xml --verify
+#   python migrate.py project.xml project.kbin
+import argparse
+import os
+import sys
+
+from Task import HistoryEntry
+from storage import openStorage
+
+
+def historyRecord(event):
+    if isinstance(event, HistoryEntry):
+        return str(event), event.time, event.action, event.fromColumn, event.column
+    return str(event)
+
+
+def boardRecords(board):
+    # Everything a project file stores, used to check that a conversion lost nothing
+    records = [board.title]
+    for column in board.columnList:
+        records.append((column.title, column.WIPLimit))
+        for task in column.taskList:
+            records.append((task.id, task.title, task.describe, task.start, task.end, task.flags,
+                            tuple(historyRecord(x) for x in task.history)))
+    return records
+
+
+def migrate(source, target, verify=False):
+    sourceStorage = openStorage(source)
+    board = sourceStorage.load(lazy=False)
+
+    targetStorage = openStorage(target)
+    targetStorage.save(board)
+    targetStorage.close()
+
+    if verify:
+        check = openStorage(target)
+        same = boardRecords(check.load(lazy=False)) == boardRecords(board)
+        check.close()
+        if not same:
+            raise ValueError(target + " does not match " + source)
+    sourceStorage.close()
+    return board
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a Kanban project between XML, SQLite and binary (.kbin).")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    parser.add_argument("--force", action="store_true", help="replace the target if it exists")
+    parser.add_argument("--verify", action="store_true", help="reload the target and compare it with the source")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.source):
+        parser.error(args.source + " does not exist")
+    if os.path.exists(args.target):
+        if not args.force:
+            parser.error(args.target + " already exists, use --force to replace it")
+        os.remove(args.target)
+
+    board = migrate(args.source, args.target, args.verify)
+    taskCount = sum(len(column.taskList) for column in board.columnList)
+    print("Converted %d columns and %d tasks from %s to %s" % (len(board.columnList), taskCount, args.source,
+                                                               args.target))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+import datetime
+import json
+import os
+
+import bulk
+from archive import Archive, archiveName, archiveRow, finishedDay
+from Board import Board
+from bulk import taskRow
+from Column import Column
+from Task import Task, epochDay, localSeconds, parseDate
+from storage import ConflictError, Storage, openStorage
+
+# Looked up in this order when no project file is given
+projectFiles = ["project.db", "project.xml"]
+
+
+def findProject(fileName=None):
+    if fileName:
+        return fileName
+    for name in projectFiles:
+        if os.path.exists(name):
+            return name
+    return projectFiles[-1]
+
+
+def readDay(value):
+    # Dates come in as date objects, day ordinals or "d/m/yyyy" text
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime.date):
+        return value.toordinal()
+    if isinstance(value, str):
+        return parseDate(value)
+    return int(value)
+
+
+# Task fields that editTask accepts, with how their values are read
+taskFields = {
+    "title": str,
+    "describe": str,
+    "start": readDay,
+    "end": readDay,
+    "startChecked": bool,
+    "endChecked": bool,
+}
+
+dueFilters = ("overdue", "week")
+
+
+class BoardService:
+    # Operations on a board that do not need Qt: the GUI, the command line and scripts
+    # all change boards through here. Every change goes through the board's undo stack,
+    # so observers (the GUI widgets) and indexes follow it and it can be undone.
+    # Columns are given as Column objects, titles or positions, tasks as Task objects
+    # or ids. Unknown ones raise ValueError.
+
+    def __init__(self, board: Board, storage: Storage = None):
+        self.board = board
+        self.storage = storage
+        self._archive = None
+        if storage is not None and os.path.exists(archiveName(storage.fileName) + ".idx"):
+            # New tasks must not take the id of an archived one
+            Task.reserveId(self.archive.highestId())
+
+    @staticmethod
+    def open(fileName=None, lazy=True, title="New Project"):
+        storage = openStorage(findProject(fileName))
+        board = storage.load(lazy) if storage.exists() else Board(title)
+        return (storage.serviceType or BoardService)(board, storage)
+
+    def save(self):
+        # Changes made to the file by someone else since it was read are merged in first
+        if self.storage is None:
+            raise ValueError("the board has no project file")
+        try:
+            self.storage.save(self.board)
+        except ConflictError:
+            self.merge()
+            self.storage.save(self.board)
+
+    def merge(self):
+        # Brings in the changes made to the project file by someone else, see merge.py
+        return self.storage.merge(self.board)
+
+    def close(self):
+        if self.storage is not None:
+            self.storage.close()
+
+    @property
+    def undoStack(self):
+        return self.board.undoStack
+
+    def undo(self):
+        return self.board.undoStack.undo()
+
+    def redo(self):
+        return self.board.undoStack.redo()
+
+    # Lookup
+
+    def column(self, key) -> Column:
+        if isinstance(key, Column):
+            return key
+        columnList = self.board.columnList
+        if isinstance(key, str):
+            for column in columnList:
+                if column.title == key:
+                    return column
+        # Positions, also as text from the command line
+        if isinstance(key, int) or key.isdigit():
+            position = int(key)
+            if 0 <= position < len(columnList):
+                return columnList[position]
+        raise ValueError("no column " + repr(key))
+
+    def task(self, key) -> Task:
+        if isinstance(key, Task):
+            return key
+        entry = self.board.findTask(int(key))
+        if entry is None:
+            raise ValueError("no task " + repr(key))
+        return entry.task
+
+    def location(self, task):
+        # (column, row) of a task on the board
+        entry = self.board.findTask(self.task(task).id)
+        return entry.column, entry.position
+
+    # Tasks
+
+    def addTask(self, column, title="Task's title", describe="description", start=None, end=None, row=None) -> Task:
+        task = Task(title, describe)
+        task.start = readDay(start)
+        task.end = readDay(end)
+        task.startChecked = task.start is not None
+        task.endChecked = task.end is not None
+        self.addTasks(column, [task], row)
+        return task
+
+    def addTasks(self, column, tasks: list, row=None):
+        column = self.column(column)
+        self.checkLimit(column, len(tasks))
+        if row is None:
+            row = len(column.taskList)
+        self.board.undoStack.addTasks(column, row, tasks)
+
+    def moveTasks(self, source, rows: list, target, row=None) -> list:
+        # row is the drop position in target before the rows are taken out of source
+        source, target = self.column(source), self.column(target)
+        if source is not target:
+            self.checkLimit(target, len(set(rows)))
+        if row is None:
+            row = len(target.taskList)
+        return self.board.undoStack.moveTasks(source, rows, target, row)
+
+    def moveTask(self, task, target, row=None):
+        column, position = self.location(task)
+        self.moveTasks(column, [position], target, row)
+
+    @staticmethod
+    def checkLimit(column: Column, count):
+        if not column.canAccept(count):
+            raise ValueError(column.title + " is at its WIP limit of " + str(column.WIPLimit))
+
+    def deleteTasks(self, column, rows: list) -> list:
+        return self.board.undoStack.removeTasks(self.column(column), rows)
+
+    def deleteTask(self, task):
+        column, position = self.location(task)
+        self.deleteTasks(column, [position])
+
+    def editTask(self, task, **fields):
+        task = self.task(task)
+        for name, value in fields.items():
+            if name not in taskFields:
+                raise ValueError("tasks have no field " + repr(name))
+            self.setField(task, name, taskFields[name](value))
+
+    def setField(self, target, name, value):
+        self.board.undoStack.setField(target, name, value)
+
+    # Columns
+
+    def addColumn(self, title="Column name", WIPLimit=0, position=None) -> Column:
+        column = Column(title, WIPLimit)
+        self.board.undoStack.addColumn(column, position)
+        return column
+
+    def removeColumn(self, column):
+        self.board.undoStack.removeColumn(self.column(column))
+
+    def moveColumn(self, column, position):
+        self.board.undoStack.moveColumn(self.column(column), position)
+
+    def editColumn(self, column, title=None, WIPLimit=None):
+        column = self.column(column)
+        if title is not None:
+            self.setField(column, "title", title)
+        if WIPLimit is not None:
+            self.setField(column, "WIPLimit", WIPLimit)
+
+    # Queries
+
+    def matches(self, text=None, due=None):
+        # Ids of the tasks matching the search text and due filter, None when neither
+        # filters anything
+        matches = self.board.search(text) if text else None
+        if due:
+            if due not in dueFilters:
+                raise ValueError("due must be one of " + ", ".join(dueFilters))
+            dateIndex = self.board.dateIndex
+            dueIds = set(dateIndex.overdue() if due == "overdue" else dateIndex.dueThisWeek())
+            matches = dueIds if matches is None else matches & dueIds
+        return matches
+
+    def query(self, text=None, column=None, due=None) -> list:
+        # (column, task) pairs in board order
+        matches = self.matches(text, due)
+        columnList = [self.column(column)] if column is not None else self.board.columnList
+        return [(column, task) for column in columnList for task in column.taskList
+                if matches is None or task.id in matches]
+
+    # Export
+
+    def boardRecord(self) -> dict:
+        return {
+            "title": self.board.title,
+            "columns": [{
+                "title": column.title,
+                "WIPLimit": column.WIPLimit,
+                "tasks": [taskRow(column, task) for task in column.taskList],
+            } for column in self.board.columnList],
+        }
+
+    def exportJSON(self, out):
+        json.dump(self.boardRecord(), out, indent=1)
+        out.write("\n")
+
+    def exportTasks(self, fileName, fileType=None) -> int:
+        # One row per task as CSV or JSON Lines, see bulk
+        return bulk.exportFile(self.board, fileName, fileType)
+
+    def importTasks(self, fileName, fileType=None, batchSize=5000, progress=None) -> int:
+        # Imported tasks are not on the undo stack, a file of a million rows would push
+        # everything else off it
+        return bulk.importFile(self.board, fileName, fileType, batchSize, progress)
+
+    # Archive
+
+    @property
+    def archive(self) -> Archive:
+        if self._archive is None:
+            if self.storage is None:
+                raise ValueError("the board has no project file to archive next to")
+            self._archive = Archive(archiveName(self.storage.fileName))
+        return self._archive
+
+    def archiveCandidates(self, columns=None, age=None, cap=None) -> dict:
+        # Rows to archive per column: tasks whose last event is at least age days old, and
+        # the oldest ones beyond cap tasks. columns defaults to the last column.
+        if columns is None:
+            columns = self.board.columnList[-1:]
+        today = localSeconds() // 86400 + epochDay
+        candidates = {}
+        for column in map(self.column, columns):
+            days = [finishedDay(task) for task in column.taskList]
+            rows = set()
+            if age is not None:
+                rows.update(row for row, day in enumerate(days) if day is not None and today - day >= age)
+            if cap is not None and len(days) - len(rows) > cap:
+                # Tasks without dated history count as the oldest
+                kept = sorted((row for row in range(len(days)) if row not in rows),
+                              key=lambda row: days[row] if days[row] is not None else 0)
+                rows.update(kept[:len(kept) - cap])
+            if rows:
+                candidates[column] = sorted(rows)
+        return candidates
+
+    def archiveTasks(self, columns=None, age=None, cap=None) -> int:
+        # Moves tasks to the archive, see archiveCandidates. They are written to the archive
+        # before they leave the board. Not undoable: the undo history is cleared, as its
+        # commands refer to rows that are gone.
+        if age is None and cap is None:
+            raise ValueError("give an age or a cap")
+        candidates = self.archiveCandidates(columns, age, cap)
+        if not candidates:
+            return 0
+        self.archive.add([archiveRow(column, column.taskList[row])
+                          for column, rows in candidates.items() for row in rows])
+        for column, rows in candidates.items():
+            self.board.takeRows(column, rows)
+        self.board.undoStack.clear()
+        return sum(map(len, candidates.values()))
+
+    def searchArchive(self, text=None, first=None, last=None) -> list:
+        # ArchiveEntry objects (id, day, title), newest first. first and last bound the day
+        # the tasks were finished on and are read like task dates.
+        return self.archive.search(text, readDay(first), readDay(last))
+
+    def restoreTask(self, taskId, column=None) -> Task:
+        # Brings a task back from the archive to the end of column, or of the column it was
+        # archived from, which is recreated when it is gone. A task still on the board was
+        # archived but the board was not saved without it, it only leaves the archive.
+        taskId = int(taskId)
+        entry = self.board.findTask(taskId)
+        if entry is not None and taskId in self.archive:
+            self.archive.remove(taskId)
+            return entry.task
+        row = self.archive.get(taskId)
+        task = bulk.taskFromRow(row)
+        if column is not None:
+            column = self.column(column)
+        else:
+            column = next((column for column in self.board.columnList if column.title == row["column"]), None)
+            if column is None:
+                column = Column(row["column"])
+                self.board.addColumn(column)
+        self.checkLimit(column, 1)
+        task.id = row["id"]
+        Task.reserveId(task.id)
+        self.board.insertTasks(column, len(column.taskList), [task])
+        self.archive.remove(row["id"])
+        return task
@@ -0,0 +1,547 @@
+import functools
+import sqlite3
+
+import instrument
+from Board import Board, BoardObserver
+from Column import Column
+from Task import Task, HistoryEntry
+from storage import Storage
+
+schema = """
+CREATE TABLE IF NOT EXISTS board (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS columns (
+    id INTEGER PRIMARY KEY,
+    position REAL NOT NULL,
+    title TEXT,
+    wip TEXT
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    column_id INTEGER NOT NULL REFERENCES columns(id) ON DELETE CASCADE,
+    position REAL NOT NULL,
+    title TEXT,
+    describe TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    start_state TEXT,
+    end_state TEXT,
+    start_day INTEGER,
+    end_day INTEGER
+);
+CREATE INDEX IF NOT EXISTS tasks_column_position ON tasks(column_id, position);
+CREATE INDEX IF NOT EXISTS tasks_start_day ON tasks(start_day);
+CREATE INDEX IF NOT EXISTS tasks_end_day ON tasks(end_day);
+CREATE TABLE IF NOT EXISTS history (
+    task_id INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    text TEXT,
+    PRIMARY KEY (task_id, seq)
+) WITHOUT ROWID;
+"""
+
+# Typed event fields of history rows, added in version 2
+historyColumns = [("time", "INTEGER"), ("action", "TEXT"), ("from_column", "TEXT"), ("to_column", "TEXT")]
+
+historyIndexes = """
+CREATE INDEX IF NOT EXISTS history_time ON history(time);
+CREATE INDEX IF NOT EXISTS history_to_column ON history(to_column, time);
+"""
+
+schemaVersion = "2"
+
+
+def historyRow(taskId, seq, event):
+    if isinstance(event, HistoryEntry):
+        return taskId, seq, str(event), event.time, event.action, event.fromColumn, event.column
+    return taskId, seq, str(event), None, None, None, None
+
+
+def historyEntry(text, when, action, fromColumn, toColumn):
+    if action is None:
+        return HistoryEntry.parse(text)
+    return HistoryEntry(action, toColumn, when, fromColumn)
+
+
+insertHistory = ("INSERT OR REPLACE INTO history (task_id, seq, text, time, action, from_column, to_column) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?)")
+# History only grows, rows that are already stored are the same and can be kept
+keepHistory = insertHistory.replace("OR REPLACE", "OR IGNORE")
+
+
+def lastEvent(history):
+    # Stored with the count of history rows, to tell whether the stored ones are still the first
+    return history[-1] if history else None
+
+
+class SQLiteSource:
+    # Lazy detail loader for tasks read by SQLiteStorage.load, see Task.loadDetails
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def loadDetails(self, taskId):
+        row = self.connection.execute("SELECT describe FROM tasks WHERE id = ?", (taskId,)).fetchone()
+        history = [historyEntry(*row) for row in self.connection.execute(
+            "SELECT text, time, action, from_column, to_column FROM history WHERE task_id = ? ORDER BY seq",
+            (taskId,))]
+        return (row[0] if row else None), history
+
+
+class TaskJournal(BoardObserver):
+    # Tasks added, moved, edited or removed since the last snapshot, noted from the calls
+    # the board makes to its observers. Every Board method bumps the revision once before
+    # its calls, a larger step means something changed without telling, and a change to
+    # the columns or the board is not noted: either way the next snapshot is a full one.
+
+    def __init__(self, board: Board):
+        self.board = board
+        # Tasks that joined, left or moved, and tasks only edited in place
+        self.tasks = {}
+        self.edited = {}
+        self.complete = True
+        self.revision = board.revision
+
+    def covers(self, board: Board):
+        return board is self.board and self.complete and self.revision == board.revision
+
+    def noted(self):
+        if self.board.revision - self.revision > 1:
+            self.complete = False
+        self.revision = self.board.revision
+
+    def noteRows(self, column: Column, first, last):
+        self.noted()
+        for task in column.taskList[first:last + 1]:
+            self.tasks[id(task)] = task
+
+    def tasksAboutToBeInserted(self, column: Column, row: int, count: int):
+        self.noted()
+
+    def tasksInserted(self, column: Column, row: int, count: int):
+        self.noteRows(column, row, row + count - 1)
+
+    def tasksAboutToBeRemoved(self, column: Column, first: int, last: int):
+        self.noteRows(column, first, last)
+
+    def tasksRemoved(self, column: Column, first: int, last: int):
+        self.noted()
+
+    def columnInserted(self, column: Column, position: int):
+        self.noted()
+        self.complete = False
+
+    def columnRemoved(self, column: Column, position: int):
+        self.noted()
+        self.complete = False
+
+    def columnMoved(self, column: Column, old: int, new: int):
+        self.noted()
+        self.complete = False
+
+    def fieldChanged(self, target, name):
+        self.noted()
+        if isinstance(target, Task):
+            self.edited[id(target)] = target
+        elif target is not self.board or name != "title":
+            self.complete = False
+
+
+class SQLiteStorage(Storage):
+    # Board stored as one row per column, task and history entry. Task rows are keyed by
+    # Task.id and ordered by a REAL position, so a task moved between two others only
+    # needs its own row rewritten. save() compares the board with what it last wrote and
+    # only touches the rows that differ. Between saves a TaskJournal notes the tasks the
+    # board changes, so a save after a move or an edit only reads and writes their rows.
+    # Writes are collected by snapshot() and committed through a second connection, so the
+    # commit can run on a worker thread while this one keeps serving lazy reads (WAL).
+
+    def __init__(self, fileName="project.db"):
+        super(SQLiteStorage, self).__init__(fileName)
+        self.connection = sqlite3.connect(fileName)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        with self.connection:
+            self.connection.executescript(schema)
+            existing = set(row[1] for row in self.connection.execute("PRAGMA table_info(history)"))
+            for name, kind in historyColumns:
+                if name not in existing:
+                    self.connection.execute("ALTER TABLE history ADD COLUMN " + name + " " + kind)
+            self.connection.executescript(historyIndexes)
+            self.connection.execute("INSERT OR REPLACE INTO board VALUES ('version', ?)", (schemaVersion,))
+        self.source = SQLiteSource(self.connection)
+        self.writer = None
+        self.pending = None
+        self.failed = False
+        self.nextColumnId = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM columns").fetchone()[0] + 1
+        # id(object) -> (object, ...) of what the database currently holds
+        self.title = None
+        self.columnRows = {}
+        self.taskRows = {}
+        self.journal = None
+
+    def exists(self):
+        # Connecting already created the file, a project exists once a board was saved
+        return self.connection.execute("SELECT 1 FROM board WHERE key = 'title'").fetchone() is not None
+
+    def close(self):
+        self.watch(None)
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.connection.close()
+
+    def execute(self, sql, parameters=()):
+        self.pending.append((sql, parameters, False))
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        if rows:
+            self.pending.append((sql, rows, True))
+
+    def commit(self, statements: list, progress=None):
+        # Runs the statements of a snapshot in one transaction, from any thread
+        if self.writer is None:
+            self.writer = sqlite3.connect(self.fileName, check_same_thread=False)
+            self.writer.execute("PRAGMA foreign_keys = ON")
+            self.writer.execute("PRAGMA synchronous = NORMAL")
+        try:
+            with self.writer:
+                for x in range(len(statements)):
+                    sql, parameters, many = statements[x]
+                    if many:
+                        self.writer.executemany(sql, parameters)
+                    else:
+                        self.writer.execute(sql, parameters)
+                    if progress is not None:
+                        progress(x + 1, len(statements))
+        except BaseException:
+            # What this storage believes is stored is now wrong, rewrite everything next time
+            self.failed = True
+            raise
+
+    @instrument.timed("load")
+    def load(self, lazy=True) -> Board:
+        row = self.connection.execute("SELECT value FROM board WHERE key = 'title'").fetchone()
+        _board = Board(row[0] if row else "New Project")
+        self.title = row[0] if row else None
+        self.columnRows = {}
+        self.taskRows = {}
+        self.failed = False
+
+        columns = {}
+        for columnId, position, title, wip in self.connection.execute(
+                "SELECT id, position, title, wip FROM columns ORDER BY position"):
+            _column = Column(title, wip)
+            _board.columnList.append(_column)
+            columns[columnId] = _column
+            self.columnRows[id(_column)] = (_column, columnId, position, title, wip)
+
+        histories = {}
+        if not lazy:
+            for row in self.connection.execute("SELECT task_id, text, time, action, from_column, to_column "
+                                               "FROM history ORDER BY task_id, seq"):
+                histories.setdefault(row[0], []).append(historyEntry(*row[1:]))
+
+        describe = "NULL" if lazy else "describe"
+        maxId = 0
+        for (taskId, columnId, position, title, taskDescribe, startDate, endDate, startState,
+             endState) in self.connection.execute(
+                "SELECT id, column_id, position, title, " + describe + ", start_date, end_date, start_state, "
+                "end_state FROM tasks ORDER BY column_id, position"):
+            _task = Task(title, taskDescribe, startDate, endDate)
+            _task.id = taskId
+            _task.dateCheckStatus[0] = startState
+            _task.dateCheckStatus[1] = endState
+            if lazy:
+                _task.source = self.source
+                _task.sourceIndex = taskId
+            else:
+                _task.history = histories.get(taskId, [])
+            columns[columnId].taskList.append(_task)
+            self.taskRows[id(_task)] = (_task, _task.revision, columnId, position, -1 if lazy else len(_task.history),
+                                        taskId, None if lazy else lastEvent(_task.history))
+            maxId = max(maxId, taskId)
+
+        # New tasks must not reuse the ids of stored ones
+        Task.reserveId(maxId)
+        self.watch(_board)
+        return _board
+
+    def watch(self, board):
+        # Starts a new journal of the changes made to board
+        if self.journal is not None:
+            self.journal.board.observers.remove(self.journal)
+            self.journal = None
+        if board is not None:
+            self.journal = TaskJournal(board)
+            board.observers.append(self.journal)
+
+    def taskValues(self, task: Task):
+        return (task.title, task.describe, task.date[0], task.date[1], task.dateCheckStatus[0],
+                task.dateCheckStatus[1], task.startDay, task.endDay)
+
+    def insertTasks(self, inserts: list):
+        # Tasks the database has not seen yet, written with one statement per table
+        self.executemany("INSERT OR REPLACE INTO tasks (id, column_id, position, title, describe, "
+                         "start_date, end_date, start_state, end_state, start_day, end_day) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         ((task.id, columnId, position) + self.taskValues(task)
+                          for task, columnId, position in inserts))
+        self.executemany(insertHistory, (historyRow(task.id, seq, task.history[seq])
+                                         for task, _, _ in inserts for seq in range(len(task.history))))
+        for task, columnId, position in inserts:
+            self.taskRows[id(task)] = (task, task.revision, columnId, position, len(task.history), task.id,
+                                       lastEvent(task.history))
+
+    def writeTask(self, task: Task, columnId, position, inserts=None):
+        saved = self.taskRows.get(id(task))
+        if saved is not None and saved[0] is not task:
+            saved = None
+
+        if saved is None:
+            if inserts is not None:
+                inserts.append((task, columnId, position))
+            else:
+                self.insertTasks([(task, columnId, position)])
+            return
+        elif saved[1] != task.revision:
+            self.execute("UPDATE tasks SET column_id = ?, position = ?, title = ?, describe = ?, start_date = ?, "
+                         "end_date = ?, start_state = ?, end_state = ?, start_day = ?, end_day = ? WHERE id = ?",
+                         (columnId, position) + self.taskValues(task) + (task.id,))
+            savedHistory = saved[4]
+        else:
+            if saved[2] != columnId or saved[3] != position:
+                self.execute("UPDATE tasks SET column_id = ?, position = ? WHERE id = ?",
+                             (columnId, position, task.id))
+            self.taskRows[id(task)] = (task, task.revision, columnId, position) + saved[4:]
+            return
+
+        # History only grows, so only the entries past the stored count are written.
+        # A count of -1 means the history was loaded lazily and the count is not known.
+        if task.source is None:
+            history = task.history
+            if savedHistory < 0:
+                self.executemany(keepHistory, (historyRow(task.id, seq, history[seq]) for seq in range(len(history))))
+                self.execute("DELETE FROM history WHERE task_id = ? AND seq >= ?", (task.id, len(history)))
+            else:
+                if savedHistory > len(history) or savedHistory and history[savedHistory - 1] is not saved[6]:
+                    # Events were taken back by undo, new ones may sit in their place
+                    self.execute("DELETE FROM history WHERE task_id = ?", (task.id,))
+                    savedHistory = 0
+                self.executemany(insertHistory, (historyRow(task.id, seq, history[seq])
+                                                 for seq in range(savedHistory, len(history))))
+            savedHistory = len(history)
+        self.taskRows[id(task)] = (task, task.revision, columnId, position, savedHistory, task.id,
+                                   saved[6] if task.source is not None else lastEvent(task.history))
+
+    def writeColumn(self, column: Column, position):
+        saved = self.columnRows.get(id(column))
+        wip = str(column.WIPLimit)
+        if saved is None or saved[0] is not column:
+            # Ids are handed out here, the insert may only run later on the writer
+            columnId = self.nextColumnId
+            self.nextColumnId += 1
+            self.execute("INSERT INTO columns (id, position, title, wip) VALUES (?, ?, ?, ?)",
+                         (columnId, position, column.title, wip))
+        else:
+            columnId = saved[1]
+            if saved[2:] != (position, column.title, wip):
+                self.execute("UPDATE columns SET position = ?, title = ?, wip = ? WHERE id = ?",
+                             (position, column.title, wip, columnId))
+        self.columnRows[id(column)] = (column, columnId, position, column.title, wip)
+        return columnId
+
+    def taskPositions(self, tasks: list, columnId):
+        # Keep the stored position of the longest run of tasks that are still in
+        # increasing order and interpolate positions for the others
+        stored = []
+        for task in tasks:
+            saved = self.taskRows.get(id(task))
+            if saved is not None and saved[0] is task and saved[2] == columnId:
+                stored.append(saved[3])
+            else:
+                stored.append(None)
+
+        keep = [False] * len(tasks)
+        tails = []
+        tailIndex = []
+        parent = [-1] * len(tasks)
+        for i, position in enumerate(stored):
+            if position is None:
+                continue
+            lo, hi = 0, len(tails)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if tails[mid] < position:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            parent[i] = tailIndex[lo - 1] if lo else -1
+            if lo == len(tails):
+                tails.append(position)
+                tailIndex.append(i)
+            else:
+                tails[lo] = position
+                tailIndex[lo] = i
+        i = tailIndex[-1] if tailIndex else -1
+        while i >= 0:
+            keep[i] = True
+            i = parent[i]
+
+        positions = [0.0] * len(tasks)
+        i = 0
+        while i < len(tasks):
+            if keep[i]:
+                positions[i] = stored[i]
+                i += 1
+                continue
+            j = i
+            while j < len(tasks) and not keep[j]:
+                j += 1
+            low = positions[i - 1] if i > 0 else (stored[j] - (j - i + 1) if j < len(tasks) else 0.0)
+            high = stored[j] if j < len(tasks) else low + (j - i + 1)
+            step = (high - low) / (j - i + 1)
+            for k in range(i, j):
+                positions[k] = low + step * (k - i + 1)
+            i = j
+
+        for k in range(1, len(positions)):
+            if not positions[k - 1] < positions[k]:
+                # Ran out of float precision between two neighbours, renumber the column
+                return [float(k) for k in range(len(tasks))]
+        return positions
+
+    def takePending(self):
+        pending = self.pending
+        self.pending = None
+        return pending
+
+    def snapshot(self, board: Board):
+        self.pending = []
+        if self.journal is not None and self.journal.covers(board) and not self.failed:
+            self.writeJournal(board, self.journal)
+        else:
+            self.writeBoard(board)
+        self.watch(board)
+        return functools.partial(self.commit, self.takePending())
+
+    def dropTasks(self, keys):
+        # Rows of tasks that left the board or took another id. They are deleted before
+        # anything is inserted, a task may be inserted under an id that was freed.
+        self.executemany("DELETE FROM tasks WHERE id = ?", [(self.taskRows.pop(key)[5],) for key in keys])
+
+    def writeBoard(self, board: Board):
+        if self.failed:
+            # Deleting the columns cascades to their tasks and histories
+            self.execute("DELETE FROM columns")
+            self.title = None
+            self.columnRows = {}
+            self.taskRows = {}
+            self.failed = False
+
+        if board.title != self.title:
+            self.execute("INSERT OR REPLACE INTO board VALUES ('title', ?)", (board.title,))
+            self.title = board.title
+
+        liveTasks = set(id(task) for column in board.columnList for task in column.taskList)
+        self.dropTasks([key for key, saved in self.taskRows.items()
+                        if key not in liveTasks or saved[0].id != saved[5]])
+
+        liveColumns = set()
+        inserts = []
+        for x in range(len(board.columnList)):
+            pjColumn: Column = board.columnList[x]
+            columnId = self.writeColumn(pjColumn, float(x))
+            liveColumns.add(id(pjColumn))
+
+            positions = self.taskPositions(pjColumn.taskList, columnId)
+            for y in range(len(pjColumn.taskList)):
+                self.writeTask(pjColumn.taskList[y], columnId, positions[y], inserts)
+        self.insertTasks(inserts)
+
+        removed = [saved[1] for key, saved in self.columnRows.items() if key not in liveColumns]
+        self.executemany("DELETE FROM columns WHERE id = ?", ((columnId,) for columnId in removed))
+        self.columnRows = {key: saved for key, saved in self.columnRows.items() if key in liveColumns}
+
+    def writeJournal(self, board: Board, journal: TaskJournal):
+        # Only the tasks in the journal changed since the last snapshot
+        if board.title != self.title:
+            self.execute("INSERT OR REPLACE INTO board VALUES ('title', ?)", (board.title,))
+            self.title = board.title
+
+        tasks = list(journal.tasks.values())
+        for key, task in journal.edited.items():
+            if key in journal.tasks:
+                continue
+            saved = self.taskRows.get(key)
+            if saved is not None and saved[0] is task and saved[5] == task.id:
+                # Still where it was stored
+                self.writeTask(task, saved[2], saved[3])
+            else:
+                tasks.append(task)
+        if not tasks:
+            return
+        index = board.taskIndex
+        placed = {}
+        dropped = []
+        for task in tasks:
+            entry = index.get(task.id)
+            onBoard = entry is not None and entry.task is task
+            if onBoard:
+                placed.setdefault(id(entry.column), (entry.column, []))[1].append(entry.position)
+            saved = self.taskRows.get(id(task))
+            if saved is not None and (not onBoard or saved[5] != task.id):
+                dropped.append(id(task))
+        self.dropTasks(dropped)
+        for column, rows in placed.values():
+            self.placeTasks(column, sorted(rows))
+
+    def storedPosition(self, task: Task, columnId):
+        saved = self.taskRows.get(id(task))
+        if saved is not None and saved[0] is task and saved[2] == columnId and saved[5] == task.id:
+            return saved[3]
+        return None
+
+    def placeTasks(self, column: Column, rows: list):
+        # Writes the given rows of a column, each run of them between the stored positions
+        # of its neighbours. Without room left between them the whole column is written.
+        columnId = self.columnRows[id(column)][1]
+        taskList = column.taskList
+        writes = []
+        x = 0
+        while x < len(rows):
+            y = x + 1
+            while y < len(rows) and rows[y] == rows[y - 1] + 1:
+                y += 1
+            first, last = rows[x], rows[y - 1]
+            count = last - first + 1
+            low = self.storedPosition(taskList[first - 1], columnId) if first > 0 else None
+            high = self.storedPosition(taskList[last + 1], columnId) if last + 1 < len(taskList) else None
+            if first > 0 and low is None or last + 1 < len(taskList) and high is None:
+                writes = None
+                break
+            if low is None:
+                low = (high if high is not None else float(count)) - count - 1
+            if high is None:
+                high = low + count + 1
+            positions = [self.storedPosition(task, columnId) for task in taskList[first:last + 1]]
+            if None in positions or not all(a < b for a, b in zip([low] + positions, positions + [high])):
+                step = (high - low) / (count + 1)
+                positions = [low + step * (k + 1) for k in range(count)]
+                if not all(a < b for a, b in zip([low] + positions, positions + [high])):
+                    writes = None
+                    break
+            writes.extend(zip(range(first, last + 1), positions))
+            x = y
+
+        if writes is None:
+            positions = self.taskPositions(taskList, columnId)
+            writes = enumerate(positions)
+        inserts = []
+        for row, position in writes:
+            self.writeTask(taskList[row], columnId, position, inserts)
+        self.insertTasks(inserts)
@@ -0,0 +1,251 @@
+import hashlib
+import mmap
+import os
+
+import instrument
+from Board import Board
+from db import LazyXMLSource, XMLSaver, parserXML, streamXML
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class ConflictError(Exception):
+    # The project file was changed by someone else since it was last read or written
+    pass
+
+
+class FileLock:
+    # Advisory lock on <file>.lock, held around reading and replacing a project file. Other
+    # copies of this program honour it, other programs do not. Readers share it where the
+    # platform can (flock), otherwise it is exclusive.
+
+    def __init__(self, fileName, shared=False):
+        self.fileName = fileName + ".lock"
+        self.shared = shared
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.fileName, "a+b")
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *args):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.file.close()
+        self.file = None
+
+
+class FileStamp:
+    # Modification time, size and content hash of a file. A file with the same time and
+    # size counts as unchanged without reading it, otherwise the hashes are compared.
+    __slots__ = ("mtime", "size", "digest")
+
+    def __init__(self, mtime, size, digest):
+        self.mtime = mtime
+        self.size = size
+        self.digest = digest
+
+    @staticmethod
+    def read(fileName, data=None, stat=None):
+        # data: the file's content when the caller already has it, stat: its os.stat
+        if stat is None:
+            stat = os.stat(fileName)
+        if data is None:
+            with open(fileName, "rb") as f:
+                data = f.read()
+        return FileStamp(stat.st_mtime_ns, stat.st_size, hashlib.blake2b(data, digest_size=16).digest())
+
+    def matches(self, fileName):
+        try:
+            stat = os.stat(fileName)
+        except FileNotFoundError:
+            return False
+        if stat.st_mtime_ns == self.mtime and stat.st_size == self.size:
+            return True
+        other = FileStamp.read(fileName)
+        if other.digest != self.digest:
+            return False
+        # Touched but not changed, remember the new time
+        self.mtime, self.size = other.mtime, other.size
+        return True
+
+
+def readMapped(fileName, use):
+    # use(data) on the content of a file mapped read-only, b"" when it is empty
+    with open(fileName, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return use(b"")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return use(data)
+
+
+class Storage:
+    # Interface shared by the project file formats. load() reads the whole board and
+    # save() writes back whatever changed in it since the last load or save.
+    # snapshot() is save() split in two: it reads the board on the calling thread and
+    # returns write(progress=None), which does the disk I/O and may run on any thread.
+    # progress(done, total) is called while writing. Only one write may run at a time.
+    # Boards read from a storage are edited through its serviceType, BoardService when None.
+    serviceType = None
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+
+    def exists(self):
+        return os.path.exists(self.fileName)
+
+    def load(self, lazy=True) -> Board:
+        raise NotImplementedError
+
+    def stream(self, lazy=True):
+        # load() in steps: yields (board, column, task) as the board, each column and each
+        # task is added, so callers can show a board while it is read. Formats that cannot
+        # be read in steps load everything, then yield the board without its columns and
+        # put them back one at a time. The board stays the object load() returned.
+        board = self.load(lazy)
+        columns = board.columnList
+        board.columnList = []
+        yield board, None, None
+        for column in columns:
+            board.columnList.append(column)
+            yield board, column, None
+
+    @instrument.timed("save")
+    def save(self, board: Board):
+        self.snapshot(board)()
+
+    def snapshot(self, board: Board):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def changedOnDisk(self) -> bool:
+        # Whether someone else changed the file since it was last read or written
+        return False
+
+    def merge(self, board: Board):
+        # Brings the changes found on disk into board, returns a merge.MergeResult
+        raise NotImplementedError
+
+
+class XMLStorage(Storage):
+    # Once the file was read or written, writes are refused with ConflictError when it
+    # changed since, merge() then brings the other changes in first. The file is only
+    # replaced under its FileLock.
+
+    def __init__(self, fileName="project.xml"):
+        super(XMLStorage, self).__init__(fileName)
+        self.saver = XMLSaver(fileName)
+        # The file as last read or written: its FileStamp and merge.BoardState
+        self.stamp = None
+        self.base = None
+        # Where lazily read boards get their task details from, closed with the storage
+        self.sources = []
+
+    def lazySource(self, lazy):
+        if not lazy:
+            return None
+        source = LazyXMLSource(self.fileName)
+        self.sources.append(source)
+        return source
+
+    def readBase(self, revisions=None):
+        from merge import BoardState
+
+        def read(data):
+            self.base = BoardState.read(data, revisions)
+            self.stamp = FileStamp.read(self.fileName, data)
+
+        readMapped(self.fileName, read)
+
+    def loaded(self, before):
+        # Reads the base once the board is in, off the way of the first paint. When the file
+        # changed during the load it is unknown which version was read: the next merge
+        # then takes the file's version of every task.
+        with FileLock(self.fileName, shared=True):
+            self.readBase()
+            if (self.stamp.mtime, self.stamp.size) != before:
+                self.base = None
+                self.stamp = FileStamp(before[0], before[1], None)
+
+    def statKey(self):
+        stat = os.stat(self.fileName)
+        return stat.st_mtime_ns, stat.st_size
+
+    @instrument.timed("load")
+    def load(self, lazy=True) -> Board:
+        before = self.statKey()
+        board = parserXML(self.fileName, lazy, self.lazySource(lazy))
+        self.loaded(before)
+        return board
+
+    def stream(self, lazy=True):
+        before = self.statKey()
+        yield from streamXML(self.fileName, lazy, self.lazySource(lazy))
+        self.loaded(before)
+
+    def snapshot(self, board: Board):
+        from merge import revisions
+        write = self.saver.snapshot(board)
+        taken = revisions(board)
+
+        def locked(progress=None):
+            with FileLock(self.fileName):
+                if self.changedOnDisk():
+                    raise ConflictError(self.fileName + " was changed by someone else")
+                write(progress)
+                self.readBase(taken)
+        return locked
+
+    def changedOnDisk(self) -> bool:
+        # A file this storage has not read or written yet is simply written over
+        return self.stamp is not None and not self.stamp.matches(self.fileName)
+
+    def close(self):
+        for source in self.sources:
+            source.close()
+        self.sources = []
+
+    @instrument.timed("merge")
+    def merge(self, board: Board):
+        from merge import mergeBoard
+
+        def read(data):
+            result, self.base = mergeBoard(board, self.base, data)
+            self.stamp = FileStamp.read(self.fileName, data)
+            return result
+
+        with FileLock(self.fileName, shared=True):
+            return readMapped(self.fileName, read)
+
+
+SQLiteExtensions = (".db", ".sqlite", ".sqlite3")
+BinaryExtensions = (".kbin",)
+
+
+def openStorage(fileName) -> Storage:
+    if fileName.startswith("kanban://"):
+        # A board shared through a sync server
+        from sync import RemoteStorage
+        return RemoteStorage(fileName)
+    extension = os.path.splitext(fileName)[1].lower()
+    if extension in SQLiteExtensions:
+        from sqlitedb import SQLiteStorage
+        return SQLiteStorage(fileName)
+    if extension in BinaryExtensions:
+        from binarydb import BinaryStorage
+        return BinaryStorage(fileName)
+    return XMLStorage(fileName)
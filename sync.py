@@ -0,0 +1,766 @@
+# Boards shared over the network. A SyncServer (python cli.py serve) holds a board in
+# memory and clients send it small requests: add, move, edit or delete tasks, and add,
+# remove, move or edit columns. The server checks each one against its board, fills in
+# what only it may decide (new ids, timestamps, the final row), numbers it and sends the
+# resulting delta to every client, the sender included. Everyone applies the deltas in
+# that order through the same Replica.apply, so all copies of the board stay equal.
+#
+# Messages are JSON objects, one per line:
+#
+#   client -> server  {"op": "hello", "since": seq}          first, since is optional
+#                     {"type": "move", "id": 7, "tasks": [3], "column": 2, "row": 0}
+#   server -> client  {"op": "snapshot", "client": 4, "seq": 120, "board": {...}}
+#                     {"op": "snapshot", "seq": 300, "board": {...}}     board replaced
+#                     {"op": "delta", "seq": 121, "client": 4, "id": 7, "delta": {...}}
+#                     {"op": "error", "id": 7, "message": "..."}
+#
+# Columns are named by ids the server hands out, titles change; history events take the
+# titles the server has. A client that says
+# since gets the deltas it missed instead of a snapshot while the server still has them.
+# When the server merged in changes made to its project file by someone else, every
+# client gets the whole board again.
+#
+# The Qt client (SyncedService with a RemoteStorage, opened as kanban://host:port) reads
+# on a background thread and applies deltas on the GUI thread, where the Board observers
+# update the affected cards. Edits of fields are shown at once; until the server sent
+# them back, deltas from others for the same field are dropped, they came before ours.
+import asyncio
+import collections
+import functools
+import json
+import signal
+import sys
+import threading
+
+from Board import Board
+from Column import Column, wipLimit
+from Task import HistoryEntry, Task, localSeconds
+from bulk import taskFromRow, taskRow
+from service import BoardService, taskFields
+from storage import ConflictError, Storage
+
+urlScheme = "kanban://"
+defaultPort = 8765
+protocolVersion = 1
+
+encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+# Fields a delta may change, with how their values are read
+fieldTypes = {
+    "task": dict(taskFields, flags=int),
+    "column": {"title": str, "WIPLimit": wipLimit},
+    "board": {"title": str},
+}
+
+
+def parseURL(url):
+    # "kanban://host:port" -> (host, port)
+    address = url[len(urlScheme):] if url.startswith(urlScheme) else url
+    host, _, port = address.rstrip("/").rpartition(":")
+    if not host:
+        return address.rstrip("/") or "localhost", defaultPort
+    if not port.isdigit():
+        raise ValueError("bad port in " + url)
+    return host.strip("[]"), int(port)
+
+
+def messageLine(message) -> bytes:
+    return (encode(message) + "\n").encode("utf-8")
+
+
+def readFields(kind, fields: dict) -> dict:
+    types = fieldTypes[kind]
+    values = {}
+    for name, value in fields.items():
+        if name not in types:
+            raise ValueError(kind + "s have no field " + repr(name))
+        values[name] = types[name](value)
+    return values
+
+
+def clamp(row, size):
+    return size if row is None else max(0, min(int(row), size))
+
+
+class Replica:
+    # A board and the ids of its columns, changed by deltas only
+
+    def __init__(self, board: Board, columnIds=None):
+        # columnIds are those of board.columnList, new ones are handed out when not given
+        self.board = board
+        # column id -> Column, and id(Column) -> column id
+        self.columns = {}
+        self.columnIds = {}
+        self.lastColumn = 0
+        for column, columnId in zip(board.columnList, columnIds or range(1, len(board.columnList) + 1)):
+            self.register(column, columnId)
+
+    def newColumnId(self):
+        self.lastColumn += 1
+        return self.lastColumn
+
+    def register(self, column: Column, columnId):
+        self.columns[columnId] = column
+        self.columnIds[id(column)] = columnId
+        self.lastColumn = max(self.lastColumn, columnId)
+
+    def columnId(self, column: Column):
+        columnId = self.columnIds.get(id(column))
+        if columnId is None:
+            raise ValueError("column " + repr(column.title) + " is not on the shared board")
+        return columnId
+
+    def column(self, columnId) -> Column:
+        column = self.columns.get(columnId)
+        if column is None:
+            raise ValueError("no column " + repr(columnId))
+        return column
+
+    def entry(self, taskId):
+        entry = self.board.findTask(taskId)
+        if entry is None:
+            raise ValueError("no task " + repr(taskId))
+        return entry
+
+    def task(self, taskId) -> Task:
+        return self.entry(taskId).task
+
+    def target(self, kind, targetId):
+        # What an edit of kind ("task", "column" or "board") changes
+        if kind == "task":
+            return self.task(targetId)
+        if kind == "column":
+            return self.column(targetId)
+        return self.board
+
+    def record(self) -> dict:
+        return {
+            "title": self.board.title,
+            "columns": [{
+                "id": self.columnIds[id(column)],
+                "title": column.title,
+                "WIPLimit": column.WIPLimit,
+                "tasks": [taskRow(column, task) for task in column.taskList],
+            } for column in self.board.columnList],
+        }
+
+    @staticmethod
+    def fromRecord(record: dict):
+        board = Board(record["title"])
+        columnIds = []
+        for columnRecord in record["columns"]:
+            column = Column(columnRecord["title"], columnRecord["WIPLimit"])
+            for row in columnRecord["tasks"]:
+                task = taskFromRow(row)
+                task.id = row["id"]
+                Task.reserveId(task.id)
+                for event in task.history:
+                    if isinstance(event, HistoryEntry):
+                        event.taskId = task.id
+                column.taskList.append(task)
+            board.columnList.append(column)
+            columnIds.append(columnRecord["id"])
+        return Replica(board, columnIds)
+
+    def adopt(self):
+        # After the board was changed without deltas: new columns get ids, removed ones go
+        present = set(map(id, self.board.columnList))
+        for columnId, column in list(self.columns.items()):
+            if id(column) not in present:
+                del self.columns[columnId]
+                del self.columnIds[id(column)]
+        for column in self.board.columnList:
+            if id(column) not in self.columnIds:
+                self.register(column, self.newColumnId())
+
+    def reset(self, record: dict):
+        # Replaces the board with the one of a snapshot, through the Board so its observers
+        # follow
+        board = self.board
+        other = Replica.fromRecord(record)
+        for column in list(board.columnList):
+            board.removeColumn(column)
+        self.columns = {}
+        self.columnIds = {}
+        if board.title != other.board.title:
+            board.setField(board, "title", other.board.title)
+        for column in other.board.columnList:
+            self.register(column, other.columnIds[id(column)])
+            board.addColumn(column)
+
+    def apply(self, delta: dict):
+        board = self.board
+        kind = delta["type"]
+        if kind == "add":
+            column = self.column(delta["column"])
+            tasks = []
+            for fields in delta["tasks"]:
+                task = Task(fields["title"], fields["describe"])
+                task.start, task.end, task.flags = fields["start"], fields["end"], fields["flags"]
+                task.id = fields["id"]
+                Task.reserveId(task.id)
+                tasks.append(task)
+            board.insertTasks(column, delta["row"], tasks)
+            for task in tasks:
+                board.recordEvent(task, HistoryEntry.Created, delta["title"], when=delta["time"])
+        elif kind == "move":
+            target = self.column(delta["column"])
+            tasks = [self.task(taskId) for taskId in delta["tasks"]]
+            sources = [board.findTask(task.id).column for task in tasks]
+            for column, rows in self.rowsByColumn(tasks).items():
+                board.takeRows(column, rows, True)
+            board.insertTasks(target, delta["row"], tasks, True)
+            for task, source, title in zip(tasks, sources, delta["from"]):
+                if source is not target:
+                    board.recordEvent(task, HistoryEntry.Moved, delta["to"], title, delta["time"])
+        elif kind == "delete":
+            tasks = [self.task(taskId) for taskId in delta["tasks"]]
+            for column, rows in self.rowsByColumn(tasks).items():
+                board.takeRows(column, rows)
+        elif kind == "edit":
+            task = self.task(delta["task"])
+            for name, value in delta["fields"].items():
+                board.setField(task, name, value)
+        elif kind == "edit-column":
+            column = self.column(delta["column"])
+            for name, value in delta["fields"].items():
+                board.setField(column, name, value)
+        elif kind == "edit-board":
+            for name, value in delta["fields"].items():
+                board.setField(board, name, value)
+        elif kind == "add-column":
+            column = Column(delta["title"], delta["WIPLimit"])
+            self.register(column, delta["column"])
+            board.addColumn(column, delta["position"])
+        elif kind == "remove-column":
+            column = self.column(delta["column"])
+            board.removeColumn(column)
+            del self.columns[delta["column"]]
+            del self.columnIds[id(column)]
+        elif kind == "move-column":
+            board.moveColumn(self.column(delta["column"]), delta["position"])
+        else:
+            raise ValueError("unknown delta " + repr(kind))
+
+    def rowsByColumn(self, tasks: list) -> dict:
+        rows = {}
+        for task in tasks:
+            entry = self.board.findTask(task.id)
+            rows.setdefault(entry.column, []).append(entry.position)
+        return rows
+
+
+# Server
+
+class SyncServer:
+    # Serves one board. Deltas are kept in a log of the last logSize, and written to the
+    # board's storage saveDelay seconds after a change. A save that failed is tried again,
+    # waiting twice as long each time up to maxRetryDelay. Clients that stop reading are
+    # dropped once maxBuffer bytes are waiting for them.
+
+    def __init__(self, service: BoardService, saveDelay=2.0, logSize=10000, maxBuffer=8 * 2 ** 20,
+                 maxRetryDelay=60.0):
+        self.service = service
+        self.replica = Replica(service.board)
+        self.saveDelay = saveDelay
+        self.maxRetryDelay = maxRetryDelay
+        self.maxBuffer = maxBuffer
+        self.seq = 0
+        # (seq, line) of the latest deltas
+        self.log = collections.deque(maxlen=logSize)
+        # Lines of deltas not yet sent
+        self.outgoing = []
+        # client id -> StreamWriter
+        self.clients = {}
+        self.lastClient = 0
+        self.server = None
+        self.saveHandle = None
+        self.saving = None
+        self.dirty = False
+        # Saves failed in a row
+        self.failures = 0
+        # Tasks serving the connections
+        self.handlers = set()
+
+    async def start(self, host="localhost", port=defaultPort):
+        self.server = await asyncio.start_server(self.handle, host, port, limit=2 ** 24)
+        return self.server
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve(self, host="localhost", port=defaultPort):
+        # Until the server is closed, which Ctrl+C and SIGTERM do where there are signals
+        await self.start(host, port)
+        loop = asyncio.get_running_loop()
+        for name in ("SIGINT", "SIGTERM"):
+            try:
+                loop.add_signal_handler(getattr(signal, name), self.server.close)
+            except (AttributeError, NotImplementedError, RuntimeError):
+                pass
+        try:
+            await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.flush()
+            for writer in list(self.clients.values()):
+                writer.close()
+            await asyncio.gather(*self.handlers, return_exceptions=True)
+            if self.saving is not None:
+                await self.saving
+
+    async def handle(self, reader, writer):
+        self.lastClient += 1
+        clientId = self.lastClient
+        self.handlers.add(asyncio.current_task())
+        try:
+            hello = json.loads(await reader.readline() or b"null")
+            if not isinstance(hello, dict) or hello.get("op") != "hello":
+                writer.write(messageLine({"op": "error", "message": "expected hello"}))
+                return
+            # Nothing is awaited between catching up and joining, no delta is missed
+            self.catchUp(writer, clientId, hello.get("since"))
+            self.clients[clientId] = writer
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.receive(clientId, writer, line)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self.clients.pop(clientId, None)
+            self.handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def catchUp(self, writer, clientId, since):
+        # Deltas not yet sent are part of the snapshot, the others get them first
+        self.flush()
+        if since is not None and since <= self.seq and (since == self.seq or self.log and self.log[0][0] <= since + 1):
+            writer.write(messageLine({"op": "welcome", "client": clientId, "seq": self.seq}))
+            for seq, line in self.log:
+                if seq > since:
+                    writer.write(line)
+            return
+        writer.write(messageLine({"op": "snapshot", "client": clientId, "seq": self.seq,
+                                  "board": self.replica.record()}))
+
+    def receive(self, clientId, writer, line):
+        request = None
+        try:
+            request = json.loads(line)
+            delta = self.normalize(request)
+            self.replica.apply(delta)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            requestId = request.get("id") if isinstance(request, dict) else None
+            writer.write(messageLine({"op": "error", "id": requestId, "message": str(e) or type(e).__name__}))
+            return
+        self.seq += 1
+        line = messageLine({"op": "delta", "seq": self.seq, "client": clientId, "id": request.get("id"),
+                            "delta": delta})
+        self.log.append((self.seq, line))
+        self.broadcast(line)
+        self.changed()
+
+    def broadcast(self, line):
+        # Deltas made in one pass of the event loop go out together, one write per client
+        if not self.outgoing:
+            asyncio.get_running_loop().call_soon(self.flush)
+        self.outgoing.append(line)
+
+    def flush(self):
+        if not self.outgoing:
+            return
+        data = b"".join(self.outgoing)
+        self.outgoing = []
+        for clientId, writer in list(self.clients.items()):
+            if writer.is_closing():
+                del self.clients[clientId]
+            elif writer.transport.get_write_buffer_size() > self.maxBuffer:
+                # Too far behind, it can come back and catch up
+                del self.clients[clientId]
+                writer.close()
+            else:
+                writer.write(data)
+
+    def normalize(self, request: dict) -> dict:
+        # The delta a request makes, checked against the board. Raises ValueError.
+        replica = self.replica
+        kind = request.get("type")
+        if kind == "add":
+            column = replica.column(request["column"])
+            rows = request.get("tasks") or [{}]
+            BoardService.checkLimit(column, len(rows))
+            tasks = []
+            for fields in rows:
+                fields = readFields("task", fields)
+                task = Task(fields.get("title", "Task's title"), fields.get("describe", "description"))
+                task.start, task.end = fields.get("start"), fields.get("end")
+                task.flags = fields.get("flags", int(fields.get("startChecked", task.start is not None)) |
+                                        int(fields.get("endChecked", task.end is not None)) << 1)
+                tasks.append({"id": task.id, "title": task.title, "describe": task.describe, "start": task.start,
+                              "end": task.end, "flags": task.flags})
+            return {"type": kind, "column": request["column"], "row": clamp(request.get("row"), len(column.taskList)),
+                    "time": localSeconds(), "title": column.title, "tasks": tasks}
+        if kind == "move":
+            target = replica.column(request["column"])
+            ids = list(dict.fromkeys(int(taskId) for taskId in request["tasks"]))
+            entries = [replica.entry(taskId) for taskId in ids]
+            staying = sum(1 for entry in entries if entry.column is target)
+            BoardService.checkLimit(target, len(entries) - staying)
+            return {"type": kind, "tasks": ids, "column": request["column"],
+                    "row": clamp(request.get("row"), len(target.taskList) - staying), "time": localSeconds(),
+                    "to": target.title, "from": [entry.column.title for entry in entries]}
+        if kind == "delete":
+            ids = list(dict.fromkeys(int(taskId) for taskId in request["tasks"]))
+            for taskId in ids:
+                replica.task(taskId)
+            return {"type": kind, "tasks": ids}
+        if kind == "edit":
+            task = replica.task(int(request["task"]))
+            return {"type": kind, "task": task.id, "fields": readFields("task", request["fields"])}
+        if kind == "edit-column":
+            replica.column(request["column"])
+            return {"type": kind, "column": request["column"], "fields": readFields("column", request["fields"])}
+        if kind == "edit-board":
+            return {"type": kind, "fields": readFields("board", request["fields"])}
+        if kind == "add-column":
+            return {"type": kind, "column": replica.newColumnId(), "title": str(request.get("title", "Column name")),
+                    "WIPLimit": wipLimit(request.get("WIPLimit")),
+                    "position": clamp(request.get("position"), len(replica.board.columnList))}
+        if kind == "remove-column":
+            replica.column(request["column"])
+            return {"type": kind, "column": request["column"]}
+        if kind == "move-column":
+            replica.column(request["column"])
+            return {"type": kind, "column": request["column"],
+                    "position": clamp(request.get("position"), len(replica.board.columnList) - 1)}
+        raise ValueError("unknown request " + repr(kind))
+
+    # Saving
+
+    def changed(self):
+        self.dirty = True
+        if self.saveHandle is None and self.service.storage is not None:
+            self.saveHandle = asyncio.get_running_loop().call_later(self.saveDelay, self.startSave)
+
+    def startSave(self):
+        self.saveHandle = None
+        if self.saving is not None:
+            # Saved again once the running save is done
+            self.changed()
+            return
+        self.saving = asyncio.ensure_future(self.save())
+
+    async def save(self):
+        # The board is read here, on the loop, and written on a worker thread. Changes made
+        # to the file by someone else are merged in first, as BoardService.save does.
+        self.dirty = False
+        loop = asyncio.get_running_loop()
+        storage = self.service.storage
+        try:
+            try:
+                await loop.run_in_executor(None, storage.snapshot(self.service.board))
+            except ConflictError:
+                self.merged(self.service.merge())
+                await loop.run_in_executor(None, storage.snapshot(self.service.board))
+        except (OSError, ValueError, ConflictError) as e:
+            self.dirty = True
+            self.failures += 1
+            delay = min(self.saveDelay * 2 ** self.failures, self.maxRetryDelay)
+            print("Could not save %s: %s, trying again in %.0f s" % (storage.fileName, str(e) or type(e).__name__,
+                                                                     delay), file=sys.stderr)
+            if self.saveHandle is not None:
+                self.saveHandle.cancel()
+            self.saveHandle = loop.call_later(delay, self.startSave)
+        else:
+            self.failures = 0
+        finally:
+            self.saving = None
+
+    def merged(self, result):
+        # The merge changed the board without deltas: clients get the whole board again,
+        # and so do clients catching up from before it
+        if not result.changes:
+            return
+        self.replica.adopt()
+        self.flush()
+        self.seq += 1
+        self.log.clear()
+        line = messageLine({"op": "snapshot", "seq": self.seq, "board": self.replica.record()})
+        for writer in self.clients.values():
+            writer.write(line)
+
+
+def serve(service: BoardService, host="localhost", port=defaultPort, **options):
+    # Runs a SyncServer until interrupted. The caller saves the board afterwards.
+    server = SyncServer(service, **options)
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    return server
+
+
+# Client
+
+class SyncClient:
+    # A connection read on its own thread. Messages are handed to post(call), which must
+    # run call on the thread that owns the board; until it is set they are queued.
+    # onError(message) and onClosed() are called there too.
+
+    def __init__(self, host="localhost", port=defaultPort, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.replica = None
+        self.clientId = None
+        self.seq = 0
+        self.loop = None
+        self.writer = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.error = None
+        self.lock = threading.Lock()
+        self.post = None
+        self.queued = []
+        self.onError = None
+        self.onClosed = None
+        self.lastRequest = 0
+        # (target kind, target id, field) -> edits sent and not yet sent back
+        self.pending = collections.Counter()
+        # request id -> (target kind, target id, fields) of the edits not yet sent back
+        self.requests = {}
+
+    def connect(self):
+        # Blocks until the board came in, raises ConnectionError when it did not
+        self.thread = threading.Thread(target=asyncio.run, args=(self.run(),), daemon=True)
+        self.thread.start()
+        if not self.ready.wait(self.timeout):
+            self.close()
+            raise ConnectionError("no answer from " + self.host + ":" + str(self.port))
+        if self.error is not None:
+            raise ConnectionError("could not connect to %s:%d: %s" % (self.host, self.port, self.error))
+        return self.replica
+
+    async def run(self):
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port, limit=2 ** 26)
+            writer.write(messageLine({"op": "hello", "version": protocolVersion}))
+            snapshot = json.loads(await reader.readline() or b"null")
+            if not isinstance(snapshot, dict) or snapshot.get("op") != "snapshot":
+                raise ConnectionError((snapshot or {}).get("message", "no board was sent"))
+        except (OSError, ValueError) as e:
+            self.error = str(e) or type(e).__name__
+            self.ready.set()
+            return
+        self.loop = asyncio.get_running_loop()
+        self.writer = writer
+        self.clientId = snapshot["client"]
+        self.seq = snapshot["seq"]
+        self.replica = Replica.fromRecord(snapshot["board"])
+        self.ready.set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.deliver(json.loads(line))
+        except (OSError, ValueError):
+            pass
+        finally:
+            writer.close()
+            self.deliver({"op": "closed"})
+
+    def deliver(self, message):
+        with self.lock:
+            if self.post is None:
+                self.queued.append(message)
+            else:
+                self.post(functools.partial(self.receive, message))
+
+    def setPost(self, post):
+        # None queues the messages again, for when whoever ran them is gone
+        with self.lock:
+            self.post = post
+            if post is not None:
+                for message in self.queued:
+                    post(functools.partial(self.receive, message))
+                self.queued = []
+
+    def send(self, request: dict) -> int:
+        if self.loop is None or self.loop.is_closed():
+            raise ConnectionError("not connected")
+        self.lastRequest += 1
+        request["id"] = self.lastRequest
+        line = messageLine(request)
+        try:
+            self.loop.call_soon_threadsafe(self.writer.write, line)
+        except RuntimeError:
+            raise ConnectionError("not connected")
+        return self.lastRequest
+
+    def edit(self, kind, targetId, fields: dict):
+        # Sends field changes already made to the board here
+        request = {"type": "edit" if kind == "task" else "edit-" + kind, "fields": fields}
+        if kind != "board":
+            request[kind] = targetId
+        requestId = self.send(request)
+        self.pending.update((kind, targetId, name) for name in fields)
+        self.requests[requestId] = (kind, targetId, fields)
+
+    def receive(self, message):
+        # On the owner's thread
+        op = message["op"]
+        if op == "delta":
+            self.seq = message["seq"]
+            delta = message["delta"]
+            if delta["type"].startswith("edit"):
+                delta = self.unseenFields(delta, message["client"] == self.clientId and message.get("id"))
+            if delta is not None:
+                self.replica.apply(delta)
+        elif op == "snapshot":
+            self.seq = message["seq"]
+            self.replica.reset(message["board"])
+            # Edits made here and not sent back yet were made after it
+            for kind, targetId, fields in self.requests.values():
+                try:
+                    target = self.replica.target(kind, targetId)
+                except ValueError:
+                    continue
+                for name, value in fields.items():
+                    self.replica.board.setField(target, name, value)
+        elif op == "error":
+            self.settle(message.get("id"))
+            if self.onError is not None:
+                self.onError(message.get("message") or "request refused")
+        elif op == "closed":
+            self.loop = None
+            if self.onClosed is not None:
+                self.onClosed()
+
+    def settle(self, requestId):
+        kind, targetId, fields = self.requests.pop(requestId, (None, None, ()))
+        for name in fields:
+            key = (kind, targetId, name)
+            self.pending[key] -= 1
+            if self.pending[key] <= 0:
+                del self.pending[key]
+
+    def unseenFields(self, delta, requestId):
+        # Our own edits are on the board already. Others' edits of a field we changed
+        # since were made before ours and are dropped.
+        if requestId:
+            self.settle(requestId)
+            return None
+        kind = delta["type"].partition("-")[2] or "task"
+        targetId = delta.get(kind)
+        fields = {name: value for name, value in delta["fields"].items() if (kind, targetId, name) not in self.pending}
+        if not fields:
+            return None
+        return dict(delta, fields=fields)
+
+    def close(self):
+        loop, writer = self.loop, self.writer
+        if loop is not None and writer is not None:
+            try:
+                loop.call_soon_threadsafe(writer.close)
+            except RuntimeError:
+                pass
+        if self.thread is not None:
+            self.thread.join(1.0)
+
+
+class SyncedService(BoardService):
+    # Changes are sent to the server and made to the board when it sends them back, see
+    # above; only field edits show at once. Undo is not shared and does nothing.
+
+    def __init__(self, board: Board, storage: Storage = None):
+        super(SyncedService, self).__init__(board, storage)
+        self.client = storage.client
+        self.replica = self.client.replica
+
+    def columnId(self, column):
+        return self.replica.columnId(self.column(column))
+
+    def undo(self):
+        return False
+
+    def redo(self):
+        return False
+
+    def save(self):
+        pass
+
+    def addTasks(self, column, tasks: list, row=None):
+        column = self.column(column)
+        self.checkLimit(column, len(tasks))
+        self.client.send({"type": "add", "column": self.columnId(column), "row": row, "tasks": [{
+            "title": task.title, "describe": task.describe, "start": task.start, "end": task.end, "flags": task.flags,
+        } for task in tasks]})
+
+    def moveTasks(self, source, rows: list, target, row=None) -> list:
+        # Returns no tasks, they move once the server sent the move back
+        source, target = self.column(source), self.column(target)
+        rows = sorted(set(rows))
+        if source is not target:
+            self.checkLimit(target, len(rows))
+        elif row is not None:
+            # The server counts the row without the moved tasks
+            row -= sum(1 for x in rows if x < row)
+        self.client.send({"type": "move", "tasks": [source.taskList[x].id for x in rows],
+                          "column": self.columnId(target), "row": row})
+        return []
+
+    def deleteTasks(self, column, rows: list) -> list:
+        column = self.column(column)
+        tasks = [column.taskList[row] for row in sorted(set(rows))]
+        self.client.send({"type": "delete", "tasks": [task.id for task in tasks]})
+        return tasks
+
+    def setField(self, target, name, value):
+        if isinstance(target, Task):
+            kind, targetId = "task", target.id
+        elif isinstance(target, Column):
+            kind, targetId = "column", self.columnId(target)
+        else:
+            kind, targetId = "board", None
+        self.board.setField(target, name, value)
+        self.client.edit(kind, targetId, {name: value})
+
+    def addColumn(self, title="Column name", WIPLimit=0, position=None):
+        self.client.send({"type": "add-column", "title": title, "WIPLimit": WIPLimit, "position": position})
+
+    def removeColumn(self, column):
+        self.client.send({"type": "remove-column", "column": self.columnId(column)})
+
+    def moveColumn(self, column, position):
+        self.client.send({"type": "move-column", "column": self.columnId(column), "position": position})
+
+
+class RemoteStorage(Storage):
+    # A board held by a SyncServer, named kanban://host:port. The server saves it.
+    serviceType = SyncedService
+
+    def __init__(self, url):
+        super(RemoteStorage, self).__init__(url)
+        host, port = parseURL(url)
+        self.client = SyncClient(host, port)
+
+    def exists(self):
+        return True
+
+    def load(self, lazy=True) -> Board:
+        return self.client.connect().board
+
+    def snapshot(self, board: Board):
+        def write(progress=None):
+            pass
+        return write
+
+    def close(self):
+        self.client.close()
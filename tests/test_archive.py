@@ -0,0 +1,122 @@
+# Archiving and restoring tasks (archive.py and the service's archive methods): archived
+# tasks can be found and brought back whole, reading the index never changes it, a torn
+# index entry is dropped by the next append, and restoring a task the saved board still
+# has does not make a copy of it.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from Task import HistoryEntry, Task, epochDay
+from archive import Archive, archiveName, archiveRow
+from service import BoardService
+from storage import XMLStorage
+
+daySeconds = 86400
+
+
+def makeBoard():
+    board = Board("Archived")
+    for title in ("TODO", "Done"):
+        board.columnList.append(Column(title))
+    for x in range(10):
+        task = Task("Finished task " + str(x), "Description " + str(x))
+        # Finished x days after the epoch's day 19000
+        task.history = [HistoryEntry(HistoryEntry.Moved, "Done", (19000 + x) * daySeconds, "TODO")]
+        board.columnList[1].taskList.append(task)
+    board.columnList[0].taskList.append(Task("Open task", "Still to do"))
+    return board
+
+
+def record(task):
+    return task.id, task.title, task.describe, list(map(str, task.history))
+
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "project.xml")
+        storage = XMLStorage(self.fileName)
+        storage.save(makeBoard())
+        storage.close()
+        self.service = BoardService.open(self.fileName)
+
+    def tearDown(self):
+        self.service.close()
+        shutil.rmtree(self.directory)
+
+    def testArchiveAndRestore(self):
+        service = self.service
+        done = service.column("Done")
+        expected = {task.id: record(task) for task in done.taskList[:4]}
+        self.assertEqual(service.archiveTasks(["Done"], cap=6), 4)
+        self.assertEqual(len(done.taskList), 6)
+        self.assertEqual(set(expected), set(entry.id for entry in service.archive.search()))
+        service.save()
+
+        # A new archive object sees the same entries, newest first
+        archive = Archive(archiveName(self.fileName))
+        entries = archive.search()
+        self.assertEqual([entry.day for entry in entries], [19000 + x + epochDay for x in (3, 2, 1, 0)])
+        self.assertEqual([entry.title for entry in archive.search("task 2")], ["Finished task 2"])
+        first = entries[-1].day
+        self.assertEqual(len(archive.search(None, first, first + 1)), 2)
+
+        taskId = min(expected)
+        task = service.restoreTask(taskId)
+        self.assertEqual(record(task), expected[taskId])
+        self.assertIs(service.location(task)[0], done)
+        self.assertNotIn(taskId, service.archive)
+        self.assertNotIn(taskId, Archive(archiveName(self.fileName)))
+        with self.assertRaises(ValueError):
+            service.restoreTask(taskId)
+
+    def testIndexReadOnly(self):
+        service = self.service
+        service.archiveTasks(["Done"], cap=8)
+        indexName = archiveName(self.fileName) + ".idx"
+        with open(indexName, "ab") as f:
+            f.write(b"\x01\x02\x03")
+        size = os.path.getsize(indexName)
+
+        archive = Archive(archiveName(self.fileName))
+        self.assertEqual(len(archive), 2)
+        self.assertEqual(os.path.getsize(indexName), size)
+
+        # The next append drops the torn entry and takes in what others appended
+        other = Archive(archiveName(self.fileName))
+        other.entries
+        done = service.column("Done")
+        archive.add([archiveRow(done, done.taskList[0])])
+        other.add([archiveRow(done, done.taskList[1])])
+        self.assertEqual(len(other), 4)
+        self.assertEqual([entry.title for entry in other.search("task 2")], ["Finished task 2"])
+        reread = Archive(archiveName(self.fileName))
+        self.assertEqual(len(reread), 4)
+        self.assertEqual(reread.indexEnd, os.path.getsize(indexName))
+
+    def testRestoreUnsaved(self):
+        # Archived, then the program stopped before the board was saved without the tasks
+        service = self.service
+        ids = [task.id for task in service.column("Done").taskList[:3]]
+        service.archiveTasks(["Done"], cap=7)
+        service.close()
+
+        self.service = service = BoardService.open(self.fileName)
+        self.assertEqual(len(service.column("Done").taskList), 10)
+        task = service.restoreTask(ids[0])
+        self.assertIs(task, service.board.findTask(ids[0]).task)
+        self.assertEqual(len(service.column("Done").taskList), 10)
+        self.assertNotIn(ids[0], service.archive)
+        self.assertEqual(len(service.archive), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+# Binary project files (binarydb.py): boards read back with every field, lazily read
+# details survive saves that copy them over as bytes, and files that are not binary
+# projects are refused with ValueError.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from Task import HistoryEntry, Task
+from binarydb import BinarySource, BinaryStorage, readBinaryInfo
+
+
+def makeBoard():
+    board = Board("Binär board")
+    for title, WIPLimit in (("TODO", 0), ("Doing", 3), ("Done", 0), ("Empty", 0)):
+        board.columnList.append(Column(title, WIPLimit))
+    for x in range(30):
+        task = Task("Task %d – ünïcode" % x, "Description %d\nwith two lines" % x if x % 5 else None,
+                    "%d/3/2024" % (x % 28 + 1), "%d/4/2024" % (x % 28 + 1) if x % 2 else None)
+        task.flags = x % 4
+        task.history = [HistoryEntry(HistoryEntry.Created, "TODO", 1700000000 + x)]
+        if x % 3 == 1:
+            task.history.append(HistoryEntry(HistoryEntry.Moved, "Doing", 1700100000 + x, "TODO"))
+        if x % 7 == 0:
+            # Text that is not a typed event, from a hand-edited file
+            task.history.append("Reviewed by hand")
+        board.columnList[x % 3].taskList.append(task)
+    board.columnList[0].taskList[0].start = "after the launch"
+    return board
+
+
+def record(board):
+    return (board.title, [(column.title, column.WIPLimit,
+                           [(task.id, task.title, task.describe, task.start, task.end, task.flags,
+                             list(map(str, task.history))) for task in column.taskList])
+                          for column in board.columnList])
+
+
+class BinaryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "project.kbin")
+        self.storages = []
+
+    def tearDown(self):
+        for storage in self.storages:
+            storage.close()
+        shutil.rmtree(self.directory)
+
+    def storage(self):
+        storage = BinaryStorage(self.fileName)
+        self.storages.append(storage)
+        return storage
+
+    def testRoundTrip(self):
+        board = makeBoard()
+        self.storage().save(board)
+        self.assertEqual(record(self.storage().load(False)), record(board))
+        self.assertEqual(record(self.storage().load()), record(board))
+        self.assertEqual(readBinaryInfo(self.fileName), ("Binär board", [("TODO", 10), ("Doing", 10), ("Done", 10),
+                                                                        ("Empty", 0)]))
+
+    def testLazySaves(self):
+        self.storage().save(makeBoard())
+        storage = self.storage()
+        board = storage.load()
+        # The same board read in full gets the same changes
+        full = self.storage().load(False)
+        self.assertTrue(all(task.source is not None for task in board.columnList[1].taskList))
+
+        # Edit one task, drop another and move a third, the others are never read
+        for changed in (board, full):
+            tasks = changed.columnList[1].taskList
+            changed.setField(tasks[0], "describe", "Edited")
+            changed.takeTasks(changed.columnList[1], 1, 1)
+            changed.moveTask(tasks[1], changed.columnList[3], 0)
+        storage.save(board)
+        self.assertTrue(any(task.source is not None for task in board.columnList[0].taskList))
+        # Details not read before the save are read from the new file
+        self.assertEqual(record(self.storage().load(False)), record(full))
+        self.assertEqual(record(board), record(full))
+
+        # And after a second save
+        board.setField(board.columnList[0].taskList[0], "title", "Renamed")
+        storage.save(board)
+        self.assertEqual(record(self.storage().load(False)), record(board))
+
+    def testNotBinary(self):
+        for data in (b"", b"<Project />", b"KBIX" + bytes(100)):
+            with open(self.fileName, "wb") as f:
+                f.write(data)
+            with self.assertRaises(ValueError):
+                BinarySource(self.fileName)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# CSV and JSON Lines import and export (bulk.py): exported tasks import back with every
+# field, ids are kept only when they are free, hand-written files are read leniently and
+# broken ones are refused with ValueError.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from Task import HistoryEntry, Task
+from bulk import exportFile, fileFormat, importFile
+
+
+def makeBoard():
+    board = Board("Exported")
+    for title in ("TODO", "Doing", "Done"):
+        board.columnList.append(Column(title))
+    for x in range(10):
+        task = Task("Task %d, \"quoted\"" % x, "Line one\nline two, ünïcode " + str(x), "%d/3/2024" % (x + 1),
+                    "%d/4/2024" % (x + 1) if x % 2 else None)
+        task.flags = x % 4
+        task.history = [HistoryEntry(HistoryEntry.Created, "TODO", 1700000000 + x)]
+        if x % 3:
+            task.history.append(HistoryEntry(HistoryEntry.Moved, board.columnList[x % 3].title, 1700100000 + x,
+                                             "TODO"))
+        board.columnList[x % 3].taskList.append(task)
+    board.columnList[0].taskList[0].start = "someday"
+    return board
+
+
+def record(board):
+    return [(column.title, [(task.id, task.title, task.describe, task.start, task.end, task.flags,
+                             list(map(str, task.history))) for task in column.taskList])
+            for column in board.columnList]
+
+
+class BulkTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write(self, name, text):
+        with open(self.path(name), "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        return self.path(name)
+
+    def testRoundTrips(self):
+        board = makeBoard()
+        for name in ("tasks.csv", "tasks.jsonl"):
+            self.assertEqual(exportFile(board, self.path(name)), 10)
+            imported = Board("Imported")
+            progress = []
+            self.assertEqual(importFile(imported, self.path(name), batchSize=4,
+                                        progress=lambda count, seconds: progress.append(count)), 10)
+            self.assertEqual(progress, [4, 8, 10])
+            self.assertEqual(record(imported), record(board), name)
+
+            # Into the board they came from, the ids are taken
+            copy = makeBoard()
+            importFile(copy, self.path(name))
+            ids = [task.id for column in copy.columnList for task in column.taskList]
+            self.assertEqual(len(ids), 20)
+            self.assertEqual(len(set(ids)), 20)
+            self.assertEqual(len(copy.taskIndex), 20)
+
+    def testLenientCSV(self):
+        fileName = self.write("hand.csv", "title,extra,endChecked,end,column\n"
+                                          "First,x,yes,2024-05-06,Doing\n"
+                                          "\n"
+                                          "Second,y,0,7/8/2024\n"
+                                          "Third\n")
+        board = Board("Hand-written")
+        board.columnList.append(Column("Doing"))
+        self.assertEqual(importFile(board, fileName), 3)
+        self.assertEqual([column.title for column in board.columnList], ["Doing", "Imported"])
+        first = board.columnList[0].taskList[0]
+        self.assertEqual((first.title, first.endChecked, first.startChecked), ("First", True, False))
+        second, third = board.columnList[1].taskList
+        self.assertEqual(second.end, Task("", "", None, "7/8/2024").end)
+        self.assertEqual((third.title, third.describe, third.history), ("Third", "", []))
+
+    def testBroken(self):
+        board = Board("Broken")
+        with self.assertRaises(ValueError):
+            importFile(board, self.write("notitle.csv", "describe,column\nText,TODO\n"))
+        with self.assertRaises(ValueError) as raised:
+            importFile(board, self.write("bad.jsonl", "{\"title\": \"Fine\"}\n\n{\"title\": \n"))
+        self.assertIn("line 3", str(raised.exception))
+        with self.assertRaises(ValueError):
+            fileFormat("tasks.txt")
+        self.assertEqual(fileFormat("TASKS.NDJSON"), "jsonl")
+
+
+if __name__ == "__main__":
+    unittest.main()
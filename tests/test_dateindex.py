@@ -0,0 +1,116 @@
+# The date index (DateIndex.py) against a plain scan of the board: due, overdue and
+# calendar range queries stay right while tasks are added, edited, moved and removed.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import datetime
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from DateIndex import DateIndex, taskInterval
+from Task import Task
+from service import BoardService
+
+today = datetime.date(2024, 5, 15).toordinal()
+
+
+def datedTask(random, title):
+    task = Task(title, "Text")
+    task.start = today + random.randint(-60, 60)
+    task.end = task.start + random.choice((0, 0, 1, 3, 10, 40, 200))
+    task.flags = random.randint(0, 3)
+    return task
+
+
+def scanDue(tasks, first, last):
+    return sorted((task.end, task.id) for task in tasks if task.endChecked and first <= task.end <= last)
+
+
+def scanOverlapping(tasks, first, last):
+    ids = []
+    for task in tasks:
+        interval = taskInterval(task)
+        if interval is not None and interval[0] <= last and interval[1] >= first:
+            ids.append(task.id)
+    return sorted(ids)
+
+
+class DateIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.random = random.Random(7)
+
+    def check(self, index, tasks):
+        for x in range(40):
+            first = today + self.random.randint(-120, 120)
+            last = first + self.random.choice((0, 1, 6, 30, 42, 400))
+            self.assertEqual(sorted(index.overlapping(first, last)), scanOverlapping(tasks, first, last))
+            self.assertEqual(index.dueBetween(first, last), [taskId for day, taskId in scanDue(tasks, first, last)])
+        self.assertEqual(index.overdue(today), [taskId for day, taskId in scanDue(tasks, 0, today - 1)])
+
+    def testIncremental(self):
+        tasks = [datedTask(self.random, "Task " + str(x)) for x in range(300)]
+        index = DateIndex()
+        for task in tasks:
+            index.add(task)
+        self.check(index, tasks)
+
+        for task in self.random.sample(tasks, 100):
+            task.start, task.end = task.end, task.start + self.random.randint(-5, 5)
+            task.flags = self.random.randint(0, 3)
+            index.update(task)
+        for task in tasks[:50]:
+            index.remove(task.id)
+        tasks = tasks[50:]
+        self.check(index, tasks)
+        self.assertEqual(len(index), len([task for task in tasks if taskInterval(task) is not None]))
+
+        # Built at once it answers the same
+        board = Board("Dates")
+        board.columnList.append(Column("TODO"))
+        board.columnList[0].taskList.extend(tasks)
+        self.check(DateIndex.build(board.columnList), tasks)
+
+    def testLargeIds(self):
+        index = DateIndex()
+        tasks = []
+        for taskId in (1, 2 ** 32, 2 ** 32 + 1, 2 ** 40):
+            task = Task("Big", "Text")
+            task.id = taskId
+            task.start = today - 2
+            task.end = today - 1
+            task.flags = 3
+            tasks.append(task)
+            index.add(task)
+        self.assertEqual(index.overdue(today), [1, 2 ** 32, 2 ** 32 + 1, 2 ** 40])
+        self.assertEqual(index.dueBetween(today, today + 10), [])
+        self.assertEqual(sorted(index.overlapping(today - 2, today - 2)), [1, 2 ** 32, 2 ** 32 + 1, 2 ** 40])
+        index.remove(2 ** 32)
+        self.assertEqual(index.overdue(today), [1, 2 ** 32 + 1, 2 ** 40])
+
+    def testFollowsBoard(self):
+        service = BoardService(Board("Dates"))
+        service.addColumn("TODO")
+        service.addColumn("Done")
+        tasks = [datedTask(self.random, "Task " + str(x)) for x in range(40)]
+        service.addTasks("TODO", tasks)
+        index = service.board.dateIndex
+
+        service.editTask(tasks[0], start=datetime.date.fromordinal(today), end=datetime.date.fromordinal(today + 2),
+                         startChecked=True, endChecked=True)
+        service.moveTasks("TODO", [1, 2], "Done", 0)
+        service.deleteTasks("TODO", [0])
+        service.board.undoStack.undo()
+        kept = [task for column in service.board.columnList for task in column.taskList]
+        self.assertIs(service.board.dateIndex, index)
+        self.check(index, kept)
+        self.assertIn(tasks[0].id, index.overlapping(today + 1, today + 1))
+        self.assertLessEqual({today, today + 1}, index.daysCovered(today - 1, today + 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+# Lazily read XML projects (db.py streamXML and LazyXMLSource): details are read from the
+# file only when asked for, still after the file was replaced, misplaced tasks are
+# reported as ValueError, and the storage closes the file it kept open.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from Task import Task
+from db import XMLSaver, parserXML, streamXML, writeAtomic
+from storage import XMLStorage
+
+
+def makeBoard():
+    board = Board("Lazy")
+    for title in ("TODO", "Doing"):
+        board.columnList.append(Column(title))
+    for x in range(10):
+        board.columnList[x % 2].taskList.append(Task("Task " + str(x), "Description " + str(x)))
+    return board
+
+
+class LazyXMLTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "project.xml")
+        XMLSaver(self.fileName).save(makeBoard())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, text):
+        with open(self.fileName, "w") as f:
+            f.write(text)
+
+    def testDetailsOnDemand(self):
+        board = parserXML(self.fileName)
+        task = board.columnList[1].taskList[2]
+        source = task.source
+        self.assertIsNotNone(source)
+        self.assertIsNone(source.starts)
+        self.assertEqual(source.taskCount, 10)
+        self.assertEqual(task.describe, "Description 5")
+        self.assertIsNone(task.source)
+        self.assertEqual([str(event) for event in task.history], [])
+        # Other tasks are still left in the file
+        self.assertIs(board.columnList[0].taskList[0].source, source)
+        source.close()
+
+    def testReplacedFile(self):
+        board = parserXML(self.fileName)
+        source = board.columnList[0].taskList[0].source
+        # Another program writes a different project under the same name
+        writeAtomic(self.fileName, [b"<Project />"])
+        self.assertEqual(board.columnList[0].taskList[0].describe, "Description 0")
+        self.assertEqual(board.columnList[1].taskList[4].describe, "Description 9")
+        source.close()
+
+    def testMisplacedTask(self):
+        self.write("<Project><Board title=\"B\"><Task id=\"1\" title=\"Loose\"><date><StartDate /><EndDate />"
+                   "</date></Task></Board></Project>")
+        for lazy in (True, False):
+            with self.assertRaises(ValueError) as raised:
+                parserXML(self.fileName, lazy)
+            self.assertIn(self.fileName, str(raised.exception))
+
+        # After a column was closed, too
+        self.write("<Project><Board title=\"B\"><Column title=\"C\" /><Task title=\"Loose\"><date><StartDate />"
+                   "<EndDate /></date></Task></Board></Project>")
+        with self.assertRaises(ValueError):
+            parserXML(self.fileName, False)
+        self.write("<Project><Column title=\"C\" /></Project>")
+        with self.assertRaises(ValueError):
+            list(streamXML(self.fileName))
+
+    def testStorageCloses(self):
+        storage = XMLStorage(self.fileName)
+        board = storage.load()
+        streamed = None
+        for streamed, column, task in storage.stream():
+            pass
+        sources = [board.columnList[0].taskList[0].source, streamed.columnList[0].taskList[0].source]
+        self.assertEqual(storage.sources, sources)
+        self.assertTrue(all(source.file is not None for source in sources))
+        storage.close()
+        self.assertTrue(all(source.file is None for source in sources))
+        self.assertEqual(storage.sources, [])
+        self.assertIsNone(parserXML(self.fileName, False).columnList[0].taskList[0].source)
+
+
+if __name__ == "__main__":
+    unittest.main()
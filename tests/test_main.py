@@ -0,0 +1,130 @@
+# The main window reading projects of every format a slice at a time: each column shows
+# up once, in board order, with all its tasks. Runs on Qt's offscreen platform.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+try:
+    from PySide6.QtCore import QEvent
+    from PySide6.QtWidgets import QApplication
+except ImportError:
+    QApplication = None
+
+from Board import Board
+from Column import Column
+from Task import Task
+from storage import openStorage
+
+timeout = 10.0
+
+
+def makeBoard():
+    board = Board("Formats")
+    for title in ("TODO", "Doing", "Done"):
+        board.columnList.append(Column(title))
+    for x in range(30):
+        board.columnList[x % 3].taskList.append(Task("Task " + str(x), "Description " + str(x)))
+    return board
+
+
+@unittest.skipIf(QApplication is None, "PySide6 is not installed")
+class MainWindowTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open(self, name):
+        from main import MainWindow
+        fileName = os.path.join(self.directory, name)
+        storage = openStorage(fileName)
+        storage.save(makeBoard())
+        storage.close()
+        return self.show(MainWindow(fileName), name)
+
+    def show(self, window, name):
+        done = []
+        window.loaded.connect(lambda: done.append(True))
+        deadline = time.monotonic() + timeout
+        while not done:
+            if time.monotonic() > deadline:
+                raise AssertionError("timed out loading " + name)
+            self.app.processEvents()
+            time.sleep(0.001)
+        self.addCleanup(self.dispose, window)
+        return window
+
+    def dispose(self, window):
+        # Deleted here on the GUI thread, a garbage collection started by one of the sync
+        # threads would otherwise destroy the widgets there
+        window.close()
+        window.deleteLater()
+        QApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+        gc.collect()
+
+    def checkColumns(self, name, window=None):
+        from gui import SubBoard
+        window = window or self.open(name)
+        board = window.boardWindow.board
+        subBoards = window.boardWindow.findChildren(SubBoard)
+        self.assertEqual(len(subBoards), len(board.columnList))
+        self.assertEqual(set(window.boardWindow.columnWidgets), set(map(id, board.columnList)))
+        for column in board.columnList:
+            widget = window.boardWindow.columnWidgets[id(column)]
+            self.assertIs(widget.column, column)
+            self.assertEqual(widget.taskList.model().rowCount(), 10)
+        self.assertTrue(window.boardWindow.isEnabled())
+
+    def testXML(self):
+        self.checkColumns("project.xml")
+
+    def testSQLite(self):
+        self.checkColumns("project.db")
+
+    def testBinary(self):
+        self.checkColumns("project.kbin")
+
+    def testSearch(self):
+        from gui import MatchRole
+        window = self.open("project.xml")
+        board = window.boardWindow.board
+        window.boardWindow.searchBox.setText("task 2")
+        # Tasks 2 and 20 to 29
+        for column in board.columnList:
+            model = window.boardWindow.columnWidgets[id(column)].taskList.model()
+            matching = [row for row in range(model.rowCount()) if model.index(row).data(MatchRole)]
+            self.assertEqual([column.taskList[row].title for row in matching],
+                             [task.title for task in column.taskList if task.title.startswith("Task 2")])
+        firsts = window.boardWindow.FirstMatches(board.search("task 2"))
+        self.assertEqual(firsts, {id(column): min(row for row in range(10)
+                                                  if column.taskList[row].title.startswith("Task 2"))
+                                  for column in board.columnList})
+
+    def testShared(self):
+        from main import MainWindow
+        from service import BoardService
+        from test_sync import ServerThread
+        server = ServerThread(BoardService(makeBoard()))
+        self.addCleanup(server.stop)
+        window = self.show(MainWindow(server.url), server.url)
+        self.checkColumns(server.url, window)
+        # Deltas go to the board on screen
+        self.assertIs(window.boardWindow.board, window.boardWindow.service.replica.board)
+
+
+if __name__ == "__main__":
+    unittest.main()
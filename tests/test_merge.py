@@ -0,0 +1,128 @@
+# Three-way merges (merge.py) of a board with its project file saved by someone else since,
+# for XML and binary project files: changes made on one side are taken, changes made on
+# both sides stay local except the history, and saves are refused until the merge.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from Task import HistoryEntry, Task
+from storage import ConflictError, openStorage
+
+
+def makeBoard():
+    board = Board("Merged")
+    for title in ("TODO", "Doing", "Done"):
+        board.columnList.append(Column(title))
+    for x in range(9):
+        task = Task("Task " + str(x), "Description " + str(x))
+        task.history = [HistoryEntry(HistoryEntry.Created, "TODO", 1700000000 + x)]
+        board.columnList[x % 3].taskList.append(task)
+    return board
+
+
+class MergeTests:
+    extension = None
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "project." + self.extension)
+        storage = openStorage(self.fileName)
+        storage.save(makeBoard())
+        storage.close()
+        # Two programs with the same project open
+        self.storages = [openStorage(self.fileName), openStorage(self.fileName)]
+        self.local, self.remote = [storage.load() for storage in self.storages]
+
+    def tearDown(self):
+        for storage in self.storages:
+            storage.close()
+        shutil.rmtree(self.directory)
+
+    def task(self, board, title):
+        return next(task for column in board.columnList for task in column.taskList if task.title == title)
+
+    def titles(self, board):
+        return [(column.title, [task.title for task in column.taskList]) for column in board.columnList]
+
+    def testMerge(self):
+        local, remote = self.local, self.remote
+        # Changed on one side each
+        remote.setField(self.task(remote, "Task 0"), "title", "Task 0 remote")
+        local.setField(self.task(local, "Task 1"), "describe", "Local text")
+        # Changed on both sides
+        remote.setField(self.task(remote, "Task 2"), "describe", "Remote text")
+        local.setField(self.task(local, "Task 2"), "describe", "Kept text")
+        remote.recordEvent(self.task(remote, "Task 2"), HistoryEntry.Moved, "Done", "TODO", 1700100000)
+        # Deleted remotely, unchanged and changed here
+        remote.removeTask(self.task(remote, "Task 3"))
+        remote.removeTask(self.task(remote, "Task 4"))
+        local.setField(self.task(local, "Task 4"), "title", "Task 4 local")
+        # Moved remotely, added on both sides
+        remote.moveTask(self.task(remote, "Task 5"), remote.columnList[0], 0)
+        remote.addTask(remote.columnList[1], Task("Remote task", "Added there"))
+        local.addTask(local.columnList[2], Task("Local task", "Added here"))
+        self.storages[1].save(remote)
+
+        self.assertTrue(self.storages[0].changedOnDisk())
+        with self.assertRaises(ConflictError):
+            self.storages[0].save(local)
+        result = self.storages[0].merge(local)
+        self.assertEqual((result.added, result.removed, result.moved), (1, 1, 1))
+        self.assertEqual(sorted(result.conflicts), sorted([(self.task(local, "Task 2").id, "describe"),
+                                                           (self.task(local, "Task 4 local").id, "deleted")]))
+
+        self.assertEqual(self.task(local, "Task 0 remote").describe, "Description 0")
+        self.assertEqual(self.task(local, "Task 1").describe, "Local text")
+        task = self.task(local, "Task 2")
+        self.assertEqual(task.describe, "Kept text")
+        self.assertEqual(len(task.history), 2)
+        self.assertEqual(local.columnList[0].taskList[0].title, "Task 5")
+        self.assertEqual(self.task(local, "Remote task").describe, "Added there")
+        self.assertIn("Local task", self.titles(local)[2][1])
+        self.assertNotIn("Task 3", [title for column, titles in self.titles(local) for title in titles])
+
+        # Merged, the save goes through and the other side reads the result
+        self.storages[0].save(local)
+        self.storages.append(openStorage(self.fileName))
+        self.assertEqual(self.titles(self.storages[-1].load(False)), self.titles(local))
+
+    def testSameIdAdded(self):
+        local, remote = self.local, self.remote
+        mine = Task("Mine", "Added here")
+        local.addTask(local.columnList[0], mine)
+        theirs = Task("Theirs", "Added there")
+        theirs.id = mine.id
+        remote.addTask(remote.columnList[0], theirs)
+        self.storages[1].save(remote)
+
+        self.storages[0].merge(local)
+        self.assertNotEqual(mine.id, theirs.id)
+        self.assertIs(local.findTask(mine.id).task, mine)
+        self.assertEqual(local.findTask(theirs.id).task.title, "Theirs")
+
+    def testNothingChanged(self):
+        # The other side saves the same board, possibly laid out differently in the file
+        self.storages[1].save(self.remote)
+        self.assertEqual(self.storages[0].merge(self.local).changes, 0)
+        self.assertFalse(self.storages[0].changedOnDisk())
+        self.storages[0].save(self.local)
+
+
+class XMLMergeTest(MergeTests, unittest.TestCase):
+    extension = "xml"
+
+
+class BinaryMergeTest(MergeTests, unittest.TestCase):
+    extension = "kbin"
+
+
+if __name__ == "__main__":
+    unittest.main()
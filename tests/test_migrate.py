@@ -0,0 +1,79 @@
+# Projects converted between the XML, SQLite and binary formats (migrate.py) keep every
+# field, and --verify notices a target that lost one.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from Task import HistoryEntry, Task
+from migrate import boardRecords, migrate
+from storage import openStorage
+
+formats = ("xml", "db", "kbin")
+
+
+def makeBoard():
+    board = Board("Migrated")
+    for title, WIPLimit in (("TODO", 0), ("Doing", 5), ("Done", 0)):
+        board.columnList.append(Column(title, WIPLimit))
+    for x in range(12):
+        task = Task("Task " + str(x), "Description " + str(x) + "\nsecond line", "%d/3/2024" % (x + 1),
+                    "%d/4/2024" % (x + 1))
+        task.flags = x % 4
+        task.id = 1000 + x * 7
+        task.history = [HistoryEntry(HistoryEntry.Created, "TODO", 1700000000 + x * 3600)]
+        if x % 3:
+            task.history.append(HistoryEntry(HistoryEntry.Moved, board.columnList[x % 3].title, 1700100000 + x))
+        board.columnList[x % 3].taskList.append(task)
+    # Dates that are not d/m/yyyy are kept as text
+    board.columnList[0].taskList[0].start = "next week"
+    return board
+
+
+class MigrateTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def testRoundTrips(self):
+        expected = boardRecords(makeBoard())
+        for source, target in itertools.permutations(formats, 2):
+            sourceName = self.path("source." + source)
+            storage = openStorage(sourceName)
+            storage.save(makeBoard())
+            storage.close()
+
+            targetName = self.path("target." + target)
+            migrate(sourceName, targetName, verify=True)
+            storage = openStorage(targetName)
+            self.assertEqual(boardRecords(storage.load(lazy=False)), expected, source + " to " + target)
+            storage.close()
+            os.remove(sourceName)
+            os.remove(targetName)
+
+    def testRecordsSeeEveryField(self):
+        base = boardRecords(makeBoard())
+        edits = [lambda task: setattr(task, "id", 5), lambda task: setattr(task, "flags", task.flags ^ 1),
+                 lambda task: setattr(task, "end", task.end + 1), lambda task: setattr(task, "describe", "Other"),
+                 lambda task: task.history.pop()]
+        for edit in edits:
+            board = makeBoard()
+            edit(board.columnList[1].taskList[0])
+            self.assertNotEqual(boardRecords(board), base)
+
+
+if __name__ == "__main__":
+    unittest.main()
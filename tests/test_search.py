@@ -0,0 +1,98 @@
+# Full-text search over the board (SearchIndex.py) and the service's search and due
+# filters: results follow tasks being added, edited, moved and removed.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import datetime
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from SearchIndex import SearchIndex, tokenize
+from Task import Task
+from service import BoardService
+
+
+def makeService():
+    service = BoardService(Board("Searched"))
+    for title in ("TODO", "Doing", "Done"):
+        service.addColumn(title)
+    service.addTasks("TODO", [Task("Write the report", "Quarterly numbers"),
+                              Task("Review the budget", "Numbers for the board meeting")])
+    service.addTasks("Doing", [Task("Report bug", "Crash when saving a report")])
+    return service
+
+
+def ids(tasks):
+    return set(task.id for task in tasks)
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.service = makeService()
+        self.write, self.review = self.service.column("TODO").taskList
+        self.bug = self.service.column("Doing").taskList[0]
+
+    def testWords(self):
+        search = self.service.board.search
+        self.assertIsNone(search(""))
+        self.assertEqual(search("report"), ids([self.write, self.bug]))
+        self.assertEqual(search("REPORT numbers"), ids([self.write]))
+        # The last word is a prefix unless it is followed by a space
+        self.assertEqual(search("rep"), ids([self.write, self.bug]))
+        self.assertEqual(search("rep "), set())
+        self.assertEqual(search("numbers meet"), ids([self.review]))
+        # History is searched by action and column
+        self.assertEqual(search("created todo"), ids([self.write, self.review]))
+        self.assertEqual(search("nothing"), set())
+
+    def testFollowsChanges(self):
+        service = self.service
+        search = service.board.search
+        self.assertEqual(search("budget"), ids([self.review]))
+
+        service.editTask(self.review, title="Review the plan")
+        self.assertEqual(search("budget"), set())
+        self.assertEqual(search("plan"), ids([self.review]))
+        service.undo()
+        self.assertEqual(search("budget"), ids([self.review]))
+
+        service.moveTask(self.write, "Done")
+        self.assertEqual(search("moved done"), ids([self.write]))
+        service.deleteTask(self.bug)
+        self.assertEqual(search("report"), ids([self.write]))
+        service.undo()
+        self.assertEqual(search("report"), ids([self.write, self.bug]))
+
+        task = service.addTask("Done", "Another report")
+        self.assertEqual(search("report"), ids([self.write, self.bug, task]))
+        self.assertEqual(len(service.board.searchIndex), 4)
+
+    def testFilters(self):
+        service = self.service
+        today = datetime.date.today()
+        service.editTask(self.write, end=today - datetime.timedelta(days=8), endChecked=True)
+        service.editTask(self.bug, end=today, endChecked=True)
+        self.assertEqual(service.matches(due="overdue"), ids([self.write]))
+        self.assertEqual(service.matches("report", "week"), ids([self.bug]))
+        self.assertIsNone(service.matches())
+        self.assertEqual(service.query("report"), [(service.column("TODO"), self.write),
+                                                   (service.column("Doing"), self.bug)])
+        self.assertEqual(service.query("report", "Doing"), [(service.column("Doing"), self.bug)])
+        with self.assertRaises(ValueError):
+            service.matches(due="later")
+
+    def testBuiltAtOnce(self):
+        board = Board("Built")
+        board.columnList.append(Column("TODO"))
+        board.columnList[0].taskList.append(Task("Alpha beta", "Gamma"))
+        index = SearchIndex.build(board.columnList)
+        self.assertEqual(index.search("gam"), {board.columnList[0].taskList[0].id})
+        self.assertEqual(tokenize("Hello, World!"), {"hello", "world"})
+
+
+if __name__ == "__main__":
+    unittest.main()
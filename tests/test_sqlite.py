@@ -0,0 +1,140 @@
+# SQLite projects (sqlitedb.py) saved after every kind of change read back as the board
+# that was saved, and saves after a move or an edit only write the rows of that task.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from Task import Task
+from service import BoardService
+from sqlitedb import SQLiteStorage
+
+
+def makeBoard():
+    board = Board("Stored")
+    for title in ("TODO", "Doing", "Done"):
+        board.columnList.append(Column(title))
+    for x in range(30):
+        board.columnList[x % 3].taskList.append(Task("Task " + str(x), "Description " + str(x)))
+    return board
+
+
+def record(board):
+    return [(column.title, [(task.id, task.title, task.describe, task.flags, list(map(str, task.history)))
+                            for task in column.taskList]) for column in board.columnList]
+
+
+class SQLiteTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "project.db")
+        storage = SQLiteStorage(self.fileName)
+        storage.save(makeBoard())
+        storage.close()
+        self.storage = SQLiteStorage(self.fileName)
+        self.service = BoardService(self.storage.load(), self.storage)
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.directory)
+
+    def reload(self):
+        storage = SQLiteStorage(self.fileName)
+        try:
+            return record(storage.load(False))
+        finally:
+            storage.close()
+
+    def save(self):
+        # Saves and returns the task ids the statements of the save were for
+        write = self.storage.snapshot(self.service.board)
+        statements = write.args[0]
+        write()
+        ids = set()
+        for sql, parameters, many in statements:
+            for row in parameters if many else [parameters]:
+                # Task ids come first, or last after WHERE id
+                ids.add(row[-1] if " WHERE id = ?" in sql else row[0])
+        return ids
+
+    def testSingleRowSaves(self):
+        service = self.service
+        task = service.board.columnList[1].taskList[4]
+        service.editTask(task, title="Edited")
+        self.assertEqual(self.save(), {task.id})
+        service.moveTask(task, "Done", 2)
+        self.assertEqual(self.save(), {task.id})
+        service.undo()
+        service.moveTask(task, "TODO", 0)
+        self.assertEqual(self.save(), {task.id})
+        self.assertEqual(self.reload(), record(service.board))
+
+        # Changing the columns writes the whole board again
+        service.addColumn("Review", 0, 1)
+        service.moveTask(task, "Review", 0)
+        self.assertGreater(len(self.save()), 1)
+        self.assertEqual(self.reload(), record(service.board))
+
+    def testRandomChanges(self):
+        service = self.service
+        board = service.board
+        generator = random.Random(3)
+        for x in range(300):
+            columns = [column for column in board.columnList if column.taskList]
+            column = generator.choice(columns)
+            row = generator.randrange(len(column.taskList))
+            action = generator.randrange(6)
+            if action == 0:
+                service.editTask(column.taskList[row], title="Edit " + str(x))
+            elif action == 1:
+                target = generator.choice(board.columnList)
+                rows = generator.sample(range(len(column.taskList)), min(3, len(column.taskList)))
+                service.moveTasks(column, rows, target, generator.randint(0, len(target.taskList)))
+            elif action == 2:
+                service.deleteTasks(column, [row])
+            elif action == 3:
+                service.addTasks(column, [Task("New " + str(x), "Text")], generator.randint(0, len(column.taskList)))
+            elif action == 4:
+                service.undo()
+            else:
+                service.redo()
+            if generator.random() < 0.3:
+                service.save()
+                self.assertEqual(self.reload(), record(board), "after step %d" % x)
+        service.save()
+        self.assertEqual(self.reload(), record(board))
+
+    def testReusedId(self):
+        board = self.service.board
+        column = board.columnList[0]
+        old = board.takeTasks(column, 0, 0)[0]
+        task = Task("Takes the freed id", "Text")
+        task.id = old.id
+        board.insertTasks(column, 3, [task])
+        other = board.columnList[1].taskList[0]
+        freed = other.id
+        board.changeId(other, Task.newId())
+        self.service.save()
+        self.assertEqual(self.reload(), record(board))
+        self.assertNotIn(freed, [taskId for title, tasks in self.reload() for taskId, *rest in tasks])
+
+        # The same with a full save
+        old = board.takeTasks(column, 1, 1)[0]
+        task = Task("Takes another freed id", "Text")
+        task.id = old.id
+        board.insertTasks(board.columnList[2], 0, [task])
+        self.service.addColumn("Forces a full save")
+        self.service.save()
+        self.assertEqual(self.reload(), record(board))
+
+
+if __name__ == "__main__":
+    unittest.main()
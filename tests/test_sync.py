@@ -0,0 +1,285 @@
+# Behaviour of the sync server (sync.py) with real connections on localhost: clients
+# converge on the server's board, notice when it goes away, and saves that failed or met
+# a file changed by someone else are tried again or merged.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import asyncio
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from Task import Task
+from service import BoardService
+from storage import XMLStorage
+from sync import RemoteStorage, SyncServer, SyncedService
+
+timeout = 10.0
+
+
+def makeBoard():
+    board = Board("Shared")
+    for title in ("TODO", "Doing", "Done"):
+        board.columnList.append(Column(title))
+    for x in range(6):
+        board.columnList[x % 3].taskList.append(Task("Task " + str(x), "Description " + str(x)))
+    return board
+
+
+def waitFor(condition, what):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for " + what)
+        time.sleep(0.01)
+
+
+class ServerThread:
+    # A SyncServer running on its own loop and thread, on a free port
+    def __init__(self, service, **options):
+        self.server = SyncServer(service, **options)
+        self.loop = None
+        self.thread = threading.Thread(target=asyncio.run, args=(self.run(),), daemon=True)
+        self.thread.start()
+        waitFor(lambda: self.server.server is not None, "the server to start")
+        self.url = "kanban://localhost:%d" % self.server.port
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        await self.server.serve("localhost", 0)
+
+    def call(self, function):
+        # function() run on the server's loop, between two requests
+        async def run():
+            return function()
+        return asyncio.run_coroutine_threadsafe(run(), self.loop).result(timeout)
+
+    def record(self):
+        return self.call(self.server.replica.record)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.server.server.close)
+        self.thread.join(timeout)
+
+
+class Client:
+    # A SyncedService whose deltas are applied when pump() runs them, as the GUI does
+    def __init__(self, url):
+        storage = RemoteStorage(url)
+        self.service = SyncedService(storage.load(), storage)
+        self.client = self.service.client
+        self.calls = queue.Queue()
+        self.closed = False
+        self.errors = []
+        # Id of our latest request the server answered
+        self.answered = 0
+        self.client.onClosed = self.onClosed
+        self.client.onError = self.errors.append
+        self.client.setPost(self.calls.put)
+
+    def onClosed(self):
+        self.closed = True
+
+    def pump(self, condition, what):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            try:
+                call = self.calls.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise AssertionError("timed out waiting for " + what)
+            message = call.args[0]
+            if message["op"] == "error" or message["op"] == "delta" and message["client"] == self.client.clientId:
+                self.answered = max(self.answered, message.get("id") or 0)
+            call()
+
+    def record(self):
+        return self.client.replica.record()
+
+    def close(self):
+        self.service.close()
+
+
+def settle(server, *clients):
+    # Until the server answered every request sent so far and the clients have all deltas
+    for client in clients:
+        client.pump(lambda: client.answered >= client.client.lastRequest, "the answers")
+    seq = server.call(lambda: server.server.seq)
+    for client in clients:
+        client.pump(lambda: client.client.seq >= seq, "delta %d" % seq)
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.servers = []
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        for server in self.servers:
+            if server.thread.is_alive():
+                server.stop()
+        shutil.rmtree(self.directory)
+
+    def startServer(self, service=None, **options):
+        server = ServerThread(service or BoardService(makeBoard()), **options)
+        self.servers.append(server)
+        return server
+
+    def connect(self, server):
+        client = Client(server.url)
+        self.clients.append(client)
+        return client
+
+    def projectFile(self):
+        fileName = os.path.join(self.directory, "project.xml")
+        storage = XMLStorage(fileName)
+        storage.save(makeBoard())
+        storage.close()
+        return fileName
+
+    def testClientsConverge(self):
+        server = self.startServer()
+        first, second = self.connect(server), self.connect(server)
+        self.assertEqual(first.record(), server.record())
+
+        one, two = first.service, second.service
+        one.addTasks("TODO", [Task("Added by one", "Text")], 0)
+        two.addTasks("Done", [Task("Added by two", "Text")])
+        two.addColumn("Review", 3, 2)
+        settle(server, first, second)
+
+        # Both edit the same task at once, the server decides whose edit is last
+        task = one.board.columnList[0].taskList[1]
+        one.setField(task, "title", "Title from one")
+        two.setField(two.board.findTask(task.id).task, "title", "Title from two")
+        one.setField(one.column("Review"), "WIPLimit", 50)
+        one.moveTasks("TODO", [0, 2], "Review", 0)
+        two.moveTasks("Doing", [1], "TODO", 0)
+        two.deleteTasks("Done", [0])
+        one.moveColumn("Done", 0)
+        one.setField(one.board, "title", "Renamed")
+        settle(server, first, second)
+        # Moves made on boards that are behind the server's
+        for x in range(50):
+            client = (first, second)[x % 2]
+            column = client.service.board.columnList[x % 4]
+            if column.taskList:
+                client.service.moveTasks(column.title, [0], client.service.board.columnList[(x + 1) % 4].title)
+        settle(server, first, second)
+
+        expected = server.record()
+        self.assertEqual(first.record(), expected)
+        self.assertEqual(second.record(), expected)
+        self.assertEqual(expected["title"], "Renamed")
+        self.assertEqual(first.errors + second.errors, [])
+
+    def testRefusedRequest(self):
+        server = self.startServer()
+        client = self.connect(server)
+        client.service.setField(client.service.column("Doing"), "WIPLimit", 2)
+        settle(server, client)
+        client.client.send({"type": "add", "column": client.service.columnId("Doing"), "tasks": [{}]})
+        client.client.send({"type": "move", "tasks": [123456], "column": 1})
+        client.pump(lambda: len(client.errors) == 2, "the errors")
+        self.assertIn("WIP limit", client.errors[0])
+        self.assertIn("no task", client.errors[1])
+        self.assertEqual(client.record(), server.record())
+
+    def testDisconnect(self):
+        server = self.startServer()
+        first, second = self.connect(server), self.connect(server)
+        first.service.addTasks("TODO", [Task("Before", "Text")])
+        settle(server, first, second)
+
+        server.stop()
+        first.pump(lambda: first.closed, "the connection to close")
+        second.pump(lambda: second.closed, "the connection to close")
+        self.assertEqual(first.record(), second.record())
+        with self.assertRaises(ConnectionError):
+            first.service.addTasks("TODO", [Task("After", "Text")])
+
+    def testSaveRetried(self):
+        fileName = self.projectFile()
+        storage = FailingStorage(fileName, 2)
+        server = self.startServer(BoardService(storage.load(), storage), saveDelay=0.01)
+        client = self.connect(server)
+        client.service.addTasks("TODO", [Task("Saved later", "Text")])
+        settle(server, client)
+
+        waitFor(lambda: storage.writes == 3, "the save to be retried")
+        # writes counts a save as it starts, the server notes its outcome once it is done
+        waitFor(lambda: server.call(lambda: server.server.saving is None), "the retried save to finish")
+        self.assertFalse(server.call(lambda: server.server.dirty))
+        self.assertEqual(server.call(lambda: server.server.failures), 0)
+        titles = [task.title for task in XMLStorage(fileName).load().columnList[0].taskList]
+        self.assertIn("Saved later", titles)
+
+    def testOutsideChangeMerged(self):
+        fileName = self.projectFile()
+        storage = XMLStorage(fileName)
+        server = self.startServer(BoardService(storage.load(), storage), saveDelay=0.01)
+        first, second = self.connect(server), self.connect(server)
+        first.service.addTasks("TODO", [Task("From the server", "Text")])
+        settle(server, first)
+        waitFor(lambda: not server.call(lambda: server.server.dirty or server.server.saving is not None),
+                "the first save")
+
+        # Someone edits the file while it is shared
+        outside = BoardService.open(fileName)
+        outside.editTask(outside.board.columnList[1].taskList[0], title="From outside")
+        outside.addColumn("Outside", 0)
+        outside.save()
+        outside.close()
+
+        # The next save meets the change, merges it and sends the board out again
+        second.service.setField(second.service.column("Done"), "WIPLimit", 4)
+        first.pump(lambda: first.service.board.columnList[1].taskList[0].title == "From outside", "the merge")
+        settle(server, first, second)
+        waitFor(lambda: not server.call(lambda: server.server.dirty or server.server.saving is not None),
+                "the merged save")
+
+        expected = server.record()
+        self.assertEqual(first.record(), expected)
+        self.assertEqual(second.record(), expected)
+        saved = XMLStorage(fileName).load()
+        self.assertEqual([column.title for column in saved.columnList], ["TODO", "Doing", "Done", "Outside"])
+        self.assertEqual(saved.columnList[1].taskList[0].title, "From outside")
+        self.assertEqual(saved.columnList[2].WIPLimit, 4)
+        self.assertIn("From the server", [task.title for task in saved.columnList[0].taskList])
+
+        # The merged column can be used like the others
+        first.service.addTasks("Outside", [Task("In the new column", "Text")])
+        settle(server, first, second)
+        self.assertEqual(second.service.column("Outside").taskList[0].title, "In the new column")
+
+
+class FailingStorage(XMLStorage):
+    # Its first writes fail as a full disk would
+    def __init__(self, fileName, failures):
+        super(FailingStorage, self).__init__(fileName)
+        self.failures = failures
+        self.writes = 0
+
+    def snapshot(self, board: Board):
+        write = super(FailingStorage, self).snapshot(board)
+
+        def failing(progress=None):
+            self.writes += 1
+            if self.writes <= self.failures:
+                raise OSError(28, "No space left on device")
+            write(progress)
+        return failing
+
+
+if __name__ == "__main__":
+    unittest.main()
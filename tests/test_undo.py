@@ -0,0 +1,161 @@
+# Undo and redo of board operations (UndoStack.py): every change can be taken back and
+# applied again, the task index keeps every task's row through it, and moves leave the
+# search and date indexes alone.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import os
+import random
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from Task import Task
+from service import BoardService
+
+
+def makeService():
+    board = Board("Undone")
+    for title in ("TODO", "Doing", "Done"):
+        board.columnList.append(Column(title))
+    for x in range(9):
+        board.columnList[x % 3].taskList.append(Task("Task " + str(x), "Description " + str(x)))
+    return BoardService(board)
+
+
+def record(board):
+    return [(column.title, column.WIPLimit, [(task.id, task.title, len(task.history)) for task in column.taskList])
+            for column in board.columnList]
+
+
+class UndoTest(unittest.TestCase):
+    def setUp(self):
+        self.service = makeService()
+        self.board = self.service.board
+
+    def checkIndex(self):
+        board = self.board
+        count = 0
+        for column in board.columnList:
+            for row in range(len(column.taskList)):
+                entry = board.findTask(column.taskList[row].id)
+                self.assertIs(entry.column, column)
+                self.assertEqual(entry.position, row)
+                count += 1
+        self.assertEqual(len(board.taskIndex), count)
+
+    def testEveryOperation(self):
+        service = self.service
+        states = [record(self.board)]
+        operations = [lambda: service.addTask("Doing", "Added", row=1),
+                      lambda: service.deleteTasks("TODO", [0, 2]),
+                      lambda: service.moveTasks("Doing", [0, 2], "Done", 1),
+                      lambda: service.moveTasks("Done", [0, 1], "Done", 3),
+                      lambda: service.editTask(self.board.columnList[0].taskList[0], title="Edited"),
+                      lambda: service.addColumn("Review", 2, 1),
+                      lambda: service.moveColumn("TODO", 3),
+                      lambda: service.editColumn("Done", WIPLimit=4),
+                      lambda: service.removeColumn("Doing")]
+        for operation in operations:
+            operation()
+            self.checkIndex()
+            states.append(record(self.board))
+        for state in reversed(states[:-1]):
+            self.assertTrue(service.undo())
+            self.assertEqual(record(self.board), state)
+            self.checkIndex()
+        self.assertFalse(service.undo())
+        for state in states[1:]:
+            self.assertTrue(service.redo())
+            self.assertEqual(record(self.board), state)
+            self.checkIndex()
+        self.assertFalse(service.redo())
+
+        # A new change drops what could have been redone
+        service.undo()
+        service.addTask("TODO", "Another")
+        self.assertFalse(self.board.undoStack.canRedo())
+
+    def testRandomChanges(self):
+        service = self.service
+        board = self.board
+        generator = random.Random(5)
+        for x in range(500):
+            columns = [column for column in board.columnList if column.taskList]
+            column = generator.choice(columns)
+            action = generator.randrange(5)
+            if action == 0:
+                target = generator.choice(board.columnList)
+                rows = generator.sample(range(len(column.taskList)), min(3, len(column.taskList)))
+                service.moveTasks(column, rows, target, generator.randint(0, len(target.taskList)))
+            elif action == 1 and len(columns) > 1:
+                service.deleteTasks(column, [generator.randrange(len(column.taskList))])
+            elif action == 2:
+                service.addTasks(column, [Task("New " + str(x), "Text")], generator.randint(0, len(column.taskList)))
+            elif action == 3:
+                service.undo()
+            else:
+                service.redo()
+            self.checkIndex()
+
+    def testInsertsInOneGap(self):
+        # Splitting the same gap over and over runs out of float precision at some point
+        service = self.service
+        for x in range(200):
+            service.addTask("TODO", "Squeezed " + str(x), row=2)
+        self.checkIndex()
+        self.assertEqual(self.board.columnList[0].taskList[2].title, "Squeezed 199")
+
+    def testMovesKeepIndexes(self):
+        service = self.service
+        board = self.board
+        task = board.columnList[0].taskList[0]
+        board.searchIndex, board.dateIndex
+        calls = []
+        with mock.patch.object(Board, "tasksJoined", lambda self, tasks: calls.append(("joined", tasks))), \
+                mock.patch.object(Board, "tasksLeft", lambda self, tasks: calls.append(("left", tasks))):
+            service.moveTask(task, "Done", 0)
+            service.undo()
+            service.redo()
+            board.moveTask(task, board.columnList[1], 2)
+            self.assertEqual(calls, [])
+            service.deleteTask(task)
+        self.assertEqual(calls, [("left", [task])])
+
+    def testChangeId(self):
+        board = self.board
+        first, second = board.columnList[0].taskList[:2]
+        with self.assertRaises(ValueError):
+            board.changeId(first, second.id)
+        old = first.id
+        board.changeId(first, Task.newId())
+        self.assertIsNone(board.findTask(old))
+        self.assertIs(board.findTask(first.id).task, first)
+        self.assertEqual(board.search("task 0"), {first.id})
+
+    def testMergedKeystrokes(self):
+        service = self.service
+        task = self.board.columnList[0].taskList[0]
+        for text in ("T", "Ty", "Typed"):
+            service.editTask(task, title=text)
+        service.undo()
+        self.assertEqual(task.title, "Task 0")
+        self.assertFalse(service.undo())
+
+    def testLimits(self):
+        stack = self.board.undoStack
+        stack.maxCount = 5
+        for x in range(8):
+            self.service.addTask("TODO", "Task " + str(x))
+        self.assertEqual(len(stack.undoList), 5)
+        stack.maxBytes = 1
+        self.service.addTask("TODO", "Too big")
+        self.assertEqual(len(stack.undoList), 0)
+        self.assertEqual(stack.bytes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+# XML saves (db.py XMLSaver and writeAtomic): only changed tasks are serialized again, a
+# failed save leaves the previous file and no temporary file behind, and saved files keep
+# their permissions.
+#
+#   python -m pytest tests    or    python -m unittest discover tests
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Board import Board
+from Column import Column
+from Task import Task
+from db import XMLSaver, parserXML, writeAtomic
+
+
+def makeBoard():
+    board = Board("Saved")
+    for title in ("TODO", "Doing", "Done"):
+        board.columnList.append(Column(title))
+    for x in range(12):
+        board.columnList[x % 3].taskList.append(Task("Task <%d> & \"more\"" % x, "Line one\nline two " + str(x)))
+    return board
+
+
+def record(board):
+    return [(column.title, [(task.id, task.title, task.describe, list(map(str, task.history)))
+                            for task in column.taskList]) for column in board.columnList]
+
+
+class XMLSaverTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, "project.xml")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testIncremental(self):
+        board = makeBoard()
+        saver = XMLSaver(self.fileName)
+        saver.save(board)
+        self.assertEqual(saver.lastWritten, 12)
+        self.assertEqual(record(parserXML(self.fileName, False)), record(board))
+
+        task = board.columnList[1].taskList[2]
+        board.setField(task, "title", "Edited")
+        board.moveTask(board.columnList[0].taskList[0], board.columnList[2], 1)
+        saver.save(board)
+        self.assertEqual(saver.lastWritten, 1)
+        self.assertEqual(record(parserXML(self.fileName, False)), record(board))
+
+        # The stitched file is laid out like an indented ElementTree
+        tree = ET.parse(self.fileName)
+        ET.indent(tree, "\t")
+        with open(self.fileName, "rb") as f:
+            self.assertEqual(f.read(), ET.tostring(tree.getroot(), xml_declaration=True, encoding="utf-8"))
+
+    def testLazySave(self):
+        XMLSaver(self.fileName).save(makeBoard())
+        board = parserXML(self.fileName)
+        expected = record(parserXML(self.fileName, False))
+        board.setField(board.columnList[0].taskList[1], "describe", "Changed")
+        expected[0][1][1] = expected[0][1][1][:2] + ("Changed",) + expected[0][1][1][3:]
+        saver = XMLSaver(self.fileName)
+        saver.save(board)
+        # Tasks never loaded are copied from the file and can still be read after the save
+        self.assertEqual(saver.lastWritten, 1)
+        self.assertEqual(record(board), expected)
+        self.assertEqual(record(parserXML(self.fileName, False)), expected)
+
+    def testFailedSave(self):
+        with open(self.fileName, "wb") as f:
+            f.write(b"previous")
+
+        def chunks():
+            yield b"half of a file"
+            raise OSError("disk full")
+
+        with self.assertRaises(OSError):
+            writeAtomic(self.fileName, chunks())
+        with open(self.fileName, "rb") as f:
+            self.assertEqual(f.read(), b"previous")
+        self.assertEqual(os.listdir(self.directory), ["project.xml"])
+
+    @unittest.skipUnless(os.name == "posix", "POSIX permissions")
+    def testPermissions(self):
+        umask = os.umask(0o027)
+        try:
+            writeAtomic(self.fileName, [b"new"])
+            self.assertEqual(os.stat(self.fileName).st_mode & 0o777, 0o640)
+            os.chmod(self.fileName, 0o604)
+            XMLSaver(self.fileName).save(makeBoard())
+            self.assertEqual(os.stat(self.fileName).st_mode & 0o777, 0o604)
+        finally:
+            os.umask(umask)
+
+
+if __name__ == "__main__":
+    unittest.main()
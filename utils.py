@@ -1,6 +1,21 @@
-from PySide6.QtCore import Qt, Signal
-from PySide6.QtGui import QPalette, QTextCharFormat
-from PySide6.QtWidgets import QApplication, QCalendarWidget, QWidget, QLabel, QCheckBox, QGridLayout
+from PySide6.QtCore import Qt, Signal, QDate, QTimer
+from PySide6.QtGui import QFont, QPalette, QTextCharFormat
+from PySide6.QtWidgets import QApplication, QCalendarWidget, QWidget, QLabel, QCheckBox, QGridLayout, QDockWidget, \
+    QTableWidget, QTableWidgetItem, QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog, QHeaderView
+
+import instrument
+
+
+# Task dates are day ordinals (date.toordinal()), QDate counts Julian days
+julianOffset = 1721425
+
+
+def dayToQDate(day):
+    return QDate.fromJulianDay(day + julianOffset) if day is not None else None
+
+
+def qDateToDay(date: QDate):
+    return date.toJulianDay() - julianOffset
 
 
 class DateCalendar(QCalendarWidget):
@@ -15,17 +30,46 @@ class DateCalendar(QCalendarWidget):
         self.highlightFormat = QTextCharFormat()
         self.highlightFormat.setBackground(self.palette().brush(QPalette.Highlight))
         self.highlightFormat.setForeground(self.palette().color(QPalette.HighlightedText))
+        self.rangeFormat = QTextCharFormat()
+        # The board's DateIndex, days on which some task is planned are shown in bold
+        self.dateIndex = None
 
         self.clicked.connect(self.DateIsClicked)
+        self.currentPageChanged.connect(self.OnPageChanged)
+
+    def setDateIndex(self, dateIndex):
+        self.dateIndex = dateIndex
+        self.RangeSelected(self.rangeFormat)
 
     def RangeSelected(self, format):
-        if self.StartDate and self.EndDate:
-            d0 = min(self.StartDate, self.EndDate)
-            d1 = max(self.StartDate, self.EndDate)
+        # Only the days of the page on screen are formatted, the rest is formatted when
+        # its page is shown. A null date clears every format in one call.
+        self.rangeFormat = format
+        self.setDateTextFormat(QDate(), QTextCharFormat())
+        # A page shows at most six weeks around the month
+        pageStart = QDate(self.yearShown(), self.monthShown(), 1).addDays(-7)
+        pageEnd = pageStart.addDays(7 * 7)
+        busy = set()
+        if self.dateIndex is not None:
+            busy = self.dateIndex.daysCovered(qDateToDay(pageStart), qDateToDay(pageEnd))
+            busyFormat = QTextCharFormat()
+            busyFormat.setFontWeight(QFont.Weight.Bold)
+            for day in busy:
+                self.setDateTextFormat(dayToQDate(day), busyFormat)
+        if self.StartDate and self.EndDate and format != QTextCharFormat():
+            d0 = max(min(self.StartDate, self.EndDate), pageStart)
+            d1 = min(max(self.StartDate, self.EndDate), pageEnd)
             while d0 <= d1:
-                self.setDateTextFormat(d0, format)
+                dayFormat = format
+                if qDateToDay(d0) in busy:
+                    dayFormat = QTextCharFormat(format)
+                    dayFormat.setFontWeight(QFont.Weight.Bold)
+                self.setDateTextFormat(d0, dayFormat)
                 d0 = d0.addDays(1)
 
+    def OnPageChanged(self, year, month):
+        self.RangeSelected(self.rangeFormat)
+
     def DateIsClicked(self, date):
         self.RangeSelected(QTextCharFormat())
         if QApplication.instance().keyboardModifiers() & Qt.ShiftModifier and self.StartDate:
@@ -72,12 +116,84 @@ class DateCheckBox(QWidget):
             if self.date[self.index]:
                 self.dateLabel.setText(self.text + self.date[self.index])
                 self.dateLabel.setEnabled(True)
+            else:
+                self.dateLabel.setText(self.text + " DD/MM/YYYY")
         self.OnCheck.emit()
 
+    def setDate(self, date: list, check="0"):
+        self.date = date
+        self.checkBox.setChecked(bool(int(check)))
+        self.OnBoxCheck()
+
     def isChecked(self):
         return self.checkBox.isChecked()
 
 
+class ProfileDock(QDockWidget):
+    # Live view of the instrument timers and counters. Showing it turns instrumentation
+    # on, the table is refreshed every `interval` ms while it is visible.
+    columns = ["operation", "count", "total (ms)", "mean (ms)", "max (ms)", "memory (KB)"]
+
+    def __init__(self, parent=None, interval=500):
+        super(ProfileDock, self).__init__("Profile", parent)
+        self.table = QTableWidget(0, len(self.columns))
+        self.table.setHorizontalHeaderLabels(self.columns)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.memory = QLabel()
+
+        resetButton = QPushButton("Reset")
+        resetButton.clicked.connect(self.OnReset)
+        dumpButton = QPushButton("Save JSON...")
+        dumpButton.clicked.connect(self.OnDump)
+
+        buttonLayout = QHBoxLayout()
+        buttonLayout.addWidget(self.memory)
+        buttonLayout.addStretch()
+        buttonLayout.addWidget(resetButton)
+        buttonLayout.addWidget(dumpButton)
+        layout = QVBoxLayout()
+        layout.addWidget(self.table)
+        layout.addLayout(buttonLayout)
+        widget = QWidget()
+        widget.setLayout(layout)
+        self.setWidget(widget)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.Refresh)
+        self.timer.setInterval(interval)
+        self.visibilityChanged.connect(self.OnVisibilityChanged)
+
+    def OnVisibilityChanged(self, visible):
+        if visible:
+            instrument.enable()
+            self.Refresh()
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+    def Refresh(self):
+        data = instrument.snapshot()
+        rows = [(name, str(stat["count"]), "%.1f" % (stat["total"] * 1000), "%.2f" % (stat["mean"] * 1000),
+                 "%.2f" % (stat["max"] * 1000), str(stat["memory"] // 1024)) for name, stat in data["stats"].items()]
+        rows += [(name, str(value), "", "", "", "") for name, value in data["counters"].items()]
+        self.table.setRowCount(len(rows))
+        for row in range(len(rows)):
+            for column in range(len(rows[row])):
+                self.table.setItem(row, column, QTableWidgetItem(rows[row][column]))
+        self.memory.setText("RSS " + str(data["rss"] // 2 ** 20) + " MB")
+
+    def OnReset(self):
+        instrument.reset()
+        self.Refresh()
+
+    def OnDump(self):
+        fileName, _ = QFileDialog.getSaveFileName(self, "Save profile", "profile.json", "JSON (*.json)")
+        if fileName:
+            instrument.dump(fileName)
+
+
 if __name__ == "__main__":
     app = QApplication([])
     calendar = DateCalendar()
@@ -0,0 +1,234 @@
+# A directory of project files worked on side by side. The project list shows a title,
+# the columns with their task counts and the modification time of each file, read
+# without loading the board: a byte scan of the tags for XML, two queries for SQLite,
+# the column table of a binary file.
+# Boards that were opened stay loaded, with their views, in an LRU cache limited by an
+# estimate of their memory use, so switching back to one is instant.
+import collections
+import os
+import re
+import sqlite3
+from xml.sax.saxutils import unescape
+
+# XML, storage.SQLiteExtensions, then storage.BinaryExtensions. Kept free of the board
+# modules, main.py imports this before its first paint.
+projectExtensions = (".xml", ".db", ".sqlite", ".sqlite3", ".kbin")
+
+# Rough resident cost of a loaded board, measured with benchmarks/common.rss on lazily
+# loaded boards: a task without its details, and the widgets and drag preview of a column
+taskBytes = 320
+detailBytes = 200
+columnViewBytes = 300 * 1024
+
+tagPattern = re.compile(rb"<(Board|Column|Task)[\s>/]")
+attribPattern = re.compile(rb'([\w:]+)\s*=\s*"([^"]*)"')
+entities = {"&quot;": '"', "&apos;": "'"}
+
+
+class ProjectInfo:
+    __slots__ = ("fileName", "title", "columns", "modified", "size")
+
+    def __init__(self, fileName, title, columns, modified, size):
+        self.fileName = fileName
+        self.title = title
+        # (title, task count) in board order
+        self.columns = columns
+        self.modified = modified
+        self.size = size
+
+    @property
+    def taskCount(self):
+        return sum(count for title, count in self.columns)
+
+
+def tagAttrib(data, start):
+    end = data.find(b">", start)
+    return {name.decode(): unescape(value.decode("utf-8", "replace"), entities)
+            for name, value in attribPattern.findall(data, start, end)}
+
+
+def readXMLInfo(fileName):
+    # Title and column counts from the start tags alone, the way LazyXMLSource finds tasks
+    import mmap
+    title = None
+    columns = []
+    with open(fileName, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return title, columns
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for match in tagPattern.finditer(data):
+                tag = match.group(1)
+                if tag == b"Task":
+                    if columns:
+                        columns[-1][1] += 1
+                elif tag == b"Column":
+                    columns.append([tagAttrib(data, match.start()).get("title"), 0])
+                elif title is None:
+                    title = tagAttrib(data, match.start()).get("title")
+    return title, [tuple(column) for column in columns]
+
+
+def readSQLiteInfo(fileName):
+    connection = sqlite3.connect("file:" + fileName + "?mode=ro", uri=True)
+    try:
+        row = connection.execute("SELECT value FROM board WHERE key = 'title'").fetchone()
+        columns = connection.execute(
+            "SELECT columns.title, COUNT(tasks.id) FROM columns LEFT JOIN tasks ON tasks.column_id = columns.id "
+            "GROUP BY columns.id ORDER BY columns.position").fetchall()
+        return row[0] if row else None, columns
+    finally:
+        connection.close()
+
+
+def readInfo(fileName) -> ProjectInfo:
+    stat = os.stat(fileName)
+    extension = os.path.splitext(fileName)[1].lower()
+    if extension in projectExtensions[1:4]:
+        title, columns = readSQLiteInfo(fileName)
+    elif extension in projectExtensions[4:]:
+        # The header and column table of the file
+        from binarydb import readBinaryInfo
+        title, columns = readBinaryInfo(fileName)
+    else:
+        title, columns = readXMLInfo(fileName)
+    return ProjectInfo(fileName, title or os.path.basename(fileName), columns, stat.st_mtime, stat.st_size)
+
+
+def boardBytes(board, view=True):
+    # Estimated memory held by a loaded board, and its view when it has one
+    size = 0
+    for column in board.columnList:
+        for task in column.taskList:
+            size += taskBytes
+            if task.source is None:
+                size += detailBytes + len(task.describe or "")
+    if view:
+        size += columnViewBytes * len(board.columnList)
+    return size
+
+
+class CachedBoard:
+    __slots__ = ("fileName", "service", "view", "size")
+
+    def __init__(self, fileName, service, view=None):
+        self.fileName = fileName
+        self.service = service
+        self.view = view
+        self.size = 0
+
+
+class BoardCache:
+    # Loaded boards by file name, least recently used first. When their estimated size
+    # goes over budget the least recently used ones are evicted, except the newest, and
+    # onEvict(entry) is called to save and release each.
+
+    def __init__(self, budget=256 * 2 ** 20, onEvict=None, estimate=boardBytes):
+        self.budget = budget
+        self.onEvict = onEvict
+        self.estimate = estimate
+        self.entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, fileName):
+        return fileName in self.entries
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    @property
+    def size(self):
+        return sum(entry.size for entry in self.entries.values())
+
+    def get(self, fileName) -> CachedBoard:
+        # The cached board, now the most recently used, or None
+        entry = self.entries.get(fileName)
+        if entry is not None:
+            self.entries.move_to_end(fileName)
+        return entry
+
+    def put(self, fileName, service, view=None) -> CachedBoard:
+        entry = self.entries.pop(fileName, None)
+        if entry is not None and entry.service is not service:
+            self.release(entry)
+        entry = CachedBoard(fileName, service, view)
+        self.entries[fileName] = entry
+        self.update(fileName)
+        return entry
+
+    def update(self, fileName):
+        # Estimates the board again, after it grew or got a view, and evicts what no
+        # longer fits
+        entry = self.entries.get(fileName)
+        if entry is not None:
+            entry.size = self.estimate(entry.service.board, entry.view is not None)
+        self.trim()
+
+    def trim(self):
+        size = self.size
+        while size > self.budget and len(self.entries) > 1:
+            fileName, entry = self.entries.popitem(last=False)
+            size -= entry.size
+            self.release(entry)
+
+    def evict(self, fileName):
+        entry = self.entries.pop(fileName, None)
+        if entry is not None:
+            self.release(entry)
+
+    def clear(self):
+        while self.entries:
+            self.release(self.entries.popitem(last=False)[1])
+
+    def release(self, entry: CachedBoard):
+        if self.onEvict is not None:
+            self.onEvict(entry)
+        else:
+            entry.service.close()
+
+
+class Workspace:
+    # The project files of a directory and the boards loaded from them
+
+    def __init__(self, directory=".", budget=256 * 2 ** 20, onEvict=None):
+        self.directory = directory
+        self.cache = BoardCache(budget, onEvict)
+        # fileName -> ((mtime, size), ProjectInfo)
+        self.infos = {}
+
+    def projects(self) -> list:
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in names
+                if os.path.splitext(name)[1].lower() in projectExtensions
+                and os.path.isfile(os.path.join(self.directory, name))]
+
+    def info(self, fileName) -> ProjectInfo:
+        # Read again only when the file changed
+        stat = os.stat(fileName)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self.infos.get(fileName)
+        if cached is None or cached[0] != key:
+            try:
+                info = readInfo(fileName)
+            except (OSError, ValueError, sqlite3.Error):
+                info = ProjectInfo(fileName, os.path.basename(fileName), [], stat.st_mtime, stat.st_size)
+            cached = self.infos[fileName] = (key, info)
+        return cached[1]
+
+    def list(self) -> list:
+        return [self.info(fileName) for fileName in self.projects()]
+
+    def open(self, fileName, lazy=True):
+        # The BoardService of a project, loaded and cached when it is not yet
+        from service import BoardService
+        entry = self.cache.get(fileName)
+        if entry is None:
+            entry = self.cache.put(fileName, BoardService.open(fileName, lazy))
+        return entry.service
+
+    def close(self):
+        self.cache.clear()